@@ -3,7 +3,7 @@
 iProperty extractor — Spyder-friendly (v2a)
 - If ROOT is blank or not found, prompts you to select a folder (GUI if available; else console input).
 - Traverses a ROOT directory (plain .html, .htm, .zip containing html, and gzipped html)
-- Extracts listing fields with resilient fallbacks
+- Extracts listing fields JSON-first from __NEXT_DATA__, with regex/DOM fallbacks when it is absent
 - Writes a CSV named 'iproperty_extract.csv' inside the selected ROOT
 
 How to run in Spyder:
@@ -21,11 +21,27 @@ except ImportError:
     print("Missing dependency: bs4. Install with:  pip install beautifulsoup4")
     raise
 
+# Optional: pandas/numpy enable the batch derived-metrics stage
+try:
+    import numpy as np
+    import pandas as pd
+except Exception:
+    np = pd = None
+
 # ------------------- CONFIG -------------------
 # Leave blank to be prompted at runtime
 ROOT = r""
 
 OUT_BASENAME = "iproperty_extract.csv"
+OUT_TYPED_BASENAME = "iproperty_extract.parquet"  # written only if pyarrow/fastparquet is installed
+
+# Compute sqft/PSF for the whole batch with pandas (falls back to per-row if pandas is missing)
+DERIVED_METRICS_BATCH = True
+
+# PSF plausibility bounds for price / built-up
+SQM_TO_SQFT = 10.7639
+PSF_AREA_BOUNDS = (400, 20000)
+PSF_PRICE_BOUNDS = (10000, 50000000)
 
 # ------------------- RUNTIME FOLDER PICKER -------------------
 def pick_root_if_needed(root):
@@ -81,7 +97,7 @@ def _area_to_sqft(value, unit_txt):
     if value is None:
         return None
     if _is_sqm(unit_txt):
-        return value * 10.7639
+        return value * SQM_TO_SQFT
     return value
 
 def jget(obj, path):
@@ -116,20 +132,24 @@ def _iter_script_jsons(soup):
             elif isinstance(data, (dict, list)):
                 yield data
 
+def _expand_roots(obj):
+    out = [obj]
+    if isinstance(obj, dict):
+        maybe = jget(obj, ["props", "pageProps"])
+        if isinstance(maybe, dict):
+            out.append(maybe)
+            page_data = maybe.get("pageData") or {}
+            if isinstance(page_data, dict):
+                out.append(page_data)
+                dd = page_data.get("data") or {}
+                if isinstance(dd, dict):
+                    out.append(dd)
+    return out
+
 def _collect_all_json(soup):
     out = []
     for obj in _iter_script_jsons(soup):
-        out.append(obj)
-        if isinstance(obj, dict):
-            maybe = jget(obj, ["props", "pageProps"])
-            if isinstance(maybe, dict):
-                out.append(maybe)
-                pd = maybe.get("pageData") or {}
-                if isinstance(pd, dict):
-                    out.append(pd)
-                    dd = pd.get("data") or {}
-                    if isinstance(dd, dict):
-                        out.append(dd)
+        out.extend(_expand_roots(obj))
     return out
 
 def _first_non_empty(*candidates):
@@ -142,9 +162,179 @@ def _first_non_empty(*candidates):
                 return c
     return None
 
-# ------------------- FIELD EXTRACTORS -------------------
+# ------------------- REGEX BANK -------------------
+# Compiled once at import; extractors below never build patterns per call.
 REN_PAT = re.compile(r"\bREN[:\-]?\s*(\d{3,7})\b", re.I)
 
+# PSF keys in priority order (first one with a numeric value wins)
+PSF_KEYS = [
+    "pricePerSizeUnitBuiltUp",
+    "minimumPricePerSizeUnitBuiltUp", "maximumPricePerSizeUnitBuiltUp",
+    "minimumPricePerSizeUnit", "maximumPricePerSizeUnit",
+    "floorAreaPsf", "builtUpPsf",
+]
+# these two may also appear as bare numbers ("floorAreaPsf": 512.3)
+PSF_NUMERIC_KEYS = {"floorareapsf", "builtuppsf"}
+ATTR_KEYS = ["builtUp", "sizeUnit", "furnishing", "bedroom", "bathroom"]
+
+# Single-pass scanner: "attributes" and metatable blocks are captured inside
+# lookaheads so PSF keys nested in them are still visited by the same pass.
+RX_HTML_SCAN = re.compile(
+    r'"attributes"\s*:\s*\{(?=(?P<attrs>[^{}]*))'
+    r'|(?:"metatable"|"metaTable")\s*:\s*\{(?=[^{}]*"items"\s*:\s*\[(?P<meta>.*?)\]\s*\})'
+    r'|"(?P<psf_key>' + "|".join(PSF_KEYS) + r')"\s*:\s*(?:"(?P<psf_str>[^"]+)"|(?P<psf_num>[0-9][0-9,\.]*))',
+    re.I | re.S,
+)
+RX_ATTR_KEY = re.compile(r'"(' + "|".join(ATTR_KEYS) + r')"\s*:\s*"([^"]+)"', re.I)
+RX_LEADING_NUM = re.compile(r"^[0-9][0-9,\.]*")
+
+RX_META_VALUE    = re.compile(r'"(?:value|valueText|text)"\s*:\s*"([^"]+)"', re.I)
+RX_META_VALUE_ONLY = re.compile(r'"value"\s*:\s*"([^"]+)"', re.I)
+RX_FOR_RENT      = re.compile(r"\bfor\s+rent\b", re.I)
+RX_PSF_WORD      = re.compile(r"\bpsf\b", re.I)
+RX_LAND_WORD     = re.compile(r"\bland\b", re.I)
+RX_ATTR_NOISE    = re.compile(r"psf|floor|built|title", re.I)
+RX_FURNISH_TOKEN = re.compile(r"\b(fully\s*furnished|part(?:ly|ially)\s*furnished|unfurnished|bare\s*unit)\b", re.I)
+RX_FULLY_FURN    = re.compile(r"fully\s*furnished")
+RX_PART_FURN     = re.compile(r"part(?:ly|ially)\s*furnished")
+RX_BARE_UNIT     = re.compile(r"bare\s*unit")
+RX_UNFURNISHED   = re.compile(r"\bunfurnished\b")
+RX_FAQ_PSF       = re.compile(r"(Current\s+PSF|Price\s+per\s+square\s+foot)", re.I)
+TENURE_RX        = re.compile(r'\b(Freehold|Leasehold)(?:\s*tenure)?\b', re.I)
+TENURE_NOISE_RX  = re.compile(r'psf|floor|built', re.I)
+
+
+def scan_html_keys(html):
+    """
+    Walk the raw HTML once and return the highest-priority hit per field:
+      {"psf": float|None, "builtUp": str, "sizeUnit": str, "furnishing": str,
+       "bedroom": str, "bathroom": str, "meta_blocks": [str, ...]}
+    """
+    psf_hits = {}
+    attrs = {}
+    meta_blocks = []
+    for m in RX_HTML_SCAN.finditer(html or ""):
+        if m.group("attrs") is not None:
+            for a in RX_ATTR_KEY.finditer(m.group("attrs")):
+                attrs.setdefault(a.group(1).lower(), a.group(2))
+        elif m.group("meta") is not None:
+            meta_blocks.append(m.group("meta"))
+        else:
+            key = m.group("psf_key").lower()
+            if key in psf_hits:
+                continue
+            raw = m.group("psf_str")
+            if key in PSF_NUMERIC_KEYS:
+                if raw is not None:
+                    lead = RX_LEADING_NUM.match(raw)
+                    raw = lead.group(0) if lead else None
+                else:
+                    raw = m.group("psf_num")
+            if raw is not None:
+                psf_hits[key] = raw
+
+    psf = None
+    for key in PSF_KEYS:
+        raw = psf_hits.get(key.lower())
+        if raw is not None:
+            psf = _num(raw)
+            if psf is not None:
+                break
+    out = {k: attrs.get(k.lower(), "") for k in ATTR_KEYS}
+    out["psf"] = psf
+    out["meta_blocks"] = meta_blocks
+    return out
+
+# ------------------- CANDIDATE PATHS -------------------
+# jget-style paths, tried in order. Relative to props.pageProps.pageData.data
+# unless noted; root-scanning helpers also try them on the outer JSON roots.
+URL_PATHS = [
+    ["listingData", "shareLink"],
+    ["listingData", "url"],
+]
+PRICE_PATHS = [
+    ["listingData", "price", "min"],
+    ["listingData", "price", "max"],
+    ["listingData", "price", "value"],
+    ["propertyOverviewData", "propertyInfo", "price", "amount"],
+]
+RENT_SALE_PATHS = [
+    ["listingData", "channel"],
+    ["listingData", "listingType"],
+    ["listingData", "type"],
+]
+ATTRIBUTE_BASE_PATHS = [
+    ["listingData", "attributes"],
+    ["listingDetail", "attributes"],  # React-Flight
+]
+PSF_PATHS = [
+    base + [key]
+    for key in PSF_KEYS
+    for base in (["listingData"], ["listingData", "attributes"], ["propertyOverviewData", "propertyInfo"])
+]
+METATABLE_ITEMS_PATHS = [
+    ["detailsData", "metatable", "items"],
+    ["detailsData", "metaTable", "items"],
+]
+BED_BATH_AMENITY_PATHS = [
+    ["propertyOverviewData", "propertyInfo", "amenities"],
+]
+PHONE_AGENT_PATHS = [
+    (["contactAgentData", "contactAgentCard", "agentInfoProps", "agent"], ("mobile", "phone", "phonePretty")),
+    (["contactAgentData", "contactAgentStickyBar", "agentInfoProps", "agent"], ("mobile", "phone", "phonePretty")),
+    (["listingData", "agent"], ("mobile", "agentMobile", "phone", "phonePretty")),
+]
+AGENCY_NAME_PATHS = [
+    ["contactAgentData", "contactAgentCard", "agency", "name"],
+]
+AGENCY_ID_PATHS = [
+    (["enquiryModalData", "agency", "id"], "enquiryModalData.agency.id"),
+    (["contactAgentData", "contactAgentCard", "agency", "id"], "contactAgentData.contactAgentCard.agency.id"),
+    (["contactAgentData", "contactAgentStickyBar", "agency", "id"], "contactAgentData.contactAgentStickyBar.agency.id"),
+    (["organisation", "organisationId"], "flight.organisation.organisationId"),
+    (["organisations", 0, "id"], "flight.organisations[0].id"),
+]
+ADDRESS_PATHS = [
+    ["propertyOverviewData", "propertyInfo", "fullAddress"],
+]
+LISTER_URL_PATHS = [
+    ["contactAgentData", "contactAgentCard", "agentInfoProps", "agent", "profileUrl"],
+    ["contactAgentData", "contactAgentStickyBar", "agentInfoProps", "agent", "profileUrl"],
+    ["listingData", "agent", "profileUrl"],
+    ["contactAgentData", "contactAgentCard", "agentInfoProps", "agent", "website"],
+    ["contactAgentData", "contactAgentStickyBar", "agentInfoProps", "agent", "website"],
+    ["listingData", "agent", "website"],
+    ["listers", 0, "website"],
+    ["lister", "website"],
+]
+LICENSE_AGENT_PATHS = [
+    ["contactAgentData", "contactAgentCard", "agentInfoProps", "agent"],
+    ["contactAgentData", "contactAgentStickyBar", "agentInfoProps", "agent"],
+    ["listingData", "agent"],
+    ["props", "pageProps", "pageData", "data", "listingData", "agent"],
+    ["pageProps", "pageData", "data", "listingData", "agent"],
+]
+AMENITY_LIST_PATHS = [
+    ["props", "pageProps", "pageData", "data", "amenitiesData"],
+    ["pageProps", "pageData", "data", "amenitiesData"],
+    ["props", "pageProps", "pageData", "data", "facilitiesData"],
+]
+LIC_VALUE_RX = re.compile(r"(?i)(REN|PEA|REA)\s*[:\-]?\s*(\d{3,7})")
+AMENITY_DROP_RE = re.compile(r"\b(psf|floor|built|tenure|title)\b", re.I)
+
+def pick_path(obj, paths):
+    """Return (value, path) for the first non-blank candidate path, else (None, None)."""
+    for p in paths:
+        v = jget(obj, p)
+        if isinstance(v, (list, dict)):
+            if v:
+                return v, p
+        elif not _is_blank(v):
+            return v, p
+    return None, None
+
+# ------------------- FIELD EXTRACTORS -------------------
+
 def extract_url(html, soup):
     m = re.search(r'"shareLink"\s*:\s*"([^"]+)"', html, re.I)
     if m:
@@ -196,44 +386,111 @@ def extract_price(html, soup):
 
 def is_rent_page(soup):
     for item in soup.select(".meta-table__item"):
-        if re.search(r"\bfor\s+rent\b", item.get_text(" ", strip=True), re.I):
+        if RX_FOR_RENT.search(item.get_text(" ", strip=True)):
             return True
     ttl = soup.title.get_text() if soup.title else ""
-    if re.search(r"\bfor\s+rent\b", ttl, re.I):
+    if RX_FOR_RENT.search(ttl):
         return True
     og = soup.find("meta", property="og:title")
-    if og and re.search(r"\bfor\s+rent\b", og.get("content", ""), re.I):
+    if og and RX_FOR_RENT.search(og.get("content", "")):
         return True
     return False
 
-def _extract_state_metatable_blocks(html):
+def _extract_state_metatable_blocks(html, keys=None):
     # STRICT: only scan metaTable/metatable items[]
-    for mm in re.finditer(
-        r'(?:"metatable"|"metaTable")\s*:\s*{[^{}]*"items"\s*:\s*\[(.*?)\]\s*}',
-        html, re.S | re.I
-    ):
-        yield mm.group(1)
+    keys = keys if keys is not None else scan_html_keys(html)
+    yield from keys["meta_blocks"]
 
+def _meta_values(html, keys=None, rx=RX_META_VALUE):
+    for block in _extract_state_metatable_blocks(html, keys):
+        for v in rx.finditer(block):
+            yield v.group(1)
 
+# The helpers below take metatable value strings, so the HTML scan and the
+# decoded __NEXT_DATA__ items share one set of rules.
+def _builtup_from_meta_values(values):
+    for txt in values:
+        if re.search(r"(built[\s-]?up|floor\s*area|size|keluasan|luas)", txt, re.I):
+            m2 = re.search(r"([0-9][0-9,\.]*)\s*(sq\.?\s*ft|sqft|sf|sqm|m²|sq\.m)", txt, re.I)
+            if m2:
+                return _num(m2.group(1)), m2.group(2)
+    return None, ""
 
-def extract_builtup(html, soup):
-    m = re.search(r'"attributes"\s*:\s*{[^{}]*"builtUp"\s*:\s*"([^"]+)"', html, re.S | re.I)
-    if m:
-        raw = m.group(1)
+def _psf_from_meta_values(values):
+    for txt in values:
+        if RX_PSF_WORD.search(txt) and not RX_LAND_WORD.search(txt):
+            n = _num(txt)
+            if n is not None:
+                return n
+    return None
+
+def _tenure_from_meta_values(values):
+    for val in values:
+        val = (val or "").strip()
+        m = TENURE_RX.search(val)
+        if m and not TENURE_NOISE_RX.search(val):
+            return m.group(1).title()  # -> "Freehold"/"Leasehold"
+    return ""
+
+def _car_park_from_meta_values(values):
+    raw_list = []
+    for val in values:
+        val = (val or "").strip()
+        if RX_ATTR_NOISE.search(val):
+            continue
+        if CAR_PARK_RE.search(val):
+            raw_list.append(val)
+
+    best_raw = raw_list[-1] if raw_list else ""
+    max_n = 0
+    for r in raw_list:
+        for m in CAR_PARK_RE.finditer(r):
+            max_n = max(max_n, int(m.group(1)))
+    car_park = max_n if max_n > 0 else None
+    return car_park, best_raw, raw_list
+
+def _furnishing_from_meta_values(values):
+    for val in values:
+        if RX_ATTR_NOISE.search(val):
+            continue
+        if RX_FURNISH_TOKEN.search(val):
+            return val.strip()
+    return ""
+
+def _canonical_furnishing(raw):
+    canon = ""
+    if raw:
+        t = raw.lower()
+        if RX_FULLY_FURN.search(t):
+            canon = "Fully Furnished"
+        elif RX_PART_FURN.search(t):
+            canon = "Partially Furnished"
+        elif RX_BARE_UNIT.search(t):
+            canon = "Bare unit"
+        elif RX_UNFURNISHED.search(t):
+            canon = "Unfurnished"
+    return canon
+
+def _builtup_unit_guess(raw, size_unit):
+    return (size_unit
+            or ("sq ft" if re.search(r"ft|sq", raw, re.I) else ("sqm" if re.search(r"m²|sqm|meter", raw, re.I) else "sq ft")))
+
+def _dom(soup):
+    """html/soup/keys extractors take a parsed soup or a zero-arg callable parsing it on first use."""
+    return soup if hasattr(soup, "select") else soup()
+
+def extract_builtup(html, soup, keys=None):
+    keys = keys if keys is not None else scan_html_keys(html)
+    raw = keys["builtUp"]
+    if raw:
         val = _num(raw)
-        mu = re.search(r'"attributes"\s*:\s*{[^{}]*"sizeUnit"\s*:\s*"([^"]+)"', html, re.S | re.I)
-        unit = (mu.group(1) if mu
-                else ("sq ft" if re.search(r"ft|sq", raw, re.I) else ("sqm" if re.search(r"m²|sqm|meter", raw, re.I) else "sq ft")))
+        unit = _builtup_unit_guess(raw, keys["sizeUnit"])
         if val:
             return val, unit
-    for block in _extract_state_metatable_blocks(html):
-        for v in re.finditer(r'"(?:value|valueText|text)"\s*:\s*"([^"]+)"', block, re.I):
-
-            txt = v.group(1)
-            if re.search(r"(built[\s-]?up|floor\s*area|size|keluasan|luas)", txt, re.I):
-                m2 = re.search(r"([0-9][0-9,\.]*)\s*(sq\.?\s*ft|sqft|sf|sqm|m²|sq\.m)", txt, re.I)
-                if m2:
-                    return _num(m2.group(1)), m2.group(2)
+    val, unit = _builtup_from_meta_values(_meta_values(html, keys))
+    if val is not None:
+        return val, unit
+    soup = _dom(soup)
     for item in soup.select(".meta-table__item"):
         txt = item.get_text(" ", strip=True)
         if re.search(r"(built[\s-]?up|floor\s*area|size|keluasan|luas)", txt, re.I):
@@ -256,58 +513,30 @@ def extract_builtup(html, soup):
             return _num(m2.group(1)), m2.group(2)
     return None, ""
 
-def extract_builtup_psf(html, soup):
-    m = re.search(r'"pricePerSizeUnitBuiltUp"\s*:\s*"([^"]+)"', html, re.I)
-    if m:
-        n = _num(m.group(1))
-        if n is not None:
-            return n
-    for key in [
-        "minimumPricePerSizeUnitBuiltUp", "maximumPricePerSizeUnitBuiltUp",
-        "minimumPricePerSizeUnit", "maximumPricePerSizeUnit"
-    ]:
-        m = re.search(rf'"{key}"\s*:\s*"([^"]+)"', html, re.I)
-        if m:
-            n = _num(m.group(1))
-            if n is not None:
-                return n
-    for key in ["floorAreaPsf", "builtUpPsf"]:
-        m = re.search(rf'"{key}"\s*:\s*"?([0-9][0-9,\.]*)"?', html, re.I)
-        if m:
-            n = _num(m.group(1))
-            if n is not None:
-                return n
-    for block in _extract_state_metatable_blocks(html):
-        for v in re.finditer(r'"value"\s*:\s*"([^"]+)"', block, re.I):
-            txt = v.group(1)
-            if re.search(r"\bpsf\b", txt, re.I) and not re.search(r"\bland\b", txt, re.I):
-                n = _num(txt)
-                if n is not None:
-                    return n
+def extract_builtup_psf(html, soup, keys=None):
+    keys = keys if keys is not None else scan_html_keys(html)
+    if keys["psf"] is not None:
+        return keys["psf"]
+    n = _psf_from_meta_values(_meta_values(html, keys, RX_META_VALUE_ONLY))
+    if n is not None:
+        return n
+    soup = _dom(soup)
     for item in soup.select(".meta-table__item"):
         txt = item.get_text(" ", strip=True)
-        if re.search(r"\bpsf\b", txt, re.I) and not re.search(r"\bland\b", txt, re.I):
+        if RX_PSF_WORD.search(txt) and not RX_LAND_WORD.search(txt):
             n = _num(txt)
             if n is not None:
                 return n
-    faq = soup.find(string=re.compile(r"(Current\s+PSF|Price\s+per\s+square\s+foot)", re.I))
+    faq = soup.find(string=RX_FAQ_PSF)
     if faq:
         n = _num(faq.parent.get_text(" ", strip=True))
         if n is not None:
             return n
     return None
 
-def extract_tenure(html, soup):
-    TENURE_RX = re.compile(r'\b(Freehold|Leasehold)(?:\s*tenure)?\b', re.I)
-    NOISE_RX  = re.compile(r'psf|floor|built', re.I)
-
-    for block in _extract_state_metatable_blocks(html):
-        # some items use value/valueText/text
-        for v in re.finditer(r'"(?:value|valueText|text)"\s*:\s*"([^"]+)"', block, re.I):
-            val = (v.group(1) or "").strip()
-            if TENURE_RX.search(val) and not NOISE_RX.search(val):
-                return TENURE_RX.search(val).group(1).title()  # -> "Freehold"/"Leasehold"
-    return ""
+def extract_tenure(html, soup, keys=None):
+    # some items use value/valueText/text
+    return _tenure_from_meta_values(_meta_values(html, keys))
 
 
 BED_RE = re.compile(r"\bbed(?:room)?s?\b|\bbilik(?:\s*tidur)?\b|\b\d+\s*R\b", re.I)
@@ -324,31 +553,36 @@ def _normalize_beds_baths_token(tok):
     m = re.search(r"(\d+)", tok)
     return (int(m.group(1)) if m else None), tok
 
-def extract_bed_bath(html, soup):
+def _bed_bath_from_amenities(amenities):
     bed_raw = bath_raw = None
     bed_n = bath_n = None
-    m_bed = re.search(r'"attributes"\s*:\s*{[^{}]*"bedroom"\s*:\s*"([^"]+)"', html, re.I)
-    m_bath = re.search(r'"attributes"\s*:\s*{[^{}]*"bathroom"\s*:\s*"([^"]+)"', html, re.I)
-    if m_bed:
-        bed_n, bed_raw = _normalize_beds_baths_token(m_bed.group(1))
-    if m_bath:
-        bath_n, bath_raw = _normalize_beds_baths_token(m_bath.group(1))
+    try:
+        if isinstance(amenities, list):
+            for it in amenities:
+                name = (it.get("unit") or it.get("name") or it.get("label") or "").strip()
+                if name.lower() in {"beds", "bed", "bedrooms"}:
+                    bed_n, bed_raw = _normalize_beds_baths_token(str(it.get("value") or it.get("text") or it.get("valueText") or ""))
+                if name.lower() in {"baths", "bath", "bathrooms"}:
+                    bath_n, bath_raw = _normalize_beds_baths_token(str(it.get("value") or it.get("text") or it.get("valueText") or ""))
+    except Exception:
+        pass
+    return bed_n, bath_n, bed_raw, bath_raw
+
+def extract_bed_bath(html, soup, keys=None):
+    bed_raw = bath_raw = None
+    bed_n = bath_n = None
+    keys = keys if keys is not None else scan_html_keys(html)
+    if keys["bedroom"]:
+        bed_n, bed_raw = _normalize_beds_baths_token(keys["bedroom"])
+    if keys["bathroom"]:
+        bath_n, bath_raw = _normalize_beds_baths_token(keys["bathroom"])
     if bed_n or bath_n:
         return bed_n, bath_n, bed_raw, bath_raw
+    soup = _dom(soup)
     for root in _collect_all_json(soup):
-        try:
-            amenities = jget(root, ["propertyOverviewData", "propertyInfo", "amenities"])
-            if isinstance(amenities, list):
-                for it in amenities:
-                    name = (it.get("unit") or it.get("name") or it.get("label") or "").strip()
-                    if name.lower() in {"beds", "bed", "bedrooms"}:
-                        bed_n, bed_raw = _normalize_beds_baths_token(str(it.get("value") or it.get("text") or it.get("valueText") or ""))
-                    if name.lower() in {"baths", "bath", "bathrooms"}:
-                        bath_n, bath_raw = _normalize_beds_baths_token(str(it.get("value") or it.get("text") or it.get("valueText") or ""))
-            if bed_n or bath_n:
-                return bed_n, bath_n, bed_raw, bath_raw
-        except Exception:
-            pass
+        found = _bed_bath_from_amenities(jget(root, ["propertyOverviewData", "propertyInfo", "amenities"]))
+        if found[0] or found[1]:
+            return found
     bed_el = soup.select_one('.wide-property-snapshot-info [da-id="amenity-beds"] .amenity-value')
     bath_el = soup.select_one('.wide-property-snapshot-info [da-id="amenity-baths"] .amenity-value')
     if bed_el:
@@ -395,48 +629,21 @@ CAR_PARK_RE = re.compile(
     re.I
 )
 
-def extract_car_park(html, soup):
-    raw_list = []
-
-    for block in _extract_state_metatable_blocks(html):
-        for v in re.finditer(r'"(?:value|valueText|text)"\s*:\s*"([^"]+)"', block, re.I):
-            val = (v.group(1) or "").strip()
-            if re.search(r"psf|floor|built|title", val, re.I):
-                continue
-            if CAR_PARK_RE.search(val):
-                raw_list.append(val)
+def extract_car_park(html, soup, keys=None):
+    return _car_park_from_meta_values(_meta_values(html, keys))
 
-    best_raw = raw_list[-1] if raw_list else ""
-    max_n = 0
-    for r in raw_list:
-        for m in CAR_PARK_RE.finditer(r):
-            max_n = max(max_n, int(m.group(1)))
-    car_park = max_n if max_n > 0 else None
-    return car_park, best_raw, raw_list
 
+def _phone_candidates(root):
+    for base, ks in PHONE_AGENT_PATHS:
+        node = jget(root, base) or {}
+        if isinstance(node, dict):
+            for k in ks:
+                v = node.get(k)
+                if v and not _is_blank(v):
+                    yield v
 
-def extract_lister_phone(soup):
+def _best_phone(best_candidates):
     digits = raw = ""
-    best_candidates = []
-    for root in _collect_all_json(soup):
-        ag = jget(root, ["contactAgentData", "contactAgentCard", "agentInfoProps", "agent"]) or {}
-        if isinstance(ag, dict):
-            for k in ("mobile", "phone", "phonePretty"):
-                v = ag.get(k)
-                if v and not _is_blank(v):
-                    best_candidates.append(v)
-        ags = jget(root, ["contactAgentData", "contactAgentStickyBar", "agentInfoProps", "agent"]) or {}
-        if isinstance(ags, dict):
-            for k in ("mobile", "phone", "phonePretty"):
-                v = ags.get(k)
-                if v and not _is_blank(v):
-                    best_candidates.append(v)
-        lst = jget(root, ["listingData", "agent"]) or {}
-        if isinstance(lst, dict):
-            for k in ("mobile", "agentMobile", "phone", "phonePretty"):
-                v = lst.get(k)
-                if v and not _is_blank(v):
-                    best_candidates.append(v)
     if best_candidates:
         def score(x):
             s = str(x)
@@ -449,10 +656,16 @@ def extract_lister_phone(soup):
         digits = _digits_only(raw)
     return raw, digits
 
+def extract_lister_phone(soup):
+    best_candidates = []
+    for root in _collect_all_json(soup):
+        best_candidates.extend(_phone_candidates(root))
+    return _best_phone(best_candidates)
+
 def extract_agency_name(soup):
     for root in _collect_all_json(soup):
-        nm = jget(root, ["contactAgentData", "contactAgentCard", "agency", "name"])
-        if not _is_blank(nm):
+        nm, _ = pick_path(root, AGENCY_NAME_PATHS)
+        if nm is not None:
             return str(nm).strip()
     el = soup.select_one('[da-id="agent-agency-name"]')
     if el:
@@ -461,70 +674,39 @@ def extract_agency_name(soup):
             return txt
     return ""
 
+def _agency_id_from_root(root):
+    for path, source in AGENCY_ID_PATHS:
+        v = jget(root, path)
+        if not _is_blank(v):
+            return str(v).strip(), source
+    return "", ""
+
 def extract_agency_id(soup):
-    source = ""
     for root in _collect_all_json(soup):
-        v = jget(root, ["enquiryModalData", "agency", "id"])
-        if not _is_blank(v):
-            return str(v).strip(), "enquiryModalData.agency.id"
-        v = jget(root, ["contactAgentData", "contactAgentCard", "agency", "id"])
-        if not _is_blank(v):
-            return str(v).strip(), "contactAgentData.contactAgentCard.agency.id"
-        v = jget(root, ["contactAgentData", "contactAgentStickyBar", "agency", "id"])
-        if not _is_blank(v):
-            return str(v).strip(), "contactAgentData.contactAgentStickyBar.agency.id"
-        v = jget(root, ["organisation", "organisationId"])
-        if not _is_blank(v):
-            return str(v).strip(), "flight.organisation.organisationId"
-        orgs = jget(root, ["organisations"])
-        if isinstance(orgs, list) and orgs:
-            v = orgs[0].get("id")
-            if not _is_blank(v):
-                return str(v).strip(), "flight.organisations[0].id"
-    return "", source
-
-def extract_furnishing(html, soup):
-    raw = ""
-    m = re.search(r'"attributes"\s*:\s*{[^{}]*"furnishing"\s*:\s*"([^"]+)"', html, re.I)
-    if m:
-        raw = m.group(1).strip()
-    if _is_blank(raw):
-        for block in _extract_state_metatable_blocks(html):
-            for v in re.finditer(r'"(?:value|valueText|text)"\s*:\s*"([^"]+)"', block, re.I):
+        v, source = _agency_id_from_root(root)
+        if v:
+            return v, source
+    return "", ""
 
-                val = v.group(1)
-                if re.search(r"psf|floor|built|title", val, re.I):
-                    continue
-                if re.search(r"\b(fully\s*furnished|part(?:ly|ially)\s*furnished|unfurnished|bare\s*unit)\b", val, re.I):
-                    raw = val.strip()
-                    break
-            if raw:
-                break
+def extract_furnishing(html, soup, keys=None):
+    keys = keys if keys is not None else scan_html_keys(html)
+    raw = keys["furnishing"].strip()
+    if _is_blank(raw):
+        raw = _furnishing_from_meta_values(_meta_values(html, keys))
     if _is_blank(raw):
-        for item in soup.select('.meta-table-root[da-id="property-details"] .meta-table__item__wrapper__value, .meta-table-root[da-id="property-details"] .meta-table__item__wrapper .amenity-value'):
+        for item in _dom(soup).select('.meta-table-root[da-id="property-details"] .meta-table__item__wrapper__value, .meta-table-root[da-id="property-details"] .meta-table__item__wrapper .amenity-value'):
             val = item.get_text(" ", strip=True)
-            if re.search(r"psf|floor|built|title", val, re.I):
+            if RX_ATTR_NOISE.search(val):
                 continue
-            if re.search(r"\b(fully\s*furnished|part(?:ly|ially)\s*furnished|unfurnished|bare\s*unit)\b", val, re.I):
+            if RX_FURNISH_TOKEN.search(val):
                 raw = val.strip()
                 break
-    canon = ""
-    if raw:
-        t = raw.lower()
-        if re.search(r"fully\s*furnished", t):
-            canon = "Fully Furnished"
-        elif re.search(r"part(?:ly|ially)\s*furnished", t):
-            canon = "Partially Furnished"
-        elif re.search(r"bare\s*unit", t):
-            canon = "Bare unit"
-        elif re.search(r"\bunfurnished\b", t):
-            canon = "Unfurnished"
-    return canon, raw
+    return _canonical_furnishing(raw), raw
 
 def extract_full_address(soup):
     for root in _collect_all_json(soup):
-        v = jget(root, ["propertyOverviewData", "propertyInfo", "fullAddress"])
-        if not _is_blank(v):
+        v, _ = pick_path(root, ADDRESS_PATHS)
+        if v is not None:
             return _normalize_address(str(v).strip()), "state.fullAddress"
     for o in extract_ld_objects(soup, "RealEstateListing"):
         try:
@@ -556,23 +738,20 @@ def extract_lister_url(soup):
             href = "https://www.iproperty.com.my" + href
         return href
     for root in _collect_all_json(soup):
-        for p in [
-            ["contactAgentData", "contactAgentCard", "agentInfoProps", "agent", "profileUrl"],
-            ["contactAgentData", "contactAgentStickyBar", "agentInfoProps", "agent", "profileUrl"],
-            ["listingData", "agent", "profileUrl"],
-            ["contactAgentData", "contactAgentCard", "agentInfoProps", "agent", "website"],
-            ["contactAgentData", "contactAgentStickyBar", "agentInfoProps", "agent", "website"],
-            ["listingData", "agent", "website"],
-            ["listers", 0, "website"],
-            ["lister", "website"],
-        ]:
-            v = jget(root, p)
-            if not _is_blank(v):
-                href = str(v).strip()
-                if href.startswith("/"):
-                    href = "https://www.iproperty.com.my" + href
-                if href.lower().startswith(("http://", "https://")):
-                    return href
+        href = _lister_url_from_root(root)
+        if href:
+            return href
+    return ""
+
+def _lister_url_from_root(root):
+    for p in LISTER_URL_PATHS:
+        v = jget(root, p)
+        if not _is_blank(v):
+            href = str(v).strip()
+            if href.startswith("/"):
+                href = "https://www.iproperty.com.my" + href
+            if href.lower().startswith(("http://", "https://")):
+                return href
     return ""
 
 LIC_KEYS = ["license", "licenseNumber", "renNo", "ren", "registrationNo"]
@@ -588,74 +767,62 @@ def extract_license_visible_text(soup):
             texts.append(t)
     return " ".join(texts)
 
+def _license_from_root(root):
+    for base in LICENSE_AGENT_PATHS:
+        node = jget(root, base)
+        if isinstance(node, dict):
+            for k in LIC_KEYS:
+                v = node.get(k)
+                if not _is_blank(v):
+                    val = str(v).strip()
+                    m = LIC_VALUE_RX.search(val)
+                    if m:
+                        return f"{m.group(1).upper()} {m.group(2)}"
+    return ""
+
 def extract_license_ren(soup, dom_text):
     for root in _collect_all_json(soup):
-        for base in [
-            ["contactAgentData", "contactAgentCard", "agentInfoProps", "agent"],
-            ["contactAgentData", "contactAgentStickyBar", "agentInfoProps", "agent"],
-            ["listingData", "agent"],
-            ["props", "pageProps", "pageData", "data", "listingData", "agent"],
-            ["pageProps", "pageData", "data", "listingData", "agent"],
-        ]:
-            node = jget(root, base)
-            if isinstance(node, dict):
-                for k in LIC_KEYS:
-                    v = node.get(k)
-                    if not _is_blank(v):
-                        val = str(v).strip()
-                        m = re.search(r"(?i)(REN|PEA|REA)\s*[:\-]?\s*(\d{3,7})", val)
-                        if m:
-                            return f"{m.group(1).upper()} {m.group(2)}"
+        lic = _license_from_root(root)
+        if lic:
+            return lic
     m = REN_PAT.search(dom_text)
     if m:
         return f"REN {m.group(1)}"
     return ""
 
-def extract_amenities(soup, html):
-    result = []
-    for root in _collect_all_json(soup):
-        for p in [
-            ["props", "pageProps", "pageData", "data", "amenitiesData"],
-            ["pageProps", "pageData", "data", "amenitiesData"],
-            ["props", "pageProps", "pageData", "data", "facilitiesData"],
-        ]:
+def _item_text(it):
+    if isinstance(it, str):
+        return it.strip()
+    if isinstance(it, dict):
+        return (it.get("text") or it.get("value") or it.get("valueText") or it.get("name") or it.get("label") or "").strip()
+    return ""
+
+def _amenity_candidates(roots):
+    # Lazy: _clean_amenities() stops pulling (and the label walk stops) at the cap.
+    walked = set()
+    for root in roots:
+        for p in AMENITY_LIST_PATHS:
             arr = jget(root, p)
             if isinstance(arr, list):
                 for it in arr:
-                    cand = (it.get("text") or it.get("value") or it.get("valueText") or it.get("name") or it.get("label") or "").strip()
+                    cand = _item_text(it) if isinstance(it, dict) else ""
                     if cand:
-                        result.append(cand)
-        for key in ("Facilities", "Amenities"):
-            items = _scan_label_items(root, key)
-            for cand in items:
-                result.append(cand)
+                        yield cand
+        yield from _iter_label_items(root, AMENITY_LABELS, walked)
         for key in ("facilities", "amenities"):
             arr = jget(root, [key])
             if isinstance(arr, list):
                 for it in arr:
-                    if isinstance(it, str):
-                        result.append(it.strip())
-                    elif isinstance(it, dict):
-                        cand = (it.get("text") or it.get("value") or it.get("valueText") or it.get("name") or it.get("label") or "").strip()
-                        if cand:
-                            result.append(cand)
-    if not result:
-        for htxt in ("Facilities", "Amenities"):
-            hdr = soup.find(lambda tag: tag.name in ("h2", "h3", "h4") and (tag.get_text(strip=True) == htxt))
-            if hdr:
-                sib = hdr.find_next_sibling()
-                while sib and sib.name not in ("h2", "h3", "h4"):
-                    for chip in sib.find_all(["li", "span", "div"], recursive=True):
-                        t = chip.get_text(" ", strip=True)
-                        if t:
-                            result.append(t)
-                    sib = sib.find_next_sibling()
+                    cand = _item_text(it)
+                    if cand:
+                        yield cand
+
+def _clean_amenities(result):
     cleaned = []
     seen = set()
-    DROP_RE = re.compile(r"\b(psf|floor|built|tenure|title)\b", re.I)
     for x in result:
         t = re.sub(r"\s+", " ", x).strip()
-        if not t or DROP_RE.search(t):
+        if not t or AMENITY_DROP_RE.search(t):
             continue
         key = t.lower()
         if key not in seen:
@@ -665,27 +832,330 @@ def extract_amenities(soup, html):
             break
     return cleaned
 
-def _scan_label_items(obj, label_name):
-    out = []
-    if isinstance(obj, dict):
-        for k, v in obj.items():
-            if isinstance(v, (dict, list)):
-                out.extend(_scan_label_items(v, label_name))
-        if str(obj.get("label") or obj.get("title") or "").strip().lower() == label_name.lower():
-            arr = obj.get("items") or obj.get("data") or obj.get("values") or obj.get("value")
+def extract_amenities(soup, html):
+    cleaned = _clean_amenities(_amenity_candidates(_collect_all_json(soup)))
+    if cleaned:
+        return cleaned
+    result = []
+    for htxt in ("Facilities", "Amenities"):
+        hdr = soup.find(lambda tag: tag.name in ("h2", "h3", "h4") and (tag.get_text(strip=True) == htxt))
+        if hdr:
+            sib = hdr.find_next_sibling()
+            while sib and sib.name not in ("h2", "h3", "h4"):
+                for chip in sib.find_all(["li", "span", "div"], recursive=True):
+                    t = chip.get_text(" ", strip=True)
+                    if t:
+                        result.append(t)
+                sib = sib.find_next_sibling()
+    return _clean_amenities(result)
+
+AMENITY_LABELS = {"facilities", "amenities"}
+
+def _iter_label_items(obj, labels, walked=None):
+    """
+    Yield item texts under every node whose label/title is in `labels`, in one
+    iterative walk. Children come before the node's own items (post-order, as the
+    old recursive scan did). `walked` holds id()s of visited containers and can be
+    shared across roots, so nested roots from _collect_all_json are not walked again.
+    """
+    walked = set() if walked is None else walked
+    stack = [(obj, False)]
+    while stack:
+        node, children_done = stack.pop()
+        if children_done:
+            arr = node.get("items") or node.get("data") or node.get("values") or node.get("value")
             if isinstance(arr, list):
                 for it in arr:
-                    if isinstance(it, str):
-                        out.append(it.strip())
-                    elif isinstance(it, dict):
-                        cand = (it.get("text") or it.get("value") or it.get("valueText") or it.get("name") or it.get("label") or "").strip()
-                        if cand:
-                            out.append(cand)
-    elif isinstance(obj, list):
-        for it in obj:
-            out.extend(_scan_label_items(it, label_name))
+                    cand = _item_text(it)
+                    if cand:
+                        yield cand
+            continue
+        if not isinstance(node, (dict, list)) or id(node) in walked:
+            continue
+        walked.add(id(node))
+        if isinstance(node, dict):
+            if str(node.get("label") or node.get("title") or "").strip().lower() in labels:
+                stack.append((node, True))
+            children = node.values()
+        else:
+            children = node
+        stack.extend((v, False) for v in reversed([v for v in children if isinstance(v, (dict, list))]))
+
+# ------------------- JSON-FIRST (NEXT.JS) -------------------
+RX_NEXT_DATA = re.compile(r'<script[^>]*\bid=["\']__NEXT_DATA__["\'][^>]*>(.*?)</script>', re.S | re.I)
+
+def load_next_data(html):
+    """Decode the __NEXT_DATA__ script straight from the HTML (no DOM parse)."""
+    m = RX_NEXT_DATA.search(html or "")
+    if not m:
+        return None
+    try:
+        data = json.loads(m.group(1))
+    except Exception:
+        return None
+    return data if isinstance(data, dict) else None
+
+def _json_meta_values(dd, fields=("value", "valueText", "text")):
+    items, _ = pick_path(dd, METATABLE_ITEMS_PATHS)
+    if isinstance(items, list):
+        for it in items:
+            if isinstance(it, dict):
+                for k in fields:
+                    v = it.get(k)
+                    if isinstance(v, str) and v:
+                        yield v
+
+def _scalar(v):
+    return v if isinstance(v, (str, int, float)) and not isinstance(v, bool) else None
+
+def extract_from_next_data(data):
+    """
+    Resolve fields from a decoded __NEXT_DATA__ document via the *_PATHS lists.
+    Returns only what was found, in the same shapes as the HTML extractors;
+    extract_row() falls back to regex/DOM for anything missing.
+    """
+    roots = _expand_roots(data)
+    dd = jget(data, ["props", "pageProps", "pageData", "data"])
+    if not isinstance(dd, dict) or not dd:
+        return {}
+    out = {}
+
+    v, _ = pick_path(dd, URL_PATHS)
+    if _scalar(v) is not None:
+        href = str(v).strip()
+        if href.startswith("/"):
+            href = "https://www.iproperty.com.my" + href
+        out["url"] = href
+
+    attrs, _ = pick_path(dd, ATTRIBUTE_BASE_PATHS)
+    attrs = attrs if isinstance(attrs, dict) else {}
+
+    raw = _scalar(attrs.get("builtUp"))
+    if not _is_blank(raw):
+        val = _num(raw)
+        if val:
+            out["builtup"] = (val, _builtup_unit_guess(str(raw), str(_scalar(attrs.get("sizeUnit")) or "")))
+    if "builtup" not in out:
+        val, unit = _builtup_from_meta_values(_json_meta_values(dd))
+        if val is not None:
+            out["builtup"] = (val, unit)
+
+    for p in PSF_PATHS:
+        n = _num(_scalar(jget(dd, p)))
+        if n is not None:
+            out["psf"] = n
+            break
+    if "psf" not in out:
+        n = _psf_from_meta_values(_json_meta_values(dd, ("value",)))
+        if n is not None:
+            out["psf"] = n
+
+    tenure = _tenure_from_meta_values(_json_meta_values(dd))
+    if tenure:
+        out["tenure"] = tenure
+
+    bed_n = bath_n = bed_raw = bath_raw = None
+    if not _is_blank(_scalar(attrs.get("bedroom"))):
+        bed_n, bed_raw = _normalize_beds_baths_token(str(attrs["bedroom"]))
+    if not _is_blank(_scalar(attrs.get("bathroom"))):
+        bath_n, bath_raw = _normalize_beds_baths_token(str(attrs["bathroom"]))
+    if not (bed_n or bath_n):
+        amenities, _ = pick_path(dd, BED_BATH_AMENITY_PATHS)
+        bed_n, bath_n, bed_raw, bath_raw = _bed_bath_from_amenities(amenities)
+    if bed_n or bath_n:
+        out["bed_bath"] = (bed_n, bath_n, bed_raw, bath_raw)
+
+    car_park = _car_park_from_meta_values(_json_meta_values(dd))
+    if car_park[0] is not None:
+        out["car_park"] = car_park
+
+    furnishing_raw = str(_scalar(attrs.get("furnishing")) or "").strip()
+    if _is_blank(furnishing_raw):
+        furnishing_raw = _furnishing_from_meta_values(_json_meta_values(dd))
+    if not _is_blank(furnishing_raw):
+        out["furnishing"] = (_canonical_furnishing(furnishing_raw), furnishing_raw)
+
+    v, _ = pick_path(dd, ADDRESS_PATHS)
+    if v is not None:
+        out["address"] = (_normalize_address(str(v).strip()), "state.fullAddress")
+
+    v, _ = pick_path(dd, PRICE_PATHS)
+    if _num(_scalar(v)) is not None:
+        out["price"] = ("MYR", _num(v))
+
+    v, _ = pick_path(dd, RENT_SALE_PATHS)
+    t = str(_scalar(v) or "").lower()
+    if "rent" in t:
+        out["rent"] = True
+    elif "sale" in t or "buy" in t:
+        out["rent"] = False
+
+    phones = []
+    agency_name = agency_id = lister_url = license_no = None
+    for root in roots:
+        phones.extend(_phone_candidates(root))
+        if agency_name is None:
+            nm, _ = pick_path(root, AGENCY_NAME_PATHS)
+            agency_name = str(nm).strip() if nm is not None else None
+        if agency_id is None:
+            aid = _agency_id_from_root(root)
+            agency_id = aid if aid[0] else None
+        lister_url = lister_url or _lister_url_from_root(root)
+        license_no = license_no or _license_from_root(root)
+    if phones:
+        out["phone"] = _best_phone(phones)
+    if agency_name:
+        out["agency_name"] = agency_name
+    if agency_id:
+        out["agency_id"] = agency_id
+    if lister_url:
+        out["lister_url"] = lister_url
+    if license_no:
+        out["license"] = license_no
+    amenities = _clean_amenities(_amenity_candidates(roots))
+    if amenities:
+        out["amenities"] = amenities
     return out
 
+def extract_row(name, html, batch=False):
+    """
+    JSON-first: take what __NEXT_DATA__ provides, parse the DOM only for what's missing
+    (the html/soup/keys extractors get `soup` uncalled and parse only if their key scan misses).
+    With batch=True the raw price/area/unit/rent columns are returned instead of
+    built_up/built_up_psf, for derive_metrics() to compute over the whole batch.
+    """
+    data = load_next_data(html)
+    j = extract_from_next_data(data) if data else {}
+
+    lazy = {}
+    def soup():
+        if "soup" not in lazy:
+            lazy["soup"] = BeautifulSoup(html, "html.parser")
+        return lazy["soup"]
+    def keys():
+        if "keys" not in lazy:
+            lazy["keys"] = scan_html_keys(html)
+        return lazy["keys"]
+
+    url = j.get("url") or extract_url(html, soup()) or ""
+    b_val, b_unit = j.get("builtup") or extract_builtup(html, soup, keys())
+    psf = j["psf"] if "psf" in j else extract_builtup_psf(html, soup, keys())
+    rent = price = None
+    if psf is None:
+        rent = j["rent"] if "rent" in j else is_rent_page(soup())
+        cur, price = j.get("price") or extract_price(html, soup())
+    tenure = j.get("tenure") or extract_tenure(html, soup, keys())
+    bed_n, bath_n, bed_raw, bath_raw = j.get("bed_bath") or extract_bed_bath(html, soup, keys())
+    car_park, car_park_raw, car_park_list = j.get("car_park") or extract_car_park(html, soup, keys())
+    lister_phone_raw, lister_phone_digits = j.get("phone") or extract_lister_phone(soup())
+    agency_name = j.get("agency_name") or extract_agency_name(soup())
+    agency_id, agency_id_source = j.get("agency_id") or extract_agency_id(soup())
+    furnishing, furnishing_raw = j.get("furnishing") or extract_furnishing(html, soup, keys())
+    address, address_source = j.get("address") or extract_full_address(soup())
+    lister_url = j.get("lister_url") or extract_lister_url(soup())
+    license_no = j.get("license") or extract_license_ren(soup(), extract_license_visible_text(soup()))
+    amenities = j.get("amenities") or extract_amenities(soup(), html)
+
+    row = {
+        "file": name,
+        "url": url,
+        "tenure": tenure,
+        "bedroom": bed_n or "",
+        "bathroom": bath_n or "",
+        "bedroom_raw": bed_raw or "",
+        "bathroom_raw": bath_raw or "",
+        "car_park": car_park or "",
+        "car_park_raw": car_park_raw or "",
+        "car_park_raw_list": " | ".join(car_park_list) if car_park_list else "",
+        "lister_phone_raw": lister_phone_raw,
+        "lister_phone_digits": lister_phone_digits,
+        "agency_name": agency_name,
+        "agency_id": agency_id,
+        "agency_id_source": agency_id_source,
+        "furnishing": furnishing,
+        "furnishing_raw": furnishing_raw,
+        "address": address,
+        "address_source": address_source,
+        "lister_url": lister_url,
+        "license": license_no,
+        "amenities": "; ".join(amenities) if amenities else "",
+    }
+    if batch:
+        row.update({
+            "built_up_value": b_val, "built_up_unit": b_unit or "",
+            "psf_listed": psf, "price_value": price, "is_rent": rent,
+        })
+        return row
+
+    psf_source = "listed" if psf is not None else ""
+    area_sqft = _area_to_sqft(b_val, b_unit) if b_val else None
+    area_ok = bool(area_sqft) and PSF_AREA_BOUNDS[0] <= area_sqft <= PSF_AREA_BOUNDS[1]
+    price_ok = bool(price) and PSF_PRICE_BOUNDS[0] <= price <= PSF_PRICE_BOUNDS[1]
+    if psf is None and (not rent) and price and b_val and area_ok and price_ok:
+        psf = round(price / area_sqft, 2)
+        psf_source = "computed"
+    if b_val:
+        unit_str = "sq ft" if _is_sqft(b_unit) or (not b_unit) else ("sqm" if _is_sqm(b_unit) else str(b_unit))
+        built_up_str = f"{int(b_val) if float(b_val).is_integer() else b_val} {unit_str}"
+    else:
+        built_up_str = ""
+    row.update({
+        "built_up": built_up_str,
+        "built_up_psf": (f"{psf:.2f}" if isinstance(psf, (int, float)) else ""),
+        "price_value": price,
+        "built_up_sqft": area_sqft,
+        "built_up_psf_value": psf,
+        "psf_source": psf_source,
+        "area_in_bounds": area_ok,
+        "price_in_bounds": price_ok,
+    })
+    return row
+
+# ------------------- DERIVED METRICS (BATCH) -------------------
+def derive_metrics(rows):
+    """
+    Vectorized counterpart of the per-row PSF/area block in extract_row().
+    Takes rows from extract_row(batch=True) and returns a DataFrame with the
+    string columns (built_up, built_up_psf) plus typed numeric columns and
+    sanity flags (built_up_sqft, built_up_psf_value, psf_source, *_in_bounds).
+    """
+    df = pd.DataFrame(rows)
+    if df.empty:
+        return df.reindex(columns=FIELDNAMES)
+
+    val = pd.to_numeric(df["built_up_value"], errors="coerce")
+    unit_raw = df["built_up_unit"].fillna("").astype(str)
+    unit = unit_raw.str.lower()
+    is_sqft = unit.str.contains("ft|sf", regex=True)
+    is_sqm = unit.str.contains(r"sqm|m²|sq\.m|square meter", regex=True)
+    has_val = val.fillna(0).ne(0)
+
+    sqft = val.where(~is_sqm, val * SQM_TO_SQFT).where(has_val)
+    price = pd.to_numeric(df["price_value"], errors="coerce")
+    rent = df["is_rent"].eq(True)
+    listed = pd.to_numeric(df["psf_listed"], errors="coerce")
+
+    area_ok = sqft.between(*PSF_AREA_BOUNDS)
+    price_ok = price.fillna(0).ne(0) & price.between(*PSF_PRICE_BOUNDS)
+    computable = listed.isna() & ~rent & has_val & area_ok & price_ok
+    psf = listed.where(listed.notna(), (price / sqft).round(2).where(computable))
+
+    is_int = has_val & (val % 1 == 0)
+    val_str = pd.Series("", index=df.index)
+    val_str[is_int] = val[is_int].astype("int64").astype(str)
+    val_str[has_val & ~is_int] = val[has_val & ~is_int].astype(str)
+    unit_str = pd.Series(np.select([is_sqft | unit.eq(""), is_sqm], ["sq ft", "sqm"], unit_raw), index=df.index)
+
+    df["built_up"] = (val_str + " " + unit_str).where(has_val, "")
+    df["built_up_psf"] = pd.Series(np.char.mod("%.2f", psf.fillna(0).to_numpy()), index=df.index).where(psf.notna(), "")
+    df["price_value"] = price
+    df["built_up_sqft"] = sqft
+    df["built_up_psf_value"] = psf
+    df["psf_source"] = np.select([listed.notna(), computable], ["listed", "computed"], "")
+    df["area_in_bounds"] = area_ok
+    df["price_in_bounds"] = price_ok
+    return df.drop(columns=["built_up_value", "built_up_unit", "psf_listed", "is_rent"])
+
 # ------------------- FILE ITERATOR -------------------
 def iter_html_payloads(root):
     for dirpath, dirnames, filenames in os.walk(root):
@@ -735,95 +1205,70 @@ def iter_html_payloads(root):
                     continue
 
 # ------------------- MAIN -------------------
+FIELDNAMES = [
+    "file","url","tenure",
+    "bedroom","bathroom","bedroom_raw","bathroom_raw",
+    "car_park","car_park_raw","car_park_raw_list",
+    "lister_phone_raw","lister_phone_digits",
+    "agency_name","agency_id","agency_id_source",
+    "furnishing","furnishing_raw",
+    "address","address_source",
+    "lister_url","license",
+    "amenities",
+    "built_up","built_up_psf",
+    # typed columns
+    "price_value","built_up_sqft","built_up_psf_value","psf_source",
+    "area_in_bounds","price_in_bounds",
+]
+
+INT_COLUMNS = ("bedroom", "bathroom", "car_park")   # int or "" per row → nullable Int64
+
+def typed_frame(df):
+    """Parquet needs one type per column: counts become Int64, other mixed object columns strings."""
+    out = df.copy()
+    for c in INT_COLUMNS:
+        if c in out.columns:
+            out[c] = pd.to_numeric(out[c], errors="coerce").astype("Int64")
+    for c in out.columns:
+        if c not in INT_COLUMNS and out[c].dtype == object:
+            out[c] = out[c].astype("string")
+    return out
+
 def run():
     root = pick_root_if_needed(ROOT)
     rows = []
     seen = processed = 0
+    batch = DERIVED_METRICS_BATCH and pd is not None
     print(f"Scanning: {root}")
 
     for name, html in iter_html_payloads(root):
         seen += 1
-        soup = BeautifulSoup(html, "html.parser")
-
-        url = extract_url(html, soup) or ""
-        b_val, b_unit = extract_builtup(html, soup)
-        psf = extract_builtup_psf(html, soup)
-        if psf is None:
-            rent = is_rent_page(soup)
-            cur, price = extract_price(html, soup)
-            if (not rent) and price and b_val:
-                area_sqft = _area_to_sqft(b_val, b_unit)
-                if area_sqft and 400 <= area_sqft <= 20000 and 10000 <= price <= 50000000:
-                    psf = round(price / area_sqft, 2)
-        if b_val:
-            unit_str = "sq ft" if _is_sqft(b_unit) or (not b_unit) else ("sqm" if _is_sqm(b_unit) else str(b_unit))
-            built_up_str = f"{int(b_val) if float(b_val).is_integer() else b_val} {unit_str}"
-        else:
-            built_up_str = ""
-        tenure = extract_tenure(html, soup)
-        bed_n, bath_n, bed_raw, bath_raw = extract_bed_bath(html, soup)
-        car_park, car_park_raw, car_park_list = extract_car_park(html, soup)
-        lister_phone_raw, lister_phone_digits = extract_lister_phone(soup)
-        agency_name = extract_agency_name(soup)
-        agency_id, agency_id_source = extract_agency_id(soup)
-        furnishing, furnishing_raw = extract_furnishing(html, soup)
-        address, address_source = extract_full_address(soup)
-        lister_url = extract_lister_url(soup)
-        dom_text = extract_license_visible_text(soup)
-        license_no = extract_license_ren(soup, dom_text)
-        amenities = extract_amenities(soup, html)
-
-        rows.append({
-            "file": name,
-            "url": url,
-            "tenure": tenure,
-            "bedroom": bed_n or "",
-            "bathroom": bath_n or "",
-            "bedroom_raw": bed_raw or "",
-            "bathroom_raw": bath_raw or "",
-            "car_park": car_park or "",
-            "car_park_raw": car_park_raw or "",
-            "car_park_raw_list": " | ".join(car_park_list) if car_park_list else "",
-            "lister_phone_raw": lister_phone_raw,
-            "lister_phone_digits": lister_phone_digits,
-            "agency_name": agency_name,
-            "agency_id": agency_id,
-            "agency_id_source": agency_id_source,
-            "furnishing": furnishing,
-            "furnishing_raw": furnishing_raw,
-            "address": address,
-            "address_source": address_source,
-            "lister_url": lister_url,
-            "license": license_no,
-            "amenities": "; ".join(amenities) if amenities else "",
-            "built_up": built_up_str,
-            "built_up_psf": (f"{psf:.2f}" if isinstance(psf, (int, float)) else ""),
-        })
+        rows.append(extract_row(name, html, batch=batch))
         processed += 1
 
     out_csv = os.path.join(root, OUT_BASENAME)
-    with open(out_csv, "w", newline="", encoding="utf-8") as f:
-        fieldnames = [
-            "file","url","tenure",
-            "bedroom","bathroom","bedroom_raw","bathroom_raw",
-            "car_park","car_park_raw","car_park_raw_list",
-            "lister_phone_raw","lister_phone_digits",
-            "agency_name","agency_id","agency_id_source",
-            "furnishing","furnishing_raw",
-            "address","address_source",
-            "lister_url","license",
-            "amenities",
-            "built_up","built_up_psf",
-        ]
-        w = csv.DictWriter(f, fieldnames=fieldnames)
-        w.writeheader()
-        w.writerows(rows)
+    if batch:
+        df = derive_metrics(rows).reindex(columns=FIELDNAMES)
+        df.to_csv(out_csv, index=False, encoding="utf-8")
+        try:
+            out_typed = os.path.join(root, OUT_TYPED_BASENAME)
+            typed_frame(df).to_parquet(out_typed, index=False)
+            print(f"Saved typed dataset: {out_typed}")
+        except Exception as e:
+            print(f"Typed dataset not written ({type(e).__name__}: {e})")
+        preview = df.head(5).fillna("").to_dict("records")
+    else:
+        with open(out_csv, "w", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=FIELDNAMES)
+            w.writeheader()
+            w.writerows(rows)
+        preview = rows[:5]
 
     print(f"Files seen: {seen} | processed: {processed}")
     print(f"Saved: {out_csv}")
-    if rows:
+    if preview:
         print('--- Preview (first 5 rows) ---')
-        for r in rows[:5]:
+        for r in preview:
             print({k: r[k] for k in ['file','tenure','bedroom','bathroom','built_up','built_up_psf','license']})
 
 if __name__ == "__main__":
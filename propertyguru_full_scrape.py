@@ -7,10 +7,14 @@ Two-Phase PropertyGuru Runner: ADLIST (SRP) -> ADVIEW (Detail)
 - ADVIEW: rich field extraction (phone, developer, title, bumi, psf, etc.)
 - FINAL: ADVIEW CSV merged with ADLIST times & agent_id/listing_id
 - Threaded, per-thread MV3 proxy extensions, staggered launches
+- Portal adapters (PropertyGuru, iProperty) run on the same workers, drivers and proxies
 """
 
-import os, re, io, time, json, math, gzip, zipfile, random, queue, heapq, threading, logging, shutil
+import os, re, io, sys, time, json, math, gzip, zipfile, random, queue, heapq, threading, logging, shutil, sqlite3, itertools
 from datetime import datetime, timezone
+from urllib.parse import urlsplit, urlunsplit
+from xml.etree.ElementTree import iterparse
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor
 
 import pandas as pd
@@ -31,13 +35,140 @@ try:
 except Exception:
     requests = None
 
+# Sibling extractor; only needed for the iProperty portal adapter
+try:
+    import iproperty_extract_spyder as ipx
+except Exception:
+    ipx = None
+
 # ====================== USER CONFIG ======================
 ADLIST_THREADS = 5
 ADVIEW_THREADS = 5
 VERSION_MAIN = 139
 PAGELOAD_TIMEOUT = 45
 WAIT_NEXTDATA = 25
+# How Chrome hands back __NEXT_DATA__: "dom" (wait for the element after an eager load),
+# "early_stop" (poll while the document streams in, window.stop() once the tag is complete)
+# or "cdp" (read the main document body from DevTools as soon as it finishes downloading).
+# Both early modes start Chrome with page_load_strategy "none" and fall back to "dom".
+PAGE_CAPTURE = "dom"
+CAPTURE_POLL = 0.05
+# dom capture: pull only the pageData.data subtrees the row builders read (see Portal.*_subtrees)
+# instead of shipping the whole __NEXT_DATA__ string over WebDriver
+NEXT_DATA_SUBTREES = False
+ARCHIVE_RAW_NEXT_DATA = True   # keep writing the raw per-page JSON files
+
+# Lightweight driver profile: headless, no images/media, CDP-blocked URLs (Network.setBlockedURLs)
+LIGHT_PROFILE = False
+LIGHT_HEADLESS = True
+BLOCK_URL_PATTERNS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.mp4", "*.webm", "*.mp3", "*.css",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*googlesyndication.com*",
+    "*facebook.net*", "*connect.facebook.*", "*hotjar.com*", "*clarity.ms*", "*tiktok.com*",
+    "*criteo.*", "*adnxs.com*", "*taboola.com*", "*newrelic.com*", "*nr-data.net*",
+]
+# Per-page transfer bytes from the Performance API (cross-origin entries without
+# Timing-Allow-Origin report 0, so treat it as a lower bound). A full-profile run
+# stores its average as the baseline that light runs report savings against.
+MEASURE_PAGE_BYTES = False
+PAGE_BYTES_BASELINE_FILE = "page_bytes_baseline.json"
 THREAD_LAUNCH_DELAY_STEP = 2  # T0=2s, T1=4s, ...
+# Proxy checks: every proxy is verified once, in parallel over HTTP, before a stage starts and
+# cached for PROXY_VERIFY_TTL; a proxy rotated in after a failure is re-checked when stale.
+# Drivers then start without the per-launch browser IP checks (BROWSER_PROXY_CHECK re-enables them).
+PROXY_VERIFY_CACHE = True
+PROXY_VERIFY_TTL = 30 * 60
+PROXY_VERIFY_WORKERS = 10
+BROWSER_PROXY_CHECK = False
+LAUNCH_STAGGER_CACHED = 0.5   # per-thread launch stagger when proxies are pre-verified
+# Fast driver startup: reuse one patched chromedriver per VERSION_MAIN and start each Chrome
+# from a copy of a pre-initialised profile template (both created by the first launch)
+FAST_STARTUP = True
+# One persistent user-data-dir per proxy (cookies, HTTP cache, local storage survive restarts
+# and runs). Falls back to a template clone while that proxy's profile is held by another Chrome.
+PERSISTENT_PROFILES = False
+PROFILE_CACHE_MB = 200         # Chrome --disk-cache-size per profile
+PROFILE_MAX_MB = 400           # above this the profile's caches are dropped when its driver quits
+PROFILE_STORE_MAX_MB = 4000    # above this least-recently-used idle profiles are evicted
+# Browser mode: keep this many pre-launched drivers per stage on idle proxies so a
+# full restart swaps one in instead of cold-starting Chrome
+DRIVER_SPARES = 0
+# Escalation on consecutive failures of one worker; a dead session jumps straight to "restart"
+RECOVERY_TIERS = ("reload", "new_tab", "clear_cookies", "restart")
+# Proactive recycling (browser mode, one Chrome per worker): after N pages or when the
+# driver's process tree (sampled from /proc every RSS_CHECK_EVERY pages) exceeds the watermark.
+# The swap uses a warm spare from the DriverPool (DRIVER_SPARES); with no pool the replacement is
+# prelaunched in the background on the worker's proxy and swapped in once it is up. RSS past the
+# hard limit cold-starts at once.
+RECYCLE_AFTER_PAGES = 400
+RECYCLE_RSS_MB = 1500
+RECYCLE_RSS_HARD_MB = 2500
+RSS_CHECK_EVERY = 20
+# >1: workers share one Chrome per proxy, one tab each (thread_id // TABS_PER_BROWSER picks
+# the browser). Loads run with page_load_strategy "none" and the early_stop capture so tabs overlap.
+TABS_PER_BROWSER = 1
+DRIVER_DEAD_MARKERS = ("invalid session id", "chrome not reachable", "disconnected",
+                       "no such window", "target window already closed", "session deleted")
+
+# Page fetching: "browser" (Chrome for every page) or "http_first"
+# (pooled HTTP client per proxy; Chrome only for challenges / missing __NEXT_DATA__)
+FETCH_MODE = "browser"
+HTTP_TIMEOUT = 30
+# http_first: after a browser load succeeds, copy its cookies + UA into that proxy's HTTP session
+SESSION_HANDOFF = True
+CLEARANCE_COOKIE_NAMES = ("cf_clearance", "__cf_bm", "_px3", "_pxhd", "datadome", "ak_bmsc", "bm_sv")
+CLEARANCE_DEFAULT_TTL = 20 * 60   # used when no clearance cookie carries an expiry
+CLEARANCE_EXPIRY_MARGIN = 60      # refresh this many seconds before the cookie expires
+# Fetch pageProps from /_next/data/<buildId>/<path>.json once a page has revealed the buildId;
+# page loads remain the fallback (and re-discover the id after a deploy)
+NEXT_DATA_ROUTES = False
+BUILD_ID_404_PATHS = 3   # a buildId is dropped after 404s on this many different paths (one 404 = listing gone)
+# Durable run state: task transitions + extracted rows go to a SQLite (WAL) file in the run's
+# log dir, so `python propertyguru_full_scrape.py --resume <TS>` continues a crashed run
+TASK_STORE = True
+# Change-aware ADVIEW: a listing whose ADLIST summary (ad_id, listed_unix, price) matches the
+# listing index (LISTING_INDEX_FILE in BASE_DIR) reuses its stored detail row instead of being
+# fetched; stored rows older than LISTING_INDEX_MAX_AGE_DAYS are fetched again
+CHANGE_AWARE_ADVIEW = False
+LISTING_INDEX_FILE = "listing_index.sqlite"
+LISTING_INDEX_MAX_AGE_DAYS = 14
+# Pipelined run: ADLIST streams each page's listing URLs straight into ADVIEW (deduplicated) while
+# it is still paging; ADVIEW workers are added as its queue grows, and take over ADLIST's share
+# of threads/proxies once ADLIST finishes. ADLIST workers pause while ADVIEW has
+# PIPELINE_MAX_QUEUED URLs waiting.
+PIPELINE = False
+PIPELINE_MAX_QUEUED = 2000
+PIPELINE_DEPTH_PER_WORKER = 50   # queued ADVIEW URLs per running ADVIEW worker
+PIPELINE_STALL_SEC = 300         # ADLIST stops pausing once no ADVIEW worker has taken a URL for this long
+
+# Incremental runs: keep the newest listed_unix per ADLIST category (WATERMARK_FILE in BASE_DIR),
+# stop paging a category at the first page that is entirely older than that minus
+# WATERMARK_OVERLAP (portals with date-sorted SRPs only), and send ADVIEW only listings
+# at/after that cutoff
+INCREMENTAL = False
+WATERMARK_FILE = "adlist_watermarks.json"
+WATERMARK_OVERLAP = 6 * 3600
+
+# Take each category's page count from page 1's pagination data and queue exactly that many
+# pages (the "pages" caps below are the fallback when page 1 has none); a page whose
+# listingsData comes back empty ends its category
+AUTO_PAGE_COUNT = True
+ADLIST_PAGE_ROWS = 20         # listings per SRP page (total count → pages) when page 1 came back empty
+AUTO_PAGE_COUNT_MAX = 5000
+
+# Query sharding: each category is crawled as price-band shards (SHARD_PRICE_BANDS, sent as
+# SHARD_PRICE_PARAMS) that paginate shallowly in parallel; a shard whose page 1 reports more than
+# SHARD_MAX_PAGES pages is bisected (down to SHARD_MIN_BAND) instead of paged. Listings that
+# appear in more than one shard are kept once.
+QUERY_SHARDS = False
+SHARD_MAX_PAGES = 100
+SHARD_MIN_BAND = 1000
+SHARD_PRICE_PARAMS = ("minPrice", "maxPrice")
+SHARD_PRICE_BANDS = {
+    "sale": [0, 200_000, 350_000, 500_000, 700_000, 1_000_000, 1_500_000, 2_500_000, None],
+    "rent": [0, 800, 1_200, 1_600, 2_000, 3_000, 5_000, None],
+}
 
 # Category page caps (ADLIST)
 CATEGORIES = [
@@ -46,6 +177,25 @@ CATEGORIES = [
     {"intent": "rent", "segment": "commercial",  "is_commercial": True,  "pages": 200},
     {"intent": "rent", "segment": "residential", "is_commercial": False, "pages": 600},
 ]
+IPROPERTY_CATEGORIES = [
+    {"intent": "sale", "segment": "commercial",  "is_commercial": True,  "pages": 100},
+    {"intent": "sale", "segment": "residential", "is_commercial": False, "pages": 500},
+    {"intent": "rent", "segment": "commercial",  "is_commercial": True,  "pages": 100},
+    {"intent": "rent", "segment": "residential", "is_commercial": False, "pages": 300},
+]
+# Portals crawled by this run; all share the same worker threads, drivers and proxies
+ENABLED_PORTALS = ["propertyguru"]   # e.g. ["propertyguru", "iproperty"]
+
+# Listing discovery from XML sitemaps (index → child sitemaps, plain or .gz, parsed as a stream):
+# "off", "alongside" (ADLIST + sitemap URLs into ADVIEW) or "only" (sitemaps replace ADLIST).
+# Roots may also be local paths / file:// URLs (fixtures).
+SITEMAP_DISCOVERY = "off"
+SITEMAPS = {
+    "propertyguru": ["https://www.propertyguru.com.my/sitemap.xml"],
+    "iproperty":    ["https://www.iproperty.com.my/sitemap.xml"],
+}
+SITEMAP_MAX_AGE_DAYS = 3      # only URLs (and child sitemaps) with lastmod in this window; None = all
+SITEMAP_MAX_DEPTH = 3
 
 # Discord webhooks (reuse your existing 4)
 DASHBOARD_WEBHOOK = "https://discord.com/api/webhooks/1405420190652567682/qOKf09vjntEdCRth8A6D9AkUsfPN_oWx5Yjbtz43QCqcZnzARrx_EX_qSwJosc9lhQ-y"
@@ -88,8 +238,19 @@ proxies = [
 ]
 
 # ====== Paths & Globals ======
-TS = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+def cli_value(flag:str):
+    """`--flag VALUE` / `--flag=VALUE` from the command line (None when absent, e.g. under Spyder)."""
+    argv = sys.argv[1:]
+    for i, a in enumerate(argv):
+        if a == flag and i + 1 < len(argv): return argv[i + 1]
+        if a.startswith(flag + "="): return a.split("=", 1)[1]
+    return None
+
 BASE_DIR = os.path.abspath(".")
+RESUME_TS = cli_value("--resume")
+if RESUME_TS and not os.path.isfile(os.path.join(BASE_DIR, f"logs_{RESUME_TS}", "run_state.sqlite")):
+    raise SystemExit(f"❌ --resume {RESUME_TS}: no run state at logs_{RESUME_TS}/run_state.sqlite")
+TS = RESUME_TS or datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
 
 ADLIST_DIR = os.path.join(BASE_DIR, f"adlist_propertyguru_{TS}")
 ADVIEW_DIR = os.path.join(BASE_DIR, f"adview_propertyguru_{TS}")
@@ -103,6 +264,11 @@ os.makedirs(EXT_DIR, exist_ok=True)
 AUDIT_DIR  = os.path.join(ADVIEW_DIR, "audit")
 os.makedirs(AUDIT_DIR, exist_ok=True)
 
+CHROMEDRIVER_CACHE_DIR = os.path.join(BASE_DIR, "chromedriver_cache")
+PROFILE_TEMPLATE_DIR   = os.path.join(CHROMEDRIVER_CACHE_DIR, f"profile_template_{VERSION_MAIN}")
+PROFILE_RUNTIME_DIR    = os.path.join(LOG_DIR, "profiles")
+PROFILE_STORE_DIR      = os.path.join(BASE_DIR, "chrome_profiles")
+
 ADLIST_EXT_ROOT = os.path.join(EXT_DIR, "adlist")
 ADVIEW_EXT_ROOT = os.path.join(EXT_DIR, "adview")
 os.makedirs(ADLIST_EXT_ROOT, exist_ok=True)
@@ -139,7 +305,7 @@ def _browser_ipv4_newtab(driver):
     cur = driver.current_window_handle
     driver.switch_to.new_window('tab')
     try:
-        driver.get("https://ipv4.icanhazip.com/")
+        open_page(driver, "https://ipv4.icanhazip.com/")
         ip = (driver.find_element(By.TAG_NAME, "body").text or "").strip()
     finally:
         driver.close()
@@ -369,12 +535,195 @@ chrome.webRequest.onAuthRequired.addListener(
   ["asyncBlocking"]
 );
 """
-    with open(os.path.join(ext_dir, "manifest.json"), "w", encoding="utf-8") as f:
-        json.dump(manifest, f, ensure_ascii=False, indent=2)
-    with open(os.path.join(ext_dir, "background.js"), "w", encoding="utf-8") as f:
-        f.write(bg_js)
+    files = {"manifest.json": json.dumps(manifest, ensure_ascii=False, indent=2), "background.js": bg_js}
+    for name, body in files.items():
+        path = os.path.join(ext_dir, name)
+        try:
+            with open(path, encoding="utf-8") as f:
+                if f.read() == body:
+                    continue   # unchanged since the last launch on this thread/proxy
+        except OSError:
+            pass
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(body)
     return ext_dir
 
+# ====== Driver startup cache ======
+_startup_lock = threading.Lock()
+_launch_ids = itertools.count(1)   # runtime profile dirs are per launch, never per thread
+STARTUP_TIMES = []         # (seconds, cached_driver, from_template)
+# caches, sockets and locks are not worth copying into the template
+PROFILE_TEMPLATE_IGNORE = shutil.ignore_patterns(
+    "Singleton*", "lockfile", "LOCK", "*.lock", "Cache", "Code Cache", "GPUCache", "ShaderCache",
+    "GrShaderCache", "Crashpad", "BrowserMetrics*", "*.tmp")
+
+def cached_chromedriver()->str|None:
+    path = os.path.join(CHROMEDRIVER_CACHE_DIR, f"chromedriver_{VERSION_MAIN}" + (".exe" if os.name == "nt" else ""))
+    return path if os.path.exists(path) else None
+
+def cache_patched_chromedriver(driver):
+    """Keep the binary uc just patched (uc deletes its random-named copy on quit)."""
+    src = getattr(getattr(driver, "patcher", None), "executable_path", None)
+    if not src or not os.path.exists(src):
+        return
+    dst = os.path.join(CHROMEDRIVER_CACHE_DIR, f"chromedriver_{VERSION_MAIN}" + (".exe" if os.name == "nt" else ""))
+    with _startup_lock:
+        if os.path.exists(dst):
+            return
+        os.makedirs(CHROMEDRIVER_CACHE_DIR, exist_ok=True)
+        tmp = f"{dst}.{os.getpid()}.tmp"
+        shutil.copy2(src, tmp)
+        os.replace(tmp, dst)
+
+def clone_profile_template(thread_id:int):
+    """Fresh user-data-dir for one launch: (path, from_template). Removed when that driver quits."""
+    os.makedirs(PROFILE_RUNTIME_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_RUNTIME_DIR, f"t{thread_id}_l{next(_launch_ids)}")
+    from_template = os.path.isdir(PROFILE_TEMPLATE_DIR)
+    if from_template:
+        shutil.copytree(PROFILE_TEMPLATE_DIR, path)
+    else:
+        os.makedirs(path, exist_ok=True)
+    return path, from_template
+
+def on_driver_quit(driver, cleanup):
+    """Run cleanup once, after this driver's own quit() (every quit path goes through it)."""
+    quit_, done = driver.quit, []
+    def quit_then_cleanup():
+        try:
+            quit_()
+        finally:
+            if not done:
+                done.append(True)
+                cleanup()
+    driver.quit = quit_then_cleanup
+
+def save_profile_template(profile_dir:str):
+    """Snapshot an initialised profile (first run done, prefs written) as the template."""
+    with _startup_lock:
+        if os.path.isdir(PROFILE_TEMPLATE_DIR):
+            return
+        tmp = f"{PROFILE_TEMPLATE_DIR}.{os.getpid()}.tmp"
+        try:
+            shutil.copytree(profile_dir, tmp, ignore=PROFILE_TEMPLATE_IGNORE)
+            os.replace(tmp, PROFILE_TEMPLATE_DIR)
+        except Exception:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+# --- persistent per-proxy profiles ---
+PROFILE_CACHE_SUBDIRS = ("Cache", "Code Cache", "GPUCache", "ShaderCache", "GrShaderCache",
+                         os.path.join("Default", "Cache"), os.path.join("Default", "Code Cache"),
+                         os.path.join("Default", "Service Worker", "CacheStorage"))
+PROFILE_USED_MARKER = ".last_used"
+_profiles_reserved = set()   # store profiles held by a live driver (or being evicted); under _startup_lock
+_profile_sizes = {}          # path -> bytes; walked once, then re-measured only when its driver quits
+
+def dir_size(path:str)->int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try: total += os.lstat(os.path.join(root, name)).st_size
+            except OSError: pass
+    return total
+
+def profile_in_use(path:str)->bool:
+    """Chrome holds SingletonLock (a symlink "host-pid" on POSIX, a locked file on Windows)."""
+    lock = os.path.join(path, "SingletonLock")
+    if os.name == "nt":
+        lock = os.path.join(path, "lockfile")
+        if not os.path.exists(lock):
+            return False
+        try:
+            os.remove(lock); return False
+        except OSError:
+            return True
+    try:
+        target = os.readlink(lock)
+    except OSError:
+        return False
+    try:
+        os.kill(int(target.rsplit("-", 1)[1]), 0)
+        return True
+    except (ValueError, IndexError, ProcessLookupError):
+        return False
+    except PermissionError:
+        return True
+
+def proxy_profile_key(proxy_cfg:dict)->str:
+    u = proxy_cfg.get("username") or ""
+    return safe_name(u.split("-ip-")[1] if "-ip-" in u else proxy_cfg["server"])
+
+def evict_profiles():
+    """Trim the profile store to PROFILE_STORE_MAX_MB, oldest idle profiles first."""
+    if not os.path.isdir(PROFILE_STORE_DIR):
+        return
+    entries = []
+    for name in os.listdir(PROFILE_STORE_DIR):
+        path = os.path.join(PROFILE_STORE_DIR, name)
+        if not os.path.isdir(path):
+            continue
+        size = _profile_sizes.get(path)
+        if size is None:
+            size = _profile_sizes[path] = dir_size(path)
+        marker = os.path.join(path, PROFILE_USED_MARKER)
+        used = os.path.getmtime(marker) if os.path.exists(marker) else 0.0
+        entries.append((used, path, size))
+    total = sum(e[2] for e in entries)
+    for used, path, size in sorted(entries):
+        if total <= PROFILE_STORE_MAX_MB * 1048576:
+            break
+        with _startup_lock:
+            if path in _profiles_reserved or profile_in_use(path):
+                continue
+            _profiles_reserved.add(path)
+        shutil.rmtree(path, ignore_errors=True)
+        with _startup_lock:
+            _profiles_reserved.discard(path); _profile_sizes.pop(path, None)
+        total -= size
+        perf_logger.info(f"[PROFILE] evicted {os.path.basename(path)} ({size/1048576:.0f} MB)", extra={'thread_id': 0})
+
+def acquire_proxy_profile(proxy_cfg:dict):
+    """(path, warm) for this proxy's persistent profile, or (None, False) if it is in use.
+    The profile stays reserved until release_proxy_profile() runs after its driver quits."""
+    path = os.path.join(PROFILE_STORE_DIR, proxy_profile_key(proxy_cfg))
+    with _startup_lock:
+        if path in _profiles_reserved or (os.path.isdir(path) and profile_in_use(path)):
+            return None, False
+        _profiles_reserved.add(path)
+        warm = os.path.isdir(path)
+        if not warm:
+            os.makedirs(PROFILE_STORE_DIR, exist_ok=True)
+            if os.path.isdir(PROFILE_TEMPLATE_DIR):
+                shutil.copytree(PROFILE_TEMPLATE_DIR, path); warm = True
+            else:
+                os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, PROFILE_USED_MARKER), "w") as f:
+            f.write(str(int(time.time())))
+    return path, warm
+
+def release_proxy_profile(path:str):
+    """Its driver has quit: re-measure the profile (dropping caches above PROFILE_MAX_MB), unreserve it
+    and trim the store."""
+    size = dir_size(path)
+    if size > PROFILE_MAX_MB * 1048576:
+        for sub in PROFILE_CACHE_SUBDIRS:
+            shutil.rmtree(os.path.join(path, sub), ignore_errors=True)
+        size = dir_size(path)
+    with _startup_lock:
+        _profile_sizes[path] = size
+        _profiles_reserved.discard(path)
+    evict_profiles()
+
+def startup_summary()->str|None:
+    with _startup_lock:
+        times = sorted(t for t, _, _ in STARTUP_TIMES)
+        fast = sum(1 for _, c, tpl in STARTUP_TIMES if c and tpl)
+    if not times:
+        return None
+    p90 = times[min(len(times) - 1, int(len(times) * 0.9))]
+    return (f"🚀 Driver starts: {len(times)} • avg {sum(times)/len(times):.1f}s • p90 {p90:.1f}s "
+            f"• cached driver+template: {fast}/{len(times)}")
+
 def start_driver(user_agent:str, proxy_cfg:dict, thread_id:int, ext_root:str):
     opts = uc.ChromeOptions()
     # Force proxy at process start (critical)
@@ -384,11 +733,27 @@ def start_driver(user_agent:str, proxy_cfg:dict, thread_id:int, ext_root:str):
     # Hardening / perf
     opts.add_argument("--no-sandbox")
     opts.add_argument("--disable-dev-shm-usage")
-    opts.add_argument("--window-size=1366,768")
+    if LIGHT_PROFILE:
+        if LIGHT_HEADLESS:
+            opts.add_argument("--headless=new")
+        opts.add_argument("--window-size=1024,700")
+        opts.add_argument("--blink-settings=imagesEnabled=false")
+        opts.add_argument("--autoplay-policy=user-gesture-required")
+        opts.add_argument("--mute-audio")
+        opts.add_argument("--disable-features=Translate,MediaRouter,OptimizationHints")
+        opts.add_experimental_option("prefs", {
+            "profile.managed_default_content_settings.images": 2,
+            "profile.default_content_setting_values.notifications": 2,
+            "profile.default_content_setting_values.geolocation": 2,
+        })
+    else:
+        opts.add_argument("--window-size=1366,768")
     opts.add_argument("--lang=en-US,en")
     opts.add_argument("--disable-blink-features=AutomationControlled")
     opts.add_argument("--disable-background-networking")
-    opts.page_load_strategy = "eager"
+    opts.page_load_strategy = "none" if nonblocking_loads() else "eager"
+    if PAGE_CAPTURE == "cdp":
+        opts.set_capability("goog:loggingPrefs", {"performance": "ALL"})
     opts.add_argument(f"user-agent={user_agent}")
 
     if PROXY_MODE == "userpass":
@@ -397,10 +762,113 @@ def start_driver(user_agent:str, proxy_cfg:dict, thread_id:int, ext_root:str):
         opts.add_argument(f"--load-extension={ext_path}")
     # else: whitelist mode → no extension needed
 
-    driver = uc.Chrome(options=opts, version_main=VERSION_MAIN)
+    t0 = time.time()
+    kw, drv_path, profile_dir, from_template, kind = {}, None, None, False, "fresh"
+    if PERSISTENT_PROFILES:
+        profile_dir, from_template = acquire_proxy_profile(proxy_cfg)
+        if profile_dir:
+            kind = "persistent"
+            opts.add_argument(f"--disk-cache-size={PROFILE_CACHE_MB * 1048576}")
+    if FAST_STARTUP:
+        drv_path = cached_chromedriver()
+        if drv_path:
+            kw["driver_executable_path"] = drv_path   # already patched → uc skips download + patch
+        if profile_dir is None:
+            profile_dir, from_template = clone_profile_template(thread_id)
+            kind = "template" if from_template else "fresh"
+    if profile_dir:
+        kw["user_data_dir"] = profile_dir
+    if kind == "persistent":
+        cleanup = lambda: release_proxy_profile(profile_dir)
+    elif profile_dir:
+        cleanup = lambda: shutil.rmtree(profile_dir, ignore_errors=True)
+    else:
+        cleanup = None
+    try:
+        driver = uc.Chrome(options=opts, version_main=VERSION_MAIN, **kw)
+    except Exception:
+        if cleanup: cleanup()
+        raise
+    if cleanup:
+        on_driver_quit(driver, cleanup)
+    if FAST_STARTUP:
+        if not drv_path:
+            try: cache_patched_chromedriver(driver)
+            except Exception: pass
+        if profile_dir and not from_template:
+            save_profile_template(profile_dir)
+    took = time.time() - t0
+    with _startup_lock:
+        STARTUP_TIMES.append((took, bool(drv_path), from_template))
+    perf_logger.info(f"[STARTUP] T{thread_id} Chrome up in {took:.1f}s "
+                     f"(chromedriver={'cached' if drv_path else 'patched'}, profile={kind})",
+                     extra={'thread_id': thread_id})
     driver.set_page_load_timeout(PAGELOAD_TIMEOUT)
+    apply_cdp_setup(driver, thread_id)
     return driver
 
+def apply_cdp_setup(driver, thread_id:int=0):
+    """Network domain + LIGHT_PROFILE URL blocking. CDP state is per target, so every new tab needs it."""
+    if PAGE_CAPTURE == "cdp" or LIGHT_PROFILE:
+        try: driver.execute_cdp_cmd("Network.enable", {})
+        except Exception: pass
+    if LIGHT_PROFILE and BLOCK_URL_PATTERNS:
+        try: driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": list(BLOCK_URL_PATTERNS)})
+        except Exception as e:
+            perf_logger.info(f"[LIGHT] setBlockedURLs failed: {type(e).__name__}", extra={'thread_id': thread_id})
+
+JS_PAGE_TRANSFER = """
+const nav = performance.getEntriesByType('navigation')[0];
+let bytes = nav ? (nav.transferSize || 0) : 0, n = 0;
+for (const r of performance.getEntriesByType('resource')) { bytes += r.transferSize || 0; n++; }
+return [bytes, n];
+"""
+
+def page_transfer_bytes(driver):
+    """(bytes, resource_count) fetched by the current page, or (None, 0)."""
+    try:
+        b, n = driver.execute_script(JS_PAGE_TRANSFER)
+        return int(b), int(n)
+    except Exception:
+        return None, 0
+
+def page_bytes_report(stages)->str|None:
+    """Average browser bytes/page for this run vs. the stored full-profile baseline."""
+    pages = sum(st.metrics["pages_measured"] for st in stages)
+    if not pages:
+        return None
+    avg = sum(st.metrics["page_bytes"] for st in stages) / pages
+    path = os.path.join(BASE_DIR, PAGE_BYTES_BASELINE_FILE)
+    if not LIGHT_PROFILE:
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"avg_bytes": avg, "pages": pages, "ts": TS}, f)
+        except Exception:
+            pass
+        return f"📦 Browser pages: {pages:,} • avg {avg/1024:.0f} KB/page (saved as baseline)"
+    try:
+        with open(path, encoding="utf-8") as f:
+            base = float(json.load(f)["avg_bytes"])
+    except Exception:
+        return f"📦 Browser pages: {pages:,} • avg {avg/1024:.0f} KB/page (no baseline yet)"
+    saved = base - avg
+    pct = (saved / base * 100) if base else 0.0
+    return (f"📦 Browser pages: {pages:,} • avg {avg/1024:.0f} KB/page vs {base/1024:.0f} KB baseline "
+            f"• saved ~{saved/1024:.0f} KB/page ({pct:.0f}%) ≈ {saved*pages/1048576:.1f} MB this run")
+
+def nonblocking_loads()->bool:
+    return PAGE_CAPTURE != "dom" or TABS_PER_BROWSER > 1
+
+def open_page(driver, url:str, timeout:float=PAGELOAD_TIMEOUT):
+    """driver.get() that still waits for the DOM when page_load_strategy is "none"."""
+    driver.get(url)
+    if nonblocking_loads():
+        try:
+            WebDriverWait(driver, timeout).until(
+                lambda d: d.execute_script("return document.readyState") != "loading")
+        except TimeoutException:
+            pass
+
 
 def get_next_data(driver):
     try:
@@ -412,22 +880,1119 @@ def get_next_data(driver):
     except TimeoutException:
         return None
 
+# Returns [reduced_json, raw_or_null]; the reduced JSON keeps the props.pageProps.pageData.data
+# shape (only the requested keys) plus buildId/locale so the usual parsers apply unchanged
+JS_NEXT_DATA_SUBTREES = """
+const keys = arguments[0], withRaw = arguments[1];
+const el = document.getElementById('__NEXT_DATA__');
+let nd = window.__NEXT_DATA__, raw = null;
+if (!nd && el) { raw = el.textContent; try { nd = JSON.parse(raw); } catch (e) { return null; } }
+if (!nd) return null;
+const data = (((nd.props || {}).pageProps || {}).pageData || {}).data || {};
+const sub = {};
+for (const k of Object.keys(data)) if (keys.includes(k)) sub[k] = data[k];   // keep page key order
+if (withRaw && raw === null && el) raw = el.textContent;
+const out = {props: {pageProps: {pageData: {data: sub}}}, buildId: nd.buildId, locale: nd.locale};
+return [JSON.stringify(out), withRaw ? raw : null];
+"""
+
+def get_next_data_subtrees(driver, keys, with_raw:bool=ARCHIVE_RAW_NEXT_DATA):
+    """Like get_next_data, but returns (reduced_text|None, raw_text|None)."""
+    try:
+        WebDriverWait(driver, WAIT_NEXTDATA).until(
+            EC.presence_of_element_located((By.XPATH, '//*[@id="__NEXT_DATA__"]'))
+        )
+        res = driver.execute_script(JS_NEXT_DATA_SUBTREES, list(keys), bool(with_raw))
+    except Exception:
+        return None, None
+    if not res or not res[0]:
+        return None, None
+    return res[0], res[1]
+
+# Returns the script text once the tag is closed (a following node exists or parsing is done)
+JS_NEXT_DATA_IF_COMPLETE = """
+const el = document.getElementById('__NEXT_DATA__');
+if (!el || !(el.nextSibling || document.readyState !== 'loading')) return null;
+return el.textContent;
+"""
+
+def capture_next_data_early(driver, url:str, timeout:float=WAIT_NEXTDATA):
+    """Navigate and poll while loading; stop the page as soon as __NEXT_DATA__ is complete."""
+    driver.get(url)  # returns at navigation commit under page_load_strategy "none"
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            txt = driver.execute_script(JS_NEXT_DATA_IF_COMPLETE)
+        except Exception:
+            txt = None
+        if txt and txt.strip().startswith("{"):
+            try: driver.execute_script("window.stop();")
+            except Exception: pass
+            return txt
+        time.sleep(CAPTURE_POLL)
+    return None
+
+def capture_next_data_cdp(driver, url:str, timeout:float=WAIT_NEXTDATA):
+    """Navigate and read the main document body via CDP (Network.getResponseBody).
+    Returns None for challenge pages etc. so the caller can wait on the DOM instead."""
+    try: driver.get_log("performance")  # drain events from earlier pages
+    except Exception: pass
+    driver.get(url)
+    doc_id = None
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            entries = driver.get_log("performance")
+        except Exception:
+            return None
+        for entry in entries:
+            try:
+                msg = json.loads(entry["message"])["message"]
+            except Exception:
+                continue
+            method, params = msg.get("method"), msg.get("params") or {}
+            if method == "Network.responseReceived" and params.get("type") == "Document" and doc_id is None:
+                doc_id = params.get("requestId")
+            elif method == "Network.loadingFinished" and doc_id and params.get("requestId") == doc_id:
+                try:
+                    body = driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": doc_id}).get("body")
+                except Exception:
+                    return None
+                txt = parse_next_data_html(body)
+                if txt:
+                    try: driver.execute_script("window.stop();")
+                    except Exception: pass
+                return txt
+            elif method == "Network.loadingFailed" and params.get("requestId") == doc_id:
+                return None
+        time.sleep(CAPTURE_POLL)
+    return None
+
+def browser_next_data(driver, url:str, subtrees=None):
+    """Load `url` in Chrome; returns (next_data_text|None, raw_text|None) according to PAGE_CAPTURE.
+    With NEXT_DATA_SUBTREES and `subtrees` the text is the reduced JSON and raw is only
+    fetched when ARCHIVE_RAW_NEXT_DATA is on."""
+    if PAGE_CAPTURE == "early_stop" or isinstance(driver, TabDriver):
+        # the poll already waits out challenges; tabs must not hold the browser for a DOM wait
+        txt = capture_next_data_early(driver, url)
+        return txt, txt
+    if PAGE_CAPTURE == "cdp":
+        txt = capture_next_data_cdp(driver, url)
+        if txt:
+            return txt, txt
+        # no NEXT_DATA in the document (e.g. a challenge interstitial): let it run and wait on the DOM
+    else:
+        driver.get(url)
+    if NEXT_DATA_SUBTREES and subtrees:
+        return get_next_data_subtrees(driver, subtrees)
+    txt = get_next_data(driver)
+    return txt, txt
+
 def get_proxy_ip(idx:int)->str:
     u = proxies[idx]["username"]
     return u.split("-ip-")[1] if "-ip-" in u else f"proxy_{idx}"
 
+def launch_verified_driver(stage, thread_id:int, proxy_idx:int, ext_root:str):
+    """Start a driver and confirm the proxy is in effect (neutral page, then portal page).
+    Rotates once if the neutral check fails. Returns (driver, proxy_idx).
+    With the proxy cache the HTTP check stands in for the in-browser ones."""
+    if use_proxy_cache() and not BROWSER_PROXY_CHECK:
+        proxy_idx = ensure_verified_proxy(stage, thread_id, proxy_idx)
+        return start_driver(pick_ua(), proxies[proxy_idx], thread_id, ext_root), proxy_idx
+    ua = pick_ua()
+    driver = start_driver(ua, proxies[proxy_idx], thread_id, ext_root)
+    sys_ip = system_public_ipv4()
+    print(f"[IP] system IPv4      : {sys_ip}")
+
+    # check via a neutral page (optional)
+    open_page(driver, "https://ipv4.icanhazip.com")
+    time.sleep(1.2)
+    print(f"[IP] browser IPv4 (nav): {(driver.find_element(By.TAG_NAME,'body').text or '').strip()}")
+    prox_ok = verify_proxy(driver, label=f"{stage.name} T{thread_id}", sys_ip=sys_ip, thread_id=thread_id)
+    if not prox_ok:
+        print(f"[IP] T{thread_id} ❌ Proxy not in effect, rotating…")
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        proxy_idx = stage.rotate_proxy_for_thread(thread_id, proxy_idx)
+        ua = pick_ua()
+        driver = start_driver(ua, proxies[proxy_idx], thread_id, ext_root)
+        # re-check once after restart
+        verify_proxy(driver, label=f"{stage.name} T{thread_id} (recheck)", sys_ip=sys_ip, thread_id=thread_id)
+
+    # now confirm **while on PG**
+    open_page(driver, PORTALS[ENABLED_PORTALS[0]].probe_url())
+    pg_ok = verify_proxy(driver, label=f"{stage.name} T{thread_id} (PG)", sys_ip=sys_ip, thread_id=thread_id)
+    print("[IP] ✅ Proxy in effect for this PG page." if pg_ok else
+          "[IP] ❌ Looks like direct IP (or probe failed). Check whitelisting / --proxy-server.")
+    return driver, proxy_idx
+
+# ====== Driver pool & tiered recovery ======
+class DriverPool:
+    """Pre-launched spare drivers keyed by proxy index (browser mode).
+    A filler thread keeps DRIVER_SPARES drivers warm on proxies no worker is using."""
+    def __init__(self, stage, ext_root:str, spares:int=DRIVER_SPARES):
+        self.stage = stage
+        self.ext_root = ext_root
+        self.spares = spares
+        self._ready = {}            # proxy_idx -> driver
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._seq = 0
+        self.swaps = 0
+        self.thread = None
+
+    def start(self, delay:float=0.0):
+        self.thread = threading.Thread(target=self._fill_loop, args=(delay,), daemon=True,
+                                       name=f"{self.stage.name.lower()}_driver_pool")
+        self.thread.start()
+
+    def _fill_loop(self, delay:float):
+        if self._stop.wait(delay):
+            return
+        while not self._stop.is_set():
+            with self._lock:
+                have = len(self._ready)
+                warm = set(self._ready)
+            idx = None
+            if have < self.spares:
+                with self.stage.state_lock:
+                    busy = set(self.stage.used_proxies)
+                free = [i for i in range(len(proxies)) if i not in busy and i not in warm]
+                if use_proxy_cache():
+                    free = [i for i in free if i in VERIFIER.good_proxies()]
+                idx = random.choice(free) if free else None
+            if idx is None:
+                self._stop.wait(2.0); continue
+            self._seq += 1
+            try:
+                drv = start_driver(pick_ua(), proxies[idx], 100 + self._seq, self.ext_root)
+                drv.get("about:blank")
+            except Exception as e:
+                error_logger.error(f"[POOL] {self.stage.name} spare on {mask_ip(get_proxy_ip(idx))} failed: {type(e).__name__}",
+                                   extra={'thread_id': 0})
+                self._stop.wait(10.0); continue
+            with self._lock:
+                if self._stop.is_set() or idx in self._ready:
+                    drop = drv
+                else:
+                    self._ready[idx] = drv; drop = None
+            if drop is not None:
+                try: drop.quit()
+                except Exception: pass
+
+    def ready_proxies(self)->set:
+        with self._lock:
+            return set(self._ready)
+
+    def take(self, proxy_idx:int):
+        """Warm driver for `proxy_idx`, or None (caller cold-starts)."""
+        with self._lock:
+            drv = self._ready.pop(proxy_idx, None)
+        if drv is not None:
+            try:
+                drv.execute_script("return 1")
+            except Exception:
+                try: drv.quit()
+                except Exception: pass
+                return None
+            self.swaps += 1
+        return drv
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            drivers = list(self._ready.values()); self._ready.clear()
+        for drv in drivers:
+            try: drv.quit()
+            except Exception: pass
+
+def _driver_dead(err:Exception)->bool:
+    msg = str(err).lower()
+    return any(mk in msg for mk in DRIVER_DEAD_MARKERS)
+
+def _soft_recover(driver, tier:str):
+    """Cheap in-place fixes; raise if the driver does not respond."""
+    if tier == "reload":
+        driver.execute_script("return 1")
+        driver.refresh()
+    elif tier == "new_tab":
+        old = driver.current_window_handle
+        driver.switch_to.new_window("tab")
+        fresh = driver.current_window_handle
+        for h in list(driver.window_handles):
+            if h != fresh:
+                driver.switch_to.window(h); driver.close()
+        driver.switch_to.window(fresh)
+        if old == fresh:
+            raise RuntimeError("new tab not opened")
+        apply_cdp_setup(driver)
+    elif tier == "clear_cookies":
+        driver.delete_all_cookies()
+        try: driver.execute_cdp_cmd("Network.clearBrowserCache", {})
+        except Exception: pass
+        driver.get("about:blank")
+
+def recover_driver(stage, thread_id:int, driver, proxy_idx:int, streak:int, err:Exception, ext_root:str):
+    """Tiered recovery after a failed task. Returns (driver, proxy_idx, fix_text).
+    Browser mode walks RECOVERY_TIERS by failure streak; a full restart rotates the
+    proxy and prefers one with a warm spare in stage.driver_pool."""
+    tier = RECOVERY_TIERS[min(max(streak, 1), len(RECOVERY_TIERS)) - 1]
+    if isinstance(driver, TabDriver):
+        return recover_tab(driver, tier, err)
+    if FETCH_MODE == "browser" and driver is not None and tier != "restart" and not _driver_dead(err):
+        try:
+            _soft_recover(driver, tier)
+            return driver, proxy_idx, f"{tier.replace('_', ' ')} (same proxy)"
+        except Exception:
+            pass  # unresponsive: fall through to a restart
+
+    if driver is not None:
+        try: driver.quit()
+        except Exception: pass
+    pool = getattr(stage, "driver_pool", None)
+    old_idx = proxy_idx
+    ready = pool.ready_proxies() if pool else set()
+    if use_proxy_cache():
+        VERIFIER.invalidate(old_idx)   # re-checked before anyone rotates back onto it
+        good = VERIFIER.good_proxies()
+        ready = (ready & good) or good
+    proxy_idx = stage.rotate_proxy_for_thread(thread_id, proxy_idx, prefer=ready or None)
+    if use_proxy_cache():
+        proxy_idx = ensure_verified_proxy(stage, thread_id, proxy_idx)
+    fix = f"restarted + rotated proxy ({mask_ip(get_proxy_ip(old_idx))} → {mask_ip(get_proxy_ip(proxy_idx))})"
+    if FETCH_MODE != "browser":
+        return None, proxy_idx, fix
+    driver = pool.take(proxy_idx) if pool else None
+    if driver is not None:
+        return driver, proxy_idx, fix + " [warm spare]"
+    return start_driver(pick_ua(), proxies[proxy_idx], thread_id, ext_root), proxy_idx, fix
+
+# ====== Driver recycling ======
+try:
+    PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except Exception:
+    PAGE_SIZE = 4096
+
+def driver_root_pids(driver)->set:
+    pids = set()
+    pid = getattr(driver, "browser_pid", None)   # undetected_chromedriver launches Chrome itself
+    if pid: pids.add(int(pid))
+    try: pids.add(int(driver.service.process.pid))
+    except Exception: pass
+    return pids
+
+def process_tree_rss(root_pids)->int|None:
+    """Resident bytes of `root_pids` and all their descendants, from /proc (Linux only)."""
+    if not root_pids or not os.path.isdir("/proc"):
+        return None
+    children = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat", "rb") as f:
+                data = f.read()
+            ppid = int(data[data.rfind(b")") + 2:].split()[1])
+        except Exception:
+            continue
+        children.setdefault(ppid, []).append(int(name))
+    total, stack, seen = 0, list(root_pids), set()
+    while stack:
+        pid = stack.pop()
+        if pid in seen:
+            continue
+        seen.add(pid)
+        try:
+            with open(f"/proc/{pid}/statm") as f:
+                total += int(f.read().split()[1]) * PAGE_SIZE
+        except Exception:
+            pass
+        stack.extend(children.get(pid, ()))
+    return total
+
+def _quit_in_background(driver):
+    threading.Thread(target=lambda: driver.quit(), daemon=True, name="driver_quit").start()
+
+def maybe_recycle_driver(stage, thread_id:int, driver, proxy_idx:int, pages:int):
+    """Called after each successful page; returns (driver, proxy_idx, pages_on_driver)."""
+    if driver is None or isinstance(driver, TabDriver):
+        return driver, proxy_idx, pages
+    why = None
+    if RECYCLE_AFTER_PAGES and pages >= RECYCLE_AFTER_PAGES:
+        why = f"{pages} pages"
+    rss = None
+    if RECYCLE_RSS_MB and RSS_CHECK_EVERY and pages % RSS_CHECK_EVERY == 0:
+        rss = process_tree_rss(driver_root_pids(driver))
+        if rss is not None and rss >= RECYCLE_RSS_MB * 1048576:
+            why = f"RSS {rss/1048576:.0f} MB"
+    if why is None:
+        return driver, proxy_idx, pages
+
+    pool = stage.driver_pool
+    ready = pool.ready_proxies() if pool else set()
+    if ready:
+        new_idx = stage.rotate_proxy_for_thread(thread_id, proxy_idx, prefer=ready)
+        fresh = pool.take(new_idx)
+        if fresh is None:   # spare vanished or was dead; keep going on a fresh cold start
+            fresh = start_driver(pick_ua(), proxies[new_idx], thread_id, stage.ext_root)
+        how = "warm spare"
+    elif rss is not None and rss >= RECYCLE_RSS_HARD_MB * 1048576:
+        discard_prelaunched(stage, thread_id)
+        new_idx = proxy_idx
+        fresh = start_driver(pick_ua(), proxies[new_idx], thread_id, stage.ext_root)
+        how = "cold start (hard RSS limit)"
+    elif pool is None:
+        slot = stage.prelaunched.get(thread_id)
+        if slot is not None and slot["proxy_idx"] != proxy_idx:   # worker rotated proxy since
+            discard_prelaunched(stage, thread_id); slot = None
+        if slot is None:
+            stage.prelaunched[thread_id] = prelaunch_driver(stage, thread_id, proxy_idx)
+            return driver, proxy_idx, pages
+        if not slot["done"].is_set():
+            return driver, proxy_idx, pages   # keep working until the replacement is up
+        del stage.prelaunched[thread_id]
+        fresh, new_idx = slot["driver"], proxy_idx
+        if fresh is None:
+            return driver, proxy_idx, pages   # launch failed; the next trigger tries again
+        how = "background prelaunch"
+    else:
+        return driver, proxy_idx, pages   # wait for a spare rather than stall this worker
+    _quit_in_background(driver)
+    stage.metrics.incr("recycled")
+    with stage.thread_stats_lock:
+        stage.thread_stats[thread_id]["state"] = "Recycled"
+        stage.thread_stats[thread_id]["proxy"] = mask_ip(get_proxy_ip(new_idx))
+    perf_logger.info(f"[RECYCLE] {stage.name} T{thread_id}: {why} → {how} on {mask_ip(get_proxy_ip(new_idx))}",
+                     extra={'thread_id': thread_id})
+    return fresh, new_idx, 0
+
+def prelaunch_driver(stage, thread_id:int, proxy_idx:int)->dict:
+    """No DriverPool: start this worker's replacement Chrome in a background thread."""
+    slot = {"proxy_idx": proxy_idx, "driver": None, "done": threading.Event(), "cancel": False,
+            "lock": threading.Lock()}
+    def run():
+        try:
+            drv = start_driver(pick_ua(), proxies[proxy_idx], thread_id, stage.ext_root)
+        except Exception as e:
+            error_logger.error(f"[RECYCLE] {stage.name} T{thread_id} prelaunch failed: {type(e).__name__}", extra={'thread_id': thread_id})
+            drv = None
+        with slot["lock"]:
+            if slot["cancel"] and drv is not None:
+                _quit_in_background(drv); drv = None
+            slot["driver"] = drv
+            slot["done"].set()
+    threading.Thread(target=run, daemon=True, name=f"prelaunch_{stage.name}_{thread_id}").start()
+    return slot
+
+def discard_prelaunched(stage, thread_id:int):
+    """Quit (or cancel) a worker's pending replacement driver."""
+    slot = stage.prelaunched.pop(thread_id, None)
+    if slot is None:
+        return
+    with slot["lock"]:
+        slot["cancel"] = True
+        if slot["driver"] is not None:
+            _quit_in_background(slot["driver"]); slot["driver"] = None
+
+# ====== Shared browsers (several tabs per Chrome) ======
+class SharedBrowser:
+    """One Chrome process (one proxy) whose tabs are driven by several workers.
+    WebDriver commands are serialized by `lock` and re-targeted to the caller's tab;
+    with page_load_strategy "none" the page loads themselves overlap."""
+    def __init__(self, stage, key:int, ext_root:str):
+        self.stage = stage
+        self.key = key               # browser group; used as the proxy-assignment key in Stage
+        self.ext_root = ext_root
+        self.lock = threading.RLock()
+        self.driver = None
+        self.proxy_idx = None
+        self.generation = 0
+        self.tabs = set()
+        self._current = None
+
+    def _launch(self):
+        pool = self.stage.driver_pool
+        if self.proxy_idx is None:
+            self.proxy_idx = self.stage.assign_initial_proxy(self.key, exclude=VERIFIER.bad_proxies() if use_proxy_cache() else None)
+            self.driver, self.proxy_idx = launch_verified_driver(self.stage, self.key, self.proxy_idx, self.ext_root)
+            return
+        self.driver = pool.take(self.proxy_idx) if pool else None
+        if self.driver is None:
+            self.driver = start_driver(pick_ua(), proxies[self.proxy_idx], 200 + self.key, self.ext_root)
+
+    def open_tab(self):
+        with self.lock:
+            if self.driver is None:
+                self._launch()
+            free = [h for h in self.driver.window_handles if h not in self.tabs]
+            if free:
+                handle = free[0]
+            else:
+                self.driver.switch_to.new_window("tab")
+                handle = self.driver.current_window_handle
+                apply_cdp_setup(self.driver, 200 + self.key)
+            self.driver.switch_to.window(handle)
+            self._current = handle
+            self.tabs.add(handle)
+            return TabDriver(self, handle, self.generation)
+
+    def call(self, tab, fn):
+        with self.lock:
+            if self.driver is None or tab.generation != self.generation:
+                raise RuntimeError("invalid session id: shared browser was restarted")
+            if self._current != tab.handle:
+                self.driver.switch_to.window(tab.handle)
+                self._current = tab.handle
+            return fn(self.driver)
+
+    def restart(self, tab):
+        """Replace the whole browser (rotating its proxy) unless another tab already did; returns a new tab."""
+        with self.lock:
+            if tab.generation == self.generation and self.driver is not None:
+                try: self.driver.quit()
+                except Exception: pass
+                self.driver = None
+                pool = self.stage.driver_pool
+                self.proxy_idx = self.stage.rotate_proxy_for_thread(
+                    self.key, self.proxy_idx, prefer=pool.ready_proxies() if pool else None)
+                self.generation += 1
+                self.tabs.clear(); self._current = None
+            return self.open_tab()
+
+    def reopen_tab(self, tab):
+        with self.lock:
+            fresh = self.open_tab()
+            self.close_tab(tab)
+            return fresh
+
+    def close_tab(self, tab):
+        with self.lock:
+            if self.driver is None or tab.generation != self.generation or tab.handle not in self.tabs:
+                return
+            self.tabs.discard(tab.handle)
+            if not self.tabs:
+                try: self.driver.quit()
+                except Exception: pass
+                self.driver = None
+                self.stage.release_proxy(self.proxy_idx)
+                return
+            try:
+                self.driver.switch_to.window(tab.handle); self.driver.close()
+            except Exception:
+                pass
+            self._current = None
+
+class TabDriver:
+    """The subset of the WebDriver API the workers use, bound to one tab of a SharedBrowser."""
+    def __init__(self, browser:SharedBrowser, handle:str, generation:int):
+        self.browser = browser
+        self.handle = handle
+        self.generation = generation
+
+    def get(self, url):                  return self.browser.call(self, lambda d: d.get(url))
+    def refresh(self):                   return self.browser.call(self, lambda d: d.refresh())
+    def execute_script(self, js, *args): return self.browser.call(self, lambda d: d.execute_script(js, *args))
+    def execute_cdp_cmd(self, cmd, args):return self.browser.call(self, lambda d: d.execute_cdp_cmd(cmd, args))
+    def get_cookies(self):               return self.browser.call(self, lambda d: d.get_cookies())
+    def delete_all_cookies(self):        return self.browser.call(self, lambda d: d.delete_all_cookies())
+    def set_page_load_timeout(self, t):  return self.browser.call(self, lambda d: d.set_page_load_timeout(t))
+    def quit(self):                      self.browser.close_tab(self)
+
+    @property
+    def proxy_idx(self):
+        return self.browser.proxy_idx
+
+def recover_tab(tab:TabDriver, tier:str, err:Exception):
+    """recover_driver() for a shared-browser tab; returns (driver, proxy_idx, fix_text)."""
+    browser = tab.browser
+    if tier != "restart" and not _driver_dead(err):
+        try:
+            if tier == "new_tab":
+                tab = browser.reopen_tab(tab)
+            else:
+                _soft_recover(tab, tier)
+            return tab, browser.proxy_idx, f"{tier.replace('_', ' ')} (tab, same proxy)"
+        except Exception:
+            pass
+    old_idx = browser.proxy_idx
+    tab = browser.restart(tab)
+    if browser.proxy_idx == old_idx:
+        return tab, browser.proxy_idx, "reopened tab in restarted browser"
+    return tab, browser.proxy_idx, (f"restarted browser + rotated proxy "
+                                    f"({mask_ip(get_proxy_ip(old_idx))} → {mask_ip(get_proxy_ip(browser.proxy_idx))})")
+
+def start_worker_driver(stage, thread_id:int, ext_root:str):
+    """Initial (driver, proxy_idx) for a worker according to FETCH_MODE / TABS_PER_BROWSER."""
+    if FETCH_MODE == "http_first":
+        proxy_idx = stage.assign_initial_proxy(thread_id, exclude=VERIFIER.bad_proxies() if use_proxy_cache() else None)
+        return None, verify_proxy_http(stage, thread_id, proxy_idx)  # driver launched on first escalation
+    if TABS_PER_BROWSER > 1:
+        tab = stage.shared_browser(thread_id).open_tab()
+        return tab, tab.proxy_idx
+    proxy_idx = stage.assign_initial_proxy(thread_id, exclude=VERIFIER.bad_proxies() if use_proxy_cache() else None)
+    return launch_verified_driver(stage, thread_id, proxy_idx, ext_root)
+
+# ====== HTTP-first fetching ======
+R_NEXT_DATA_SCRIPT = re.compile(r'<script[^>]*\bid=["\']__NEXT_DATA__["\'][^>]*>(.*?)</script>', re.S | re.I)
+CHALLENGE_MARKERS = (
+    "cf-chl", "challenge-platform", "cf_chl_opt", "just a moment", "attention required",
+    "captcha", "px-captcha", "verify you are human",
+)
+HTTP_HEADERS = {
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Accept-Encoding": "gzip, deflate",
+    "Upgrade-Insecure-Requests": "1",
+}
+
+def parse_next_data_html(html:str):
+    """Pull the __NEXT_DATA__ JSON text out of a server-rendered page."""
+    m = R_NEXT_DATA_SCRIPT.search(html or "")
+    if not m:
+        return None
+    txt = m.group(1).strip()
+    return txt if txt.startswith("{") else None
+
+def is_challenge_response(status:int, body:str)->bool:
+    if status in (403, 429, 503):
+        return True
+    head = (body or "")[:20000].lower()
+    return "__next_data__" not in head and any(mk in head for mk in CHALLENGE_MARKERS)
+
+R_BUILD_ID = re.compile(r'"buildId"\s*:\s*"([^"]+)"')
+R_NEXT_LOCALE = re.compile(r'"locale"\s*:\s*"([^"]+)"')
+
+class BuildIdRegistry:
+    """Current Next.js buildId (and locale, if i18n is on) per domain."""
+    def __init__(self):
+        self._ids = {}
+        self._misses = {}            # domain -> paths that 404'd on its current buildId
+        self._lock = threading.Lock()
+        self.rotations = 0
+
+    def learn(self, url:str, next_data_text:str):
+        # buildId/locale sit after "props" at the tail of __NEXT_DATA__
+        tail_at = max(0, len(next_data_text or "") - 4000)
+        m = R_BUILD_ID.search(next_data_text or "", tail_at) or R_BUILD_ID.search(next_data_text or "")
+        if not m:
+            return None
+        loc = R_NEXT_LOCALE.search(next_data_text, tail_at)
+        domain = urlsplit(url).netloc
+        entry = (m.group(1), loc.group(1) if loc else None)
+        with self._lock:
+            old = self._ids.get(domain)
+            self._ids[domain] = entry
+            if not old or old[0] != entry[0]:
+                self._misses.pop(domain, None)
+            if old and old[0] != entry[0]:
+                self.rotations += 1
+                perf_logger.info(f"[BUILD] {domain} buildId {old[0]} → {entry[0]}", extra={'thread_id': 0})
+        return entry[0]
+
+    def get(self, domain:str):
+        with self._lock:
+            return self._ids.get(domain)
+
+    def invalidate(self, domain:str, build_id:str):
+        with self._lock:
+            if (self._ids.get(domain) or (None,))[0] == build_id:
+                self._ids.pop(domain, None)
+                self._misses.pop(domain, None)
+
+    def hit(self, domain:str, build_id:str):
+        """The buildId served a page: earlier 404s were gone listings."""
+        with self._lock:
+            if (self._ids.get(domain) or (None,))[0] == build_id:
+                self._misses.pop(domain, None)
+
+    def miss(self, domain:str, build_id:str, path:str)->bool:
+        """Record a data-route 404; True once BUILD_ID_404_PATHS different paths missed and the id was dropped."""
+        with self._lock:
+            if (self._ids.get(domain) or (None,))[0] != build_id:
+                return False
+            paths = self._misses.setdefault(domain, set())
+            paths.add(path)
+            if len(paths) < BUILD_ID_404_PATHS:
+                return False
+            self._ids.pop(domain, None); self._misses.pop(domain, None)
+            return True
+
+BUILD_IDS = BuildIdRegistry()
+
+def data_route_url(url:str, build_id:str, locale:str|None=None)->str:
+    """https://host/a/b?q → https://host/_next/data/<buildId>[/<locale>]/a/b.json?q"""
+    parts = urlsplit(url)
+    path = parts.path.rstrip("/")
+    if locale:
+        path = f"/{locale}{path}"
+    path = path or "/index"
+    return urlunsplit((parts.scheme, parts.netloc, f"/_next/data/{build_id}{path}.json", parts.query, ""))
+
+def proxy_url_for(proxy_cfg:dict|None):
+    if not proxy_cfg:
+        return None
+    if PROXY_MODE == "userpass" and proxy_cfg.get("username"):
+        from urllib.parse import quote
+        auth = f"{quote(proxy_cfg['username'], safe='')}:{quote(proxy_cfg.get('password',''), safe='')}@"
+    else:
+        auth = ""
+    return f"http://{auth}{proxy_cfg['server']}"
+
+class HttpClientPool:
+    """One pooled requests.Session per proxy index (keep-alive, connection reuse).
+    Index None means a direct session, e.g. for a local HTTP stand-in.
+    Also holds per-proxy clearance state handed over from a warmed browser."""
+    def __init__(self, pool_size:int=8):
+        self.pool_size = pool_size
+        self._sessions = {}
+        self._clearance = {}
+        self._lock = threading.Lock()
+
+    def get(self, proxy_idx):
+        with self._lock:
+            sess = self._sessions.get(proxy_idx)
+            if sess is None:
+                sess = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=self.pool_size, max_retries=0)
+                sess.mount("http://", adapter); sess.mount("https://", adapter)
+                sess.headers.update(HTTP_HEADERS)
+                sess.headers["User-Agent"] = pick_ua()
+                purl = proxy_url_for(proxies[proxy_idx]) if proxy_idx is not None else None
+                if purl:
+                    sess.proxies = {"http": purl, "https": purl}
+                self._sessions[proxy_idx] = sess
+            return sess
+
+    def drop(self, proxy_idx):
+        with self._lock:
+            sess = self._sessions.pop(proxy_idx, None)
+            self._clearance.pop(proxy_idx, None)
+        if sess is not None:
+            try: sess.close()
+            except Exception: pass
+
+    def import_browser_session(self, proxy_idx, cookies:list, user_agent:str|None):
+        """Load Selenium cookies (and the browser UA, which clearance cookies are bound to)."""
+        sess = self.get(proxy_idx)
+        now = time.time()
+        expiries = []
+        for c in cookies or []:
+            try:
+                sess.cookies.set(c["name"], c["value"], domain=c.get("domain"), path=c.get("path", "/"),
+                                 expires=c.get("expiry"), secure=bool(c.get("secure")))
+            except Exception:
+                continue
+            if c.get("name") in CLEARANCE_COOKIE_NAMES and c.get("expiry"):
+                expiries.append(float(c["expiry"]))
+        if user_agent:
+            sess.headers["User-Agent"] = user_agent
+        expires_at = (min(expiries) if expiries else now + CLEARANCE_DEFAULT_TTL) - CLEARANCE_EXPIRY_MARGIN
+        with self._lock:
+            st = self._clearance.setdefault(proxy_idx, {"handoffs": 0, "ok": 0, "fail": 0, "expires_at": 0.0})
+            st["handoffs"] += 1
+            st["expires_at"] = expires_at
+            st["cookies"] = len(cookies or [])
+
+    def needs_refresh(self, proxy_idx)->bool:
+        """True once a handed-over clearance has expired (the next fetch should go via the browser)."""
+        with self._lock:
+            st = self._clearance.get(proxy_idx)
+            return bool(st) and time.time() >= st["expires_at"]
+
+    def record(self, proxy_idx, ok:bool):
+        with self._lock:
+            st = self._clearance.get(proxy_idx)
+            if st is not None:
+                st["ok" if ok else "fail"] += 1
+
+    def clearance_stats(self)->dict:
+        with self._lock:
+            out = {}
+            for idx, st in self._clearance.items():
+                tries = st["ok"] + st["fail"]
+                out[idx] = dict(st, success_rate=(st["ok"] / tries) if tries else None)
+            return out
+
+    def close_all(self):
+        for idx in list(self._sessions.keys()):
+            self.drop(idx)
+
+HTTP_POOL = HttpClientPool()
+
+def http_get_next_data(url:str, proxy_idx, pool:HttpClientPool|None=None):
+    """GET a page over plain HTTP and return (next_data_text|None, reason)."""
+    if requests is None:
+        return None, "requests unavailable"
+    sess = (pool or HTTP_POOL).get(proxy_idx)
+    try:
+        r = sess.get(url, timeout=HTTP_TIMEOUT, allow_redirects=True)
+    except Exception as e:
+        return None, f"{type(e).__name__}"
+    body = r.text or ""
+    if is_challenge_response(r.status_code, body):
+        return None, f"challenge (HTTP {r.status_code})"
+    if r.status_code != 200:
+        return None, f"HTTP {r.status_code}"
+    text = parse_next_data_html(body)
+    return (text, "ok") if text else (None, "no __NEXT_DATA__")
+
+def http_get_data_route(url:str, proxy_idx, pool:HttpClientPool|None=None, registry:BuildIdRegistry|None=None):
+    """Fetch pageProps via the Next.js data route; returns (next_data_text|None, reason, bytes).
+    The text is wrapped as {"props": {...}} so existing __NEXT_DATA__ parsers apply unchanged."""
+    if requests is None:
+        return None, "requests unavailable", 0
+    registry = registry or BUILD_IDS
+    domain = urlsplit(url).netloc
+    known = registry.get(domain)
+    if not known:
+        return None, "no buildId", 0
+    build_id, locale = known
+    sess = (pool or HTTP_POOL).get(proxy_idx)
+    try:
+        r = sess.get(data_route_url(url, build_id, locale), timeout=HTTP_TIMEOUT, allow_redirects=False,
+                     headers={"Accept": "application/json", "x-nextjs-data": "1"})
+    except Exception as e:
+        return None, f"{type(e).__name__}", 0
+    size = len(r.content or b"")
+    if r.status_code == 404:
+        if registry.miss(domain, build_id, urlsplit(url).path):
+            return None, f"buildId {build_id} rotated (404 on {BUILD_ID_404_PATHS} paths)", size
+        return None, "listing gone (404)", size
+    if r.status_code != 200:
+        return None, f"challenge (HTTP {r.status_code})" if is_challenge_response(r.status_code, "") else f"HTTP {r.status_code}", size
+    try:
+        payload = r.json()
+    except Exception:
+        return None, "challenge (non-JSON)" if is_challenge_response(200, r.text) else "non-JSON", size
+    if not isinstance(payload, dict) or "pageProps" not in payload:
+        return None, "no pageProps", size
+    registry.hit(domain, build_id)
+    return json.dumps({"props": payload, "buildId": build_id, "page": urlsplit(url).path}), "ok", size
+
+def export_browser_session(driver):
+    """Return (cookies, user_agent) from a live Chrome session."""
+    try:
+        cookies = driver.get_cookies() or []
+    except Exception:
+        cookies = []
+    try:
+        ua = driver.execute_script("return navigator.userAgent")
+    except Exception:
+        ua = None
+    return cookies, ua
+
+def handoff_browser_session(driver, proxy_idx:int, thread_id:int=0):
+    cookies, ua = export_browser_session(driver)
+    if not cookies:
+        return
+    HTTP_POOL.import_browser_session(proxy_idx, cookies, ua)
+    names = sorted({c.get("name") for c in cookies if c.get("name") in CLEARANCE_COOKIE_NAMES})
+    perf_logger.info(f"[HANDOFF] proxy={mask_ip(get_proxy_ip(proxy_idx))} cookies={len(cookies)} clearance={names or '-'}",
+                     extra={'thread_id': thread_id})
+
+# ====== Proxy verification cache ======
+IP_PROBE_URL = "https://ipv4.api.ipify.org?format=json"
+
+class ProxyVerifier:
+    """proxy index -> (ok, exit_ip, checked_at); checks go straight through the proxy with requests."""
+    def __init__(self, ttl:float=PROXY_VERIFY_TTL):
+        self.ttl = ttl
+        self._results = {}
+        self._lock = threading.Lock()
+        self._sys_ip = None
+
+    def system_ip(self)->str:
+        if self._sys_ip is None:
+            self._sys_ip = system_public_ipv4()
+        return self._sys_ip
+
+    def check(self, idx:int)->bool:
+        purl = proxy_url_for(proxies[idx])
+        try:
+            ip = requests.get(IP_PROBE_URL, proxies={"http": purl, "https": purl}, timeout=HTTP_TIMEOUT).json().get("ip")
+        except Exception:
+            ip = None
+        ok = bool(ip) and ip != self.system_ip()
+        with self._lock:
+            self._results[idx] = (ok, ip, time.time())
+        msg = f"[IP] proxy {mask_ip(get_proxy_ip(idx))}: {'ok' if ok else 'FAILED'} (exit={ip}, system={self.system_ip()})"
+        try: detection_logger.info(msg, extra={'thread_id': 0})
+        except Exception: pass
+        return ok
+
+    def fresh(self, idx:int):
+        with self._lock:
+            res = self._results.get(idx)
+        return res if res and time.time() - res[2] < self.ttl else None
+
+    def ok(self, idx:int)->bool:
+        res = self.fresh(idx)
+        return res[0] if res else self.check(idx)
+
+    def invalidate(self, idx:int):
+        with self._lock:
+            self._results.pop(idx, None)
+
+    def good_proxies(self)->set:
+        now = time.time()
+        with self._lock:
+            return {i for i, (ok, _, ts) in self._results.items() if ok and now - ts < self.ttl}
+
+    def bad_proxies(self)->set:
+        now = time.time()
+        with self._lock:
+            return {i for i, (ok, _, ts) in self._results.items() if not ok and now - ts < self.ttl}
+
+    def verify_all(self)->str:
+        """Check every stale/unknown proxy in parallel; returns a one-line summary."""
+        self.system_ip()
+        todo = [i for i in range(len(proxies)) if self.fresh(i) is None]
+        t0 = time.time()
+        if todo:
+            with ThreadPoolExecutor(max_workers=max(1, min(PROXY_VERIFY_WORKERS, len(todo)))) as ex:
+                list(ex.map(self.check, todo))
+        good = self.good_proxies()
+        bad = [mask_ip(get_proxy_ip(i)) for i in range(len(proxies)) if i not in good]
+        return (f"🛡️ Proxies verified: {len(good)}/{len(proxies)} ok • checked {len(todo)} in {time.time()-t0:.1f}s"
+                + (f" • failed: {', '.join(bad)}" if bad else ""))
+
+VERIFIER = ProxyVerifier()
+
+def use_proxy_cache()->bool:
+    return PROXY_VERIFY_CACHE and requests is not None
+
+def ensure_verified_proxy(stage, thread_id:int, proxy_idx:int, tries:int=3)->int:
+    """Rotate until the thread holds a proxy that passes the (cached) check, at most `tries` times."""
+    for _ in range(tries):
+        if VERIFIER.ok(proxy_idx):
+            return proxy_idx
+        proxy_idx = stage.rotate_proxy_for_thread(thread_id, proxy_idx, prefer=VERIFIER.good_proxies())
+    return proxy_idx
+
+def verify_proxy_http(stage, thread_id:int, proxy_idx:int)->int:
+    """HTTP-mode counterpart of the browser IP check; rotates once on failure."""
+    if use_proxy_cache():
+        return ensure_verified_proxy(stage, thread_id, proxy_idx, tries=2)
+    sys_ip = system_public_ipv4()
+    for attempt in (1, 2):
+        try:
+            ip = HTTP_POOL.get(proxy_idx).get("https://ipv4.api.ipify.org?format=json", timeout=HTTP_TIMEOUT).json().get("ip")
+        except Exception:
+            ip = None
+        ok = bool(ip) and ip != sys_ip
+        msg = f"[IP] {stage.name} T{thread_id} (http): system={sys_ip}  proxy={ip}"
+        print(msg)
+        try: detection_logger.info(msg, extra={'thread_id': thread_id})
+        except Exception: pass
+        if ok or attempt == 2:
+            return proxy_idx
+        proxy_idx = stage.rotate_proxy_for_thread(thread_id, proxy_idx)
+    return proxy_idx
+
+def fetch_next_data(stage, url:str, driver, proxy_idx:int, thread_id:int, subtrees=None):
+    """Load `url` and return (next_data_text|None, driver, raw_text|None).
+    http_first: try the pooled HTTP client and only escalate to Chrome (started
+    lazily) on a challenge, a non-200 or a missing __NEXT_DATA__ script.
+    raw is what gets archived; it is None when only subtrees were pulled from Chrome."""
+    refresh = SESSION_HANDOFF and HTTP_POOL.needs_refresh(proxy_idx)
+    if NEXT_DATA_ROUTES and not refresh:
+        text, why, size = http_get_data_route(url, proxy_idx)
+        if text:
+            HTTP_POOL.record(proxy_idx, True)
+            stage.metrics.incr("data_route"); stage.metrics.incr("data_route_bytes", size)
+            return text, driver, text
+        if why != "no buildId":
+            if not why.startswith("listing gone"):   # a 404 says nothing about the clearance
+                HTTP_POOL.record(proxy_idx, False)
+            detection_logger.info(f"[{stage.name}] data route → page ({why}) {url}", extra={'thread_id': thread_id})
+    if FETCH_MODE == "http_first":
+        if refresh:
+            why = "clearance expired"
+        else:
+            text, why = http_get_next_data(url, proxy_idx)
+            HTTP_POOL.record(proxy_idx, bool(text))
+            if text:
+                BUILD_IDS.learn(url, text)
+                stage.metrics.incr("http_ok")
+                return text, driver, text
+        detection_logger.info(f"[{stage.name}] HTTP→browser ({why}) {url}", extra={'thread_id': thread_id})
+        stage.metrics.incr("escalated")
+    if driver is None:
+        driver = start_driver(pick_ua(), proxies[proxy_idx], thread_id, stage.ext_root)
+    driver.set_page_load_timeout(PAGELOAD_TIMEOUT)
+    text, raw = browser_next_data(driver, url, subtrees)
+    if MEASURE_PAGE_BYTES:
+        b, n = page_transfer_bytes(driver)
+        if b is not None:
+            stage.metrics.incr("page_bytes", b); stage.metrics.incr("pages_measured")
+    if text:
+        BUILD_IDS.learn(url, text)
+        if SESSION_HANDOFF and (FETCH_MODE == "http_first" or NEXT_DATA_ROUTES):
+            handoff_browser_session(driver, proxy_idx, thread_id)
+    return text, driver, raw
+
+# ====== Durable run state ======
+class TaskStore:
+    """SQLite (WAL) log of each task's latest state (ready/delayed/deferred/done/exhausted) and the
+    rows it produced. One connection behind a lock; every write is its own short transaction."""
+    def __init__(self, path:str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS tasks (stage TEXT, key TEXT, task TEXT, state TEXT,
+                                              ready_at REAL, updated REAL, PRIMARY KEY (stage, key));
+            CREATE TABLE IF NOT EXISTS task_rows (stage TEXT, key TEXT, data TEXT, PRIMARY KEY (stage, key));
+            CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, data TEXT);
+        """)
+
+    @staticmethod
+    def _key(key)->str:
+        return json.dumps(key, ensure_ascii=False)
+
+    def save_tasks(self, stage:str, items):
+        """items: (key, task, state, ready_at) tuples, written in one transaction."""
+        now = time.time()
+        rows = [(stage, self._key(k), json.dumps(t, ensure_ascii=False, default=str), st, ra, now) for k, t, st, ra in items]
+        if not rows: return
+        with self.lock:
+            self.conn.execute("BEGIN")
+            self.conn.executemany("INSERT OR REPLACE INTO tasks VALUES (?,?,?,?,?,?)", rows)
+            self.conn.execute("COMMIT")
+
+    def finish(self, stage:str, key, state:str, data=None):
+        k = self._key(key)
+        with self.lock:
+            self.conn.execute("BEGIN")
+            self.conn.execute("UPDATE tasks SET state=?, ready_at=NULL, updated=? WHERE stage=? AND key=?", (state, time.time(), stage, k))
+            if data is not None:
+                self.conn.execute("INSERT OR REPLACE INTO task_rows VALUES (?,?,?)", (stage, k, json.dumps(data, ensure_ascii=False, default=str)))
+            self.conn.execute("COMMIT")
+
+    def load_tasks(self, stage:str)->list:
+        with self.lock:
+            cur = self.conn.execute("SELECT task, state, ready_at FROM tasks WHERE stage=?", (stage,))
+            return [(json.loads(t), st, ra) for t, st, ra in cur.fetchall()]
+
+    def load_rows(self, stage:str)->list:
+        with self.lock:
+            cur = self.conn.execute("SELECT data FROM task_rows WHERE stage=?", (stage,))
+            return [json.loads(d) for (d,) in cur.fetchall()]
+
+    def save_meta(self, name:str, data):
+        """Run-wide state outside the task table (page stops, pending watermarks)."""
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?,?)", (name, json.dumps(data, ensure_ascii=False, default=str)))
+
+    def load_meta(self, name:str, default=None):
+        with self.lock:
+            hit = self.conn.execute("SELECT data FROM meta WHERE name=?", (name,)).fetchone()
+        return json.loads(hit[0]) if hit else default
+
+    def close(self):
+        with self.lock:
+            try: self.conn.close()
+            except Exception: pass
+
+class ListingIndex:
+    """CHANGE_AWARE_ADVIEW: last extracted detail row per listing URL, keyed to the ADLIST summary
+    fingerprint (ad_id, listed_unix, price) it was fetched under. Persists across runs."""
+    def __init__(self, path:str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS listings (url TEXT PRIMARY KEY, fp TEXT, row TEXT, updated REAL)")
+
+    @staticmethod
+    def fingerprint(summary:dict)->str:
+        lu = summary.get("listed_unix")
+        return json.dumps([str(summary.get("ad_id") or ""), lu if isinstance(lu, int) else None, str(summary.get("price") or "")])
+
+    def lookup(self, url:str, fp:str):
+        """Stored detail row when the listing is unchanged and the row is recent enough, else None."""
+        oldest = time.time() - LISTING_INDEX_MAX_AGE_DAYS * 86400
+        with self.lock:
+            hit = self.conn.execute("SELECT row FROM listings WHERE url=? AND fp=? AND updated>=?", (url, fp, oldest)).fetchone()
+        return json.loads(hit[0]) if hit else None
+
+    def record(self, url:str, fp:str, row:dict):
+        data = json.dumps(row, ensure_ascii=False, default=str)
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO listings VALUES (?,?,?,?)", (url, fp, data, time.time()))
+
+    def close(self):
+        with self.lock:
+            try: self.conn.close()
+            except Exception: pass
+
+LISTING_INDEX = ListingIndex(os.path.join(BASE_DIR, LISTING_INDEX_FILE)) if CHANGE_AWARE_ADVIEW else None
+
 # ====== Stage Container ======
+class StageMetrics:
+    """Counters written through per-thread shards (no shared lock on the hot path) and summed on read.
+    Item assignment (total, start_ts) sets the base value."""
+    def __init__(self, **base):
+        self._base = dict(base)
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self)->dict:
+        d = getattr(self._local, "d", None)
+        if d is None:
+            d = self._local.d = {}
+            with self._shards_lock:
+                self._shards.append(d)
+        return d
+
+    def incr(self, key:str, n=1):
+        d = self._shard()
+        d[key] = d.get(key, 0) + n
+
+    def __getitem__(self, key:str):
+        v = self._base.get(key, 0)
+        for d in tuple(self._shards):
+            v += d.get(key, 0)
+        return v
+
+    def __setitem__(self, key:str, value):
+        self._base[key] = value
+
 class Stage:
-    def __init__(self, name:str, threads:int, ext_root:str):
+    def __init__(self, name:str, threads:int, ext_root:str, store:TaskStore|None=None, key_fn=None):
         self.name = name
         self.threads = threads
         self.ext_root = ext_root
-
-        self.ready_q = queue.Queue()
-        self.deferred_q = queue.Queue()
+        self.store = store       # durable task state (TASK_STORE); key_fn maps a task to its done_set key
+        self.key_fn = key_fn
+
+        # Scheduler: ready deque + delay heap + deferred (final-sweep) deque behind one condition.
+        # Workers block in next_task() until a task is ready, the next delay falls due, or the
+        # stage completes (done_event); no polling.
+        lock = threading.RLock()
+        self.cv = threading.Condition(lock)
+        self.space = threading.Condition(lock)   # PIPELINE producers waiting for the ready queue to drain
+        self.ready = deque()
         self.delayed_heap = []
-        self.delayed_lock = threading.Lock()
         self.delayed_seq = 0
+        self.deferred = deque()
+        self.active = 0              # tasks handed out by next_task() and not yet task_done()
+        self.done_event = threading.Event()
+        self.inputs_open = False     # PIPELINE: an upstream stage may still feed() tasks
+        self.seen = set()            # keys already fed / restored (feed() dedup)
+        self.listing_keys = set()    # ADLIST (url, intent, segment) collected so far (QUERY_SHARDS overlap)
+        self.adview_rows = []; self.adview_rows_lock = threading.Lock()
+        self.downstream = None
+        self.spawned = 0
+        self.id_base = 0             # first worker id (PIPELINE: ADVIEW ids follow ADLIST's)
+        self.last_take = time.time() # last next_task() hand-out (wait_for_room liveness)
+        self.room_stalled = False
 
         self.state_lock = threading.Lock()
         self.in_flight = set()
@@ -441,9 +2006,21 @@ class Stage:
         self.thread_stats = {}
         self.thread_stats_lock = threading.Lock()
 
-        self.metrics = {"total": 0, "completed": 0, "ok": 0, "retried": 0, "deferred": 0, "final_exhausted": 0, "start_ts": time.time()}
+        self.metrics = StageMetrics(total=0, start_ts=time.time())
         self.overall_bar = None
         self.thread_bars = {}
+        self.driver_pool = None
+        self.browsers = {}
+        self.prelaunched = {}        # thread_id -> pending replacement driver (recycling without a pool)
+
+    def shared_browser(self, thread_id:int):
+        """Tab mode: the SharedBrowser this worker's tab lives in."""
+        key = self.id_base + (thread_id - self.id_base) // TABS_PER_BROWSER
+        with self.state_lock:
+            b = self.browsers.get(key)
+            if b is None:
+                b = self.browsers[key] = SharedBrowser(self, key, self.ext_root)
+            return b
 
     def assign_initial_proxy(self, thread_id:int, exclude:set|None=None)->int:
         preferred = thread_id % len(proxies)
@@ -465,11 +2042,12 @@ class Stage:
             self.initial_proxy_indices.add(idx)
             return idx
 
-    def rotate_proxy_for_thread(self, thread_id:int, current_idx:int)->int:
+    def rotate_proxy_for_thread(self, thread_id:int, current_idx:int, prefer:set|None=None)->int:
         with self.state_lock:
             self.used_proxies.discard(current_idx)
             idx = None
-            for i in range(len(proxies)):
+            order = sorted(range(len(proxies)), key=lambda i: i not in (prefer or ()))
+            for i in order:
                 if i != current_idx and i not in self.used_proxies:
                     idx = i; break
             if idx is None:
@@ -483,29 +2061,182 @@ class Stage:
         with self.state_lock:
             self.used_proxies.discard(idx)
 
+    def _persist(self, tasks:list, state:str, ready_at=None):
+        if self.store is not None:
+            self.store.save_tasks(self.name, [(self.key_fn(t), t, state, ready_at) for t in tasks])
+
+    def put(self, task:dict):
+        self._persist([task], "ready")
+        with self.cv:
+            self.ready.append(task)
+            self.done_event.clear()
+            self.cv.notify()
+
+    def put_many(self, tasks):
+        tasks = list(tasks)
+        self._persist(tasks, "ready")
+        with self.cv:
+            self.ready.extend(tasks)
+            self.done_event.clear()
+            self.cv.notify_all()
+
     def schedule_retry(self, task:dict, seconds:int):
-        ready_at = time.time() + seconds
-        with self.delayed_lock:
+        due = time.time() + seconds
+        self._persist([task], "delayed", due)
+        with self.cv:
             self.delayed_seq += 1
-            heapq.heappush(self.delayed_heap, (ready_at, self.delayed_seq, task))
+            heapq.heappush(self.delayed_heap, (due, self.delayed_seq, task))
+            self.cv.notify()   # a waiter may need to shorten its sleep
 
-    def pop_due_delayed(self, to_ready_max:int=100):
-        moved = 0
-        now = time.time()
-        while True:
-            with self.delayed_lock:
-                if self.delayed_heap and self.delayed_heap[0][0] <= now and moved < to_ready_max:
-                    _, _, task = heapq.heappop(self.delayed_heap)
+    def defer(self, task:dict):
+        """Park a task for the final sweep (runs once nothing else is ready, delayed or active)."""
+        self._persist([task], "deferred")
+        with self.cv:
+            self.deferred.append(task)
+
+    def complete(self, key, data=None, state:str="done"):
+        """Mark a task finished: done_set plus its durable state and extracted rows."""
+        with self.state_lock:
+            self.done_set.add(key)
+        if self.store is not None:
+            self.store.finish(self.name, key, state, data)
+
+    def restore(self)->int:
+        """--resume: rebuild done_set, queues and counters from the store. Returns the task total."""
+        n = 0; finished = {"done": 0, "exhausted": 0, "skipped": 0}
+        with self.cv:
+            for task, state, ready_at in self.store.load_tasks(self.name):
+                key = self.key_fn(task)
+                self.seen.add(key)
+                if state == "reused":   # served from the listing index, never queued
+                    self.metrics.incr("reused"); continue
+                n += 1
+                if state in finished:
+                    self.done_set.add(key); finished[state] += 1
+                elif state == "deferred":
+                    self.deferred_set.add(key); self.deferred.append(task)
+                elif state == "delayed":
+                    self.delayed_seq += 1
+                    heapq.heappush(self.delayed_heap, (ready_at or 0, self.delayed_seq, task))
                 else:
-                    break
-            self.ready_q.put(task); moved += 1
-        return moved
+                    self.ready.append(task)
+            self.done_event.clear()
+        self.metrics["total"] = n
+        self.metrics["ok"] = finished["done"]; self.metrics["final_exhausted"] = finished["exhausted"]
+        self.metrics["skipped"] = finished["skipped"]
+        self.metrics["completed"] = sum(finished.values())
+        return n
+
+    def pending(self)->bool:
+        with self.cv:
+            return bool(self.ready or self.delayed_heap or self.deferred or self.active)
+
+    def depth(self)->int:
+        with self.cv:
+            return len(self.ready) + len(self.delayed_heap) + len(self.deferred)
+
+    def feed(self, tasks:list)->int:
+        """PIPELINE input: queue the tasks whose key hasn't been fed or restored before."""
+        with self.cv:
+            fresh = []
+            for t in tasks:
+                k = self.key_fn(t)
+                if k not in self.seen:
+                    self.seen.add(k); fresh.append(t)
+            if fresh:
+                self.put_many(fresh)
+                self.metrics.incr("total", len(fresh))
+        if fresh and self.overall_bar is not None:
+            self.overall_bar.total = self.metrics["total"]; self.overall_bar.refresh()
+        return len(fresh)
+
+    def wait_for_room(self, limit:int):
+        """Backpressure: block a producer while `limit` or more tasks are waiting, unless no worker
+        has taken a task for PIPELINE_STALL_SEC (none got a driver) — then stop pausing until one does."""
+        with self.cv:
+            while len(self.ready) >= limit and not self.done_event.is_set():
+                if time.time() - self.last_take >= PIPELINE_STALL_SEC:
+                    if not self.room_stalled:
+                        self.room_stalled = True
+                        perf_logger.info(f"[PIPELINE] {self.name}: no task taken for {PIPELINE_STALL_SEC}s "
+                                         f"with {len(self.ready)} queued; producers no longer wait", extra={'thread_id': 0})
+                    return
+                self.space.wait(5)
+
+    def reuse_unchanged(self, tasks:list, summary:dict)->list:
+        """CHANGE_AWARE_ADVIEW: tasks whose ADLIST summary (summary[url]) matches LISTING_INDEX take
+        their stored detail row instead of a fetch. Returns the tasks that still need fetching."""
+        if LISTING_INDEX is None:
+            return tasks
+        todo = []
+        for t in tasks:
+            s = summary.get(t["url"])
+            if s is None:
+                todo.append(t); continue
+            t["fp"] = LISTING_INDEX.fingerprint(s)
+            row = LISTING_INDEX.lookup(t["url"], t["fp"])
+            if row is None:
+                todo.append(t); continue
+            key = self.key_fn(t)
+            with self.cv:
+                if key in self.seen: continue
+                self.seen.add(key)
+            with self.adview_rows_lock:
+                self.adview_rows.append(row)
+            self._persist([t], "reused")
+            if self.store is not None: self.store.finish(self.name, key, "reused", row)
+            self.metrics.incr("reused")
+        return todo
+
+    def close_inputs(self):
+        with self.cv:
+            self.inputs_open = False
+            if not (self.ready or self.delayed_heap or self.deferred or self.active):
+                self.done_event.set()
+            self.cv.notify_all()
+
+    def next_task(self):
+        """Block until a task is ready (returns it) or the stage is finished (returns None)."""
+        with self.cv:
+            while True:
+                now = time.time()
+                while self.delayed_heap and self.delayed_heap[0][0] <= now:
+                    self.ready.append(heapq.heappop(self.delayed_heap)[2])
+                if self.ready:
+                    self.active += 1
+                    self.last_take = now; self.room_stalled = False
+                    self.space.notify()
+                    return self.ready.popleft()
+                if self.active == 0 and not self.delayed_heap and not self.inputs_open:
+                    if self.deferred:
+                        self.ready.extend(self.deferred); self.deferred.clear()
+                        continue
+                    self.done_event.set()
+                    self.cv.notify_all()
+                    return None
+                self.cv.wait((self.delayed_heap[0][0] - now) if self.delayed_heap else None)
+
+    def task_done(self):
+        with self.cv:
+            self.active -= 1
+            if self.active == 0:
+                self.cv.notify_all()   # idle workers re-check for completion / the final sweep
+
+    def wait_done(self):
+        self.done_event.wait()
 
 # ====== ADLIST specifics ======
 def build_adlist_url(intent:str, is_commercial:bool, page:int)->str:
     base = "https://www.propertyguru.com.my/property-for-sale" if intent == "sale" else "https://www.propertyguru.com.my/property-for-rent"
     return f"{base}?isCommercial={'true' if is_commercial else 'false'}&sort=date&order=desc&page={page}"
 
+ADLIST_PRICE_PATHS = [
+    "listingData.price.value",
+    "listingData.price.amount",
+    "listingData.price.pretty",
+    "listingData.price",
+]
+
 def extract_adlist_rows_from_nextdata(text:str, intent:str, segment:str, page_no:int):
     rows = []
     try:
@@ -526,13 +2257,180 @@ def extract_adlist_rows_from_nextdata(text:str, intent:str, segment:str, page_no
         agent_name = agent.get("name") if isinstance(agent, dict) else None
         agent_id   = agent.get("id")   if isinstance(agent, dict) else None
         ad_id = ld.get("id") or ld.get("listingId") or item.get("id") or None
+        price = ""
+        for p in ADLIST_PRICE_PATHS:
+            v = get_by_path(item, p) if isinstance(item, dict) else None
+            if not isinstance(v, dict) and (price := parse_money_value(v)): break
         rows.append({
             "intent": intent, "segment": segment, "url": url, "title": title,
             "listed_unix": listed_unix, "agent_name": agent_name, "agent_id": agent_id,
-            "ad_id": ad_id, "page_no": page_no
+            "ad_id": ad_id, "price": price, "page_no": page_no
         })
     return rows
 
+def shard_label(shard)->str:
+    if not shard: return ""
+    return f"p{shard['min']}-{'' if shard['max'] is None else shard['max']}"
+
+def shard_url(url:str, shard)->str:
+    """Add a price-band shard's filters to an SRP URL."""
+    if not shard: return url
+    parts = [f"{SHARD_PRICE_PARAMS[0]}={shard['min']}"] if shard["min"] else []
+    if shard["max"] is not None: parts.append(f"{SHARD_PRICE_PARAMS[1]}={shard['max']}")
+    if not parts: return url
+    return url + ("&" if "?" in url else "?") + "&".join(parts)
+
+def split_shard(shard:dict):
+    """Bisect a price band (an open top band splits at 2×min); None when it is too narrow."""
+    lo, hi = shard["min"], shard["max"]
+    if hi is None:
+        if not lo: return None
+        mid = lo * 2
+    else:
+        if hi - lo < 2 * SHARD_MIN_BAND: return None
+        mid = (lo + hi) // 2
+    return [{"min": lo, "max": mid}, {"min": mid, "max": hi}]
+
+def initial_shards(intent:str)->list:
+    bands = SHARD_PRICE_BANDS.get(intent) or [0, None]
+    return [{"min": lo, "max": hi} for lo, hi in zip(bands, bands[1:])]
+
+ADLIST_TOTAL_PAGES_PATHS = [
+    "paginationData.totalPages",
+    "paginationData.pageCount",
+    "pagination.totalPages",
+]
+ADLIST_TOTAL_COUNT_PATHS = [
+    "paginationData.totalCount",
+    "paginationData.totalListings",
+    "paginationData.total",
+    "pagination.total",
+    "listingsCount",
+]
+
+def adlist_page_meta(text:str, page_rows:int|None=None):
+    """(listingsData present, page count of the whole query or None) from an SRP's __NEXT_DATA__.
+    A total listing count is divided by page_rows (page 1's row count), else ADLIST_PAGE_ROWS."""
+    try:
+        data = json.loads(text)["props"]["pageProps"]["pageData"]["data"]
+    except Exception:
+        return False, None
+    listed = isinstance(data.get("listingsData"), list)
+    for p in ADLIST_TOTAL_PAGES_PATHS:
+        try: n = int(get_by_path(data, p))
+        except Exception: continue
+        if n > 0: return listed, n
+    for p in ADLIST_TOTAL_COUNT_PATHS:
+        try: n = int(get_by_path(data, p))
+        except Exception: continue
+        if n >= 0: return listed, max(1, math.ceil(n / (page_rows or ADLIST_PAGE_ROWS)))
+    return listed, None
+
+class PageStops:
+    """Last page to crawl per ADLIST category, set by an empty page or (INCREMENTAL) a page older than the watermark."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stop_at = {}
+        self.store = None
+
+    def attach(self, store:TaskStore):
+        """Persist stops in the run's TaskStore and pick up the ones a resumed run already found."""
+        with self.lock:
+            self.store = store
+            for cat, page in store.load_meta("page_stops", []):
+                cat = tuple(cat)
+                self.stop_at[cat] = min(page, self.stop_at.get(cat, page))
+
+    def stop(self, cat:tuple, page:int):
+        with self.lock:
+            self.stop_at[cat] = min(page, self.stop_at.get(cat, page))
+            if self.store is not None:
+                self.store.save_meta("page_stops", [[list(c), p] for c, p in self.stop_at.items()])
+
+    def stopped(self, cat:tuple, page:int)->bool:
+        with self.lock:
+            return page > self.stop_at.get(cat, page)
+
+    def summary(self)->str:
+        with self.lock:
+            stops = ", ".join(f"{c[0]}:{c[1]}/{c[2]}@p{p}" for c, p in sorted(self.stop_at.items()))
+        return f"⏹️ ADLIST early stops: {stops or 'none'}"
+
+PAGE_STOPS = PageStops()
+
+class Watermarks:
+    """INCREMENTAL: last run's newest listed_unix/ad_id per (portal, intent, segment) and this
+    run's new marks (written by save())."""
+    def __init__(self, path:str):
+        self.path = path
+        self.lock = threading.Lock()
+        try:
+            with open(path, "r", encoding="utf-8") as f: self.prev = json.load(f)
+        except Exception:
+            self.prev = {}
+        self.new = {}
+        self.dirty = set()   # categories with a deferred ADLIST page or an exhausted ADVIEW URL: mark not advanced
+        self.store = None
+
+    def attach(self, store:TaskStore):
+        """Keep this run's pending marks in the TaskStore so --resume does not lose them."""
+        with self.lock:
+            self.store = store
+            saved = store.load_meta("watermarks", {})
+            self.new.update(saved.get("new", {})); self.dirty.update(saved.get("dirty", []))
+
+    def _persist(self):
+        if self.store is not None:
+            self.store.save_meta("watermarks", {"new": self.new, "dirty": sorted(self.dirty)})
+
+    @staticmethod
+    def _name(cat:tuple)->str:
+        return "|".join(str(x) for x in cat)
+
+    def cutoff(self, cat:tuple):
+        wm = self.prev.get(self._name(cat))
+        return (wm["listed_unix"] - WATERMARK_OVERLAP) if wm and wm.get("listed_unix") else None
+
+    def is_new(self, row:dict)->bool:
+        cut = self.cutoff((row.get("portal"), row.get("intent"), row.get("segment")))
+        lu = row.get("listed_unix")
+        return cut is None or not isinstance(lu, int) or lu >= cut
+
+    def observe(self, cat:tuple, rows:list)->bool:
+        """Record a parsed page; True when it is entirely older than the cutoff (pagination stops here)."""
+        stamps = [r["listed_unix"] for r in rows if isinstance(r.get("listed_unix"), int)]
+        name = self._name(cat)
+        with self.lock:
+            if stamps:
+                top = max(rows, key=lambda r: r.get("listed_unix") or 0)
+                cur = self.new.get(name)
+                if cur is None or top["listed_unix"] > cur["listed_unix"]:
+                    self.new[name] = {"listed_unix": top["listed_unix"], "ad_id": top.get("ad_id")}
+                    self._persist()
+            cut = self.cutoff(cat)
+            return cut is not None and bool(stamps) and len(stamps) == len(rows) and max(stamps) < cut
+
+    def mark_dirty(self, cat:tuple):
+        with self.lock:
+            self.dirty.add(self._name(cat))
+            self._persist()
+
+    def save(self)->str:
+        with self.lock:
+            merged = dict(self.prev)
+            for name, wm in self.new.items():
+                old = merged.get(name)
+                if name in self.dirty or (old and old.get("listed_unix", 0) >= wm["listed_unix"]):
+                    continue
+                merged[name] = dict(wm, run=TS)
+            try:
+                with open(self.path, "w", encoding="utf-8") as f: json.dump(merged, f, indent=1)
+            except Exception:
+                pass
+        return f"🔖 Watermarks saved ({len(merged)} categories)"
+
+WATERMARKS = Watermarks(os.path.join(BASE_DIR, WATERMARK_FILE)) if INCREMENTAL else None
+
 # ====== ADVIEW rich extraction ======
 DOMAIN = "https://www.propertyguru.com.my"
 
@@ -565,10 +2463,10 @@ def digits_only(x):
     if x in (None, "", []): return ""
     return "".join(re.findall(r"\d+", str(x)))
 
-def make_abs(u):
+def make_abs(u, domain=DOMAIN):
     if not isinstance(u, str) or not u:
         return ""
-    return u if u.startswith("http") else (DOMAIN + u)
+    return u if u.startswith("http") else (domain + u)
 
 def last_token(address):
     parts = [p.strip() for p in str(address).split(",") if p.strip()]
@@ -1213,11 +3111,14 @@ def build_adview_row(
     ad_id_hint=None,
     intent: str = "",
     segment: str = "",
+    source: str = "propertyguru.com.my",
+    id_prefix: str = "pg",
+    domain: str = DOMAIN,
 ):
     listing = data.get("listingData", {}) or {}
     property_info = ((data.get("propertyOverviewData") or {}).get("propertyInfo")) or {}
 
-    url = make_abs(pick_first(data, URL_PATHS)) or url_fallback or ""
+    url = make_abs(pick_first(data, URL_PATHS), domain) or url_fallback or ""
     title = pick_first(data, TITLE_PATHS) or (listing.get("property") or {}).get("typeText") or ""
 
     address = pick_first(data, ADDRESS_PATHS)
@@ -1312,7 +3213,7 @@ def build_adview_row(
         "currency": currency_val,
         "email": email_val,
         "furnishing": furnishing,
-        "id": f"pg_{ad_identifier}" if ad_identifier else "",
+        "id": f"{id_prefix}_{ad_identifier}" if ad_identifier else "",
         "land_area": digits_only(pick_first(data, LAND_AREA_PATHS)),
         "lister": pick_first(data, LISTER_NAME_PATHS) or "",
         "listing_id": listing_id,
@@ -1331,7 +3232,7 @@ def build_adview_row(
         "rooms": str(pick_first(data, ROOMS_PATHS) or ""),
         "scrape_date": scrape_date_val,
         "seller_name": seller_name_val,
-        "source": "propertyguru.com.my",
+        "source": source,
         "state": state or "",
         "subregion": district or "",
         "title": title or "",
@@ -1345,7 +3246,7 @@ def build_adview_row(
         "file": raw_filename,
         "address": address or "",
         "subarea": subarea or "",
-        "lister_url": make_abs(pick_first(data, LISTER_URL_PATHS)) or "",
+        "lister_url": make_abs(pick_first(data, LISTER_URL_PATHS), domain) or "",
         "agency_registration_number": pick_first(data, AGENCY_REG_PATHS) or "",
         "price_per_square_feet": digits_only(pick_first(data, PSF_PATHS)),
         "furnishing_source": furnishing_source,
@@ -1386,6 +3287,220 @@ def build_adview_row(
 
     return row
 
+# ====== Portal adapters ======
+IPROPERTY_DOMAIN = "https://www.iproperty.com.my"
+
+def build_iproperty_adlist_url(intent:str, is_commercial:bool, page:int)->str:
+    kind = "all-commercial" if is_commercial else "all-residential"
+    return f"{IPROPERTY_DOMAIN}/{'sale' if intent == 'sale' else 'rent'}/{kind}/?page={page}"
+
+def extract_iproperty_adlist_rows(text:str, intent:str, segment:str, page_no:int):
+    # iProperty SRPs carry the same pageData.data.listingsData shape as PropertyGuru
+    rows = extract_adlist_rows_from_nextdata(text, intent, segment, page_no)
+    for r in rows:
+        r["url"] = make_abs(r.get("url"), IPROPERTY_DOMAIN)
+    return rows
+
+def _sqft_digits(val, unit) -> str:
+    """ipx builtup (value, unit) → whole sq ft; only called once ipx has loaded."""
+    if val in (None, ""):
+        return ""
+    if re.search(r"sqm|m²|sq\.m|square meter", str(unit or ""), re.I):
+        val = float(val) * ipx.SQM_TO_SQFT
+    return str(int(round(float(val))))
+
+def build_iproperty_adview_row(data: dict, **kw):
+    """Generic pageData paths first, then the iProperty JSON-first extractor fills the gaps."""
+    row = build_adview_row(data, source="iproperty.com.my", id_prefix="ip", domain=IPROPERTY_DOMAIN, **kw)
+    if ipx is None:
+        return row
+    j = ipx.extract_from_next_data({"props": {"pageProps": {"pageData": {"data": data}}}})
+    bed_n, bath_n = (j.get("bed_bath") or (None, None))[:2]
+    overlay = {
+        "build_up": _sqft_digits(*j["builtup"]) if "builtup" in j else "",
+        "price_per_square_feet": str(int(round(j["psf"]))) if j.get("psf") is not None else "",
+        "tenure": j.get("tenure", ""),
+        "furnishing": (j.get("furnishing") or ("", ""))[0],
+        "car_park": str((j.get("car_park") or ("",))[0] or ""),
+        "rooms": str(bed_n or ""),
+        "toilets": str(bath_n or ""),
+        "phone": (j.get("phone") or ("", ""))[0],
+        "phone_number": (j.get("phone") or ("", ""))[0],
+        "agency": j.get("agency_name", ""),
+        "address": (j.get("address") or ("", ""))[0],
+        "lister_url": j.get("lister_url", ""),
+        "ren": j.get("license", ""),
+        "amenities": "; ".join(j.get("amenities") or []),
+    }
+    for k, v in overlay.items():
+        if v and not str(row.get(k) or "").strip():
+            row[k] = v
+    return row
+
+class Portal:
+    """Site adapter: SRP URL builder, listing-row parser and detail-row builder.
+    Stage/workers stay site-agnostic; each task names its portal via task["portal"]."""
+    def __init__(self, key:str, domain:str, categories:list, adlist_url, adlist_rows, adview_row, file_prefix:str="",
+                 adlist_subtrees=None, adview_subtrees=None, sitemaps=(), listing_pattern:str|None=None,
+                 date_sorted:bool=False):
+        self.key = key
+        self.domain = domain
+        self.categories = categories
+        self.adlist_url = adlist_url
+        self.adlist_rows = adlist_rows
+        self.adview_row = adview_row
+        self.file_prefix = file_prefix
+        # pageData.data keys the parsers read (None = whole __NEXT_DATA__); used with NEXT_DATA_SUBTREES
+        self.adlist_subtrees = adlist_subtrees
+        self.adview_subtrees = adview_subtrees
+        # sitemap roots and the URL shape of a listing detail page (SITEMAP_DISCOVERY)
+        self.sitemaps = list(sitemaps)
+        self.listing_re = re.compile(listing_pattern) if listing_pattern else None
+        # SRPs come newest first, so a page older than the watermark ends the category (INCREMENTAL)
+        self.date_sorted = date_sorted
+
+    def probe_url(self)->str:
+        return self.adlist_url("sale", False, 1)
+
+ADLIST_SUBTREES = ("listingsData", "paginationData")
+# Every pageData.data key build_adview_row reads: the first token of each *_PATHS list it uses,
+# plus the blocks its helpers open directly (facilities, metatable, breadcrumbs, lastPosted, ...)
+ADVIEW_PATH_LISTS = [
+    URL_PATHS, TITLE_PATHS, PROPERTY_TYPE_PATHS, ADDRESS_PATHS, STATE_PATHS, DISTRICT_PATHS, SUBAREA_PATHS,
+    LISTER_NAME_PATHS, LISTER_URL_PATHS, PHONE_PATHS, PHONE2_PATHS, AGENCY_NAME_PATHS, AGENCY_REG_PATHS,
+    REN_PATHS, PRICE_PATHS, CAR_PARK_PATHS, EMAIL_PATHS, SELLER_NAME_PATHS, MARKET_PATHS, REGION_PATHS,
+    RENT_SALE_PATHS, TYPE_PATHS, POSTED_DATE_PATHS, POSTED_TIME_PATHS, CREATED_TIME_PATHS, UPDATED_DATE_PATHS,
+    ACTIVATE_DATE_PATHS, CURRENCY_PATHS, ROOMS_PATHS, TOILETS_PATHS, PSF_PATHS, FLOOR_AREA_PATHS,
+    LAND_AREA_PATHS, TENURE_PATHS, PROPERTY_TITLE_PATHS, BUMI_PATHS, TOTAL_UNITS_PATHS,
+    COMPLETION_YEAR_PATHS, DEVELOPER_PATHS, FURNISH_PATHS_STRICT,
+]
+# (seoData: its "items" blocks feed the fill_from_details scan, e.g. "Developed by ...")
+ADVIEW_DIRECT_KEYS = ("listingData", "propertyOverviewData", "detailsData", "facilitiesData",
+                      "breadcrumbsData", "similarListingsData", "lastPosted", "seoData")
+ADVIEW_SUBTREES = tuple(sorted(set(ADVIEW_DIRECT_KEYS) | {p.split(".", 1)[0] for paths in ADVIEW_PATH_LISTS for p in paths}))
+
+PORTALS = {
+    "propertyguru": Portal("propertyguru", DOMAIN, CATEGORIES,
+                           build_adlist_url, extract_adlist_rows_from_nextdata, build_adview_row,
+                           adlist_subtrees=ADLIST_SUBTREES, adview_subtrees=ADVIEW_SUBTREES,
+                           sitemaps=SITEMAPS.get("propertyguru", ()), listing_pattern=r"/property-listing/[^/?#]+-\d+",
+                           date_sorted=True),
+    "iproperty":    Portal("iproperty", IPROPERTY_DOMAIN, IPROPERTY_CATEGORIES,
+                           build_iproperty_adlist_url, extract_iproperty_adlist_rows, build_iproperty_adview_row,
+                           file_prefix="iproperty_", adlist_subtrees=ADLIST_SUBTREES,  # ADVIEW: ipx walks the full tree
+                           sitemaps=SITEMAPS.get("iproperty", ()), listing_pattern=r"/property/.+/(?:sale|rent)-\d+"),
+}
+
+def get_portal(task:dict)->Portal:
+    return PORTALS.get(task.get("portal") or "propertyguru", PORTALS["propertyguru"])
+
+def adlist_query_key(task:dict)->tuple:
+    """(portal, intent, segment, shard): one paginated SRP query."""
+    return (get_portal(task).key, task["intent"], task["segment"], shard_label(task.get("shard")))
+
+def adlist_task_key(task:dict)->tuple:
+    return adlist_query_key(task) + (task["page"],)
+
+def adview_task_key(task:dict)->str:
+    return task["url"]
+
+# ====== Sitemap discovery ======
+R_URL_INTENT = re.compile(r"(?:for-|/)(sale|rent)\b", re.I)
+SITEMAP_NS = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+
+def parse_lastmod(text)->int|None:
+    """W3C datetime (date only, or with time and Z/offset) → unix seconds."""
+    t = (text or "").strip()
+    if not t: return None
+    try:
+        dt = datetime.fromisoformat(t.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is None: dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+def open_sitemap(src:str, proxy_idx=None):
+    """(reader, underlying stream) for a sitemap (http(s) URL, file:// URL or local path); the reader
+    gunzips when the bytes are gzip."""
+    if re.match(r"https?://", src, re.I):
+        resp = HTTP_POOL.get(proxy_idx).get(src, stream=True, timeout=HTTP_TIMEOUT)
+        resp.raise_for_status()
+        resp.raw.decode_content = True   # Content-Encoding: gzip
+        stream = io.BufferedReader(resp.raw)
+    else:
+        stream = open(src[7:] if src.startswith("file://") else src, "rb")
+    if stream.peek(2)[:2] == b"\x1f\x8b":  # .xml.gz served as a file
+        return gzip.GzipFile(fileobj=stream), stream
+    return stream, stream
+
+def iter_sitemap(src:str, proxy_idx=None):
+    """Yield ("url" | "sitemap", loc, lastmod_unix) from a urlset or sitemap index, one entry at a time.
+    Only sitemap-namespace <loc>/<lastmod> directly under <url>/<sitemap> count (not <image:loc> etc.)."""
+    f, raw = open_sitemap(src, proxy_idx)
+    try:
+        root = None; loc = lastmod = None; depth = 0
+        for ev, el in iterparse(f, events=("start", "end")):
+            if ev == "start":
+                if root is None: root = el
+                depth += 1; continue
+            depth -= 1   # now the depth of el's parent: 1 = urlset/sitemapindex, 2 = url/sitemap
+            tag = el.tag[len(SITEMAP_NS):] if el.tag.startswith(SITEMAP_NS) else el.tag
+            if depth == 2 and tag == "loc":
+                loc = (el.text or "").strip()
+            elif depth == 2 and tag == "lastmod":
+                lastmod = parse_lastmod(el.text)
+            elif depth == 1 and tag in ("url", "sitemap"):
+                if loc: yield tag, loc, lastmod
+                loc = lastmod = None
+                root.clear()   # keep memory flat on 50k-URL files
+    finally:
+        f.close(); raw.close()
+
+def sitemap_child(parent:str, loc:str)->str:
+    """Child sitemap locations are URLs; a relative one (local fixtures) resolves next to its parent."""
+    if re.match(r"[a-z][a-z0-9+.-]*://", loc, re.I) or os.path.isabs(loc):
+        return loc
+    return os.path.join(os.path.dirname(parent[7:] if parent.startswith("file://") else parent), loc)
+
+def discover_from_sitemaps(portal:Portal, since_unix=None, proxy_idx=None):
+    """Walk a portal's sitemaps depth-first and yield (listing URL, lastmod) modified since since_unix
+    (entries without lastmod are kept). Child sitemaps untouched since then are not opened."""
+    stack = [(src, 0) for src in portal.sitemaps]; opened = set()
+    while stack:
+        src, depth = stack.pop()
+        if src in opened: continue
+        opened.add(src)
+        try:
+            for kind, loc, lastmod in iter_sitemap(src, proxy_idx):
+                if since_unix and lastmod and lastmod < since_unix:
+                    continue
+                if kind == "sitemap":
+                    if depth < SITEMAP_MAX_DEPTH: stack.append((sitemap_child(src, loc), depth + 1))
+                elif portal.listing_re is None or portal.listing_re.search(loc):
+                    yield loc, lastmod
+        except Exception as e:
+            error_logger.error(f"[SITEMAP] {src} failed: {type(e).__name__}: {str(e)[:160]}", extra={'thread_id': 0})
+
+def sitemap_task(portal:Portal, url:str)->dict:
+    m = R_URL_INTENT.search(urlsplit(url).path)
+    return {"url": url, "portal": portal.key, "intent": m.group(1).lower() if m else "unknown",
+            "segment": "unknown", "ad_id": None, "attempt": 1}
+
+def feed_from_sitemaps(stage: Stage, batch_size:int=500)->str:
+    """SITEMAP_DISCOVERY: stream listing URLs from every enabled portal's sitemaps into `stage` (deduped by feed())."""
+    since = time.time() - SITEMAP_MAX_AGE_DAYS * 86400 if SITEMAP_MAX_AGE_DAYS else None
+    good = sorted(VERIFIER.good_proxies()) if use_proxy_cache() else []
+    proxy_idx = good[0] if good else 0
+    t0 = time.time(); seen = queued = 0
+    for key in ENABLED_PORTALS:
+        portal = PORTALS[key]; batch = []
+        for loc, _ in discover_from_sitemaps(portal, since, proxy_idx):
+            batch.append(sitemap_task(portal, loc)); seen += 1
+            if len(batch) >= batch_size:
+                queued += stage.feed(batch); batch = []
+        queued += stage.feed(batch)
+    return f"🗺️ Sitemaps: {seen:,} listing URLs in window, {queued:,} new queued for {stage.name} ({time.time()-t0:.0f}s)"
+
 # ====== Dashboard Builder ======
 def build_dashboard_text(adlist: Stage, adview: Stage, phase:str) -> str:
     now_str = datetime.now().strftime('%Y-%m-%d %H:%M') + " MYT"
@@ -1416,7 +3531,20 @@ def build_dashboard_text(adlist: Stage, adview: Stage, phase:str) -> str:
         eta = sec_fmt(remaining / rate if rate > 0 else 0)
         pct = (comp / total) if total else 0.0
         bar = text_bar(pct, DASHBOARD_BAR_WIDTH)
-        return f"{label}  [{bar}] {int(pct*100)}% • {comp:,}/{total:,} • ok={ok:,} • retried={retr:,} • deferred={deff:,} • errors={errs:,} • {rate:.2f} u/s • ETA {eta}"
+        line = f"{label}  [{bar}] {int(pct*100)}% • {comp:,}/{total:,} • ok={ok:,} • retried={retr:,} • deferred={deff:,} • errors={errs:,} • {rate:.2f} u/s • ETA {eta}"
+        if FETCH_MODE == "http_first":
+            line += f" • http={stage.metrics['http_ok']:,} • browser={stage.metrics['escalated']:,}"
+        if NEXT_DATA_ROUTES and stage.metrics["data_route"]:
+            line += f" • data-route={stage.metrics['data_route']:,} ({stage.metrics['data_route_bytes']/1048576:.1f} MB)"
+        if MEASURE_PAGE_BYTES and stage.metrics["pages_measured"]:
+            line += f" • {stage.metrics['page_bytes']/stage.metrics['pages_measured']/1024:.0f} KB/page"
+        if stage.metrics["skipped"]:
+            line += f" • skipped={stage.metrics['skipped']:,}"
+        if stage.metrics["reused"]:
+            line += f" • reused={stage.metrics['reused']:,}"
+        if stage.metrics["shard_splits"] or stage.metrics["dup_rows"]:
+            line += f" • shard splits={stage.metrics['shard_splits']:,} • dup rows={stage.metrics['dup_rows']:,}"
+        return line
 
     lines = []
     lines.append(f"🏗️ PropertyGuru Multi-Phase — Run {now_str}")
@@ -1430,7 +3558,7 @@ def build_dashboard_text(adlist: Stage, adview: Stage, phase:str) -> str:
     active = adlist if phase == "ADLIST" else adview
     fair = math.ceil(max(1, active.metrics["total"]) / max(1, active.threads))
     with active.thread_stats_lock:
-        for tid in range(active.threads):
+        for tid in range(active.id_base, active.id_base + active.threads):
             st = active.thread_stats.get(tid, {"done":0,"state":"init","proxy":"-"})
             pct = (st["done"] / fair) if fair else 0.0
             tbar = text_bar(pct, 12)
@@ -1439,11 +3567,6 @@ def build_dashboard_text(adlist: Stage, adview: Stage, phase:str) -> str:
     return "\n".join(lines)
 
 # ====== Background loops ======
-def dispatcher_loop(stage: Stage, stop_event: threading.Event):
-    while not stop_event.is_set():
-        stage.pop_due_delayed(100)
-        time.sleep(0.5)
-
 def dashboard_loop(stop_event: threading.Event, dashboard_bot: DiscordClient, adlist: Stage, adview: Stage, get_phase):
     last_pct = -1
     while not stop_event.is_set():
@@ -1463,106 +3586,127 @@ def dashboard_loop(stop_event: threading.Event, dashboard_bot: DiscordClient, ad
         except Exception:
             time.sleep(2)
 
+def spawn_workers(stage: Stage, worker, ex: ThreadPoolExecutor, n:int, retry_bot: DiscordClient, exhausted_bot: DiscordClient):
+    for _ in range(n):
+        tid = stage.id_base + stage.spawned; stage.spawned += 1
+        ex.submit(worker, tid, stage, retry_bot, exhausted_bot)
+    stage.threads = max(stage.threads, stage.spawned)
+
+def pipeline_balancer(adlist: Stage, adview: Stage, ex: ThreadPoolExecutor, retry_bot: DiscordClient, exhausted_bot: DiscordClient):
+    """PIPELINE: one ADVIEW worker per PIPELINE_DEPTH_PER_WORKER queued URLs, capped at ADVIEW_THREADS
+    while ADLIST is still feeding and at ADVIEW_THREADS + ADLIST_THREADS once its workers are gone."""
+    while not adview.done_event.wait(2):
+        depth = adview.depth()
+        if not depth: continue
+        cap = ADVIEW_THREADS if adview.inputs_open else ADVIEW_THREADS + ADLIST_THREADS
+        want = min(cap, math.ceil(depth / PIPELINE_DEPTH_PER_WORKER))
+        if want > adview.spawned:
+            perf_logger.info(f"[PIPELINE] ADVIEW depth={depth} → workers {adview.spawned}→{want}", extra={'thread_id': 0})
+            spawn_workers(adview, adview_worker, ex, want - adview.spawned, retry_bot, exhausted_bot)
+
 # ====== ADLIST Worker ======
 def adlist_worker(thread_id:int, stage: Stage, retry_bot: DiscordClient, exhausted_bot: DiscordClient):
-    time.sleep((thread_id + 1) * THREAD_LAUNCH_DELAY_STEP)
-
-    ua = pick_ua()
-    proxy_idx = stage.assign_initial_proxy(thread_id, exclude=None)
-    driver = start_driver(ua, proxies[proxy_idx], thread_id, ADLIST_EXT_ROOT)
-    
-    # right after: driver = start_driver(ua, proxies[proxy_idx], thread_id, ADLIST_EXT_ROOT)
-    sys_ip = system_public_ipv4()
-    print(f"[IP] system IPv4      : {sys_ip}")
-    
-    # check via a neutral page (optional)
-    driver.get("https://ipv4.icanhazip.com")
-    time.sleep(1.2)
-    print(f"[IP] browser IPv4 (nav): {(driver.find_element(By.TAG_NAME,'body').text or '').strip()}")
-    prox_ok = verify_proxy(driver, label=f"ADLIST T{thread_id}", sys_ip=sys_ip, thread_id=thread_id)
-    if not prox_ok:
-        print(f"[IP] T{thread_id} ❌ Proxy not in effect, rotating…")
-        try:
-            driver.quit()
-        except Exception:
-            pass
-        old_idx = proxy_idx
-        proxy_idx = stage.rotate_proxy_for_thread(thread_id, proxy_idx)
-        ua = pick_ua()
-        driver = start_driver(ua, proxies[proxy_idx], thread_id, ADLIST_EXT_ROOT)
-        # re-check once after restart
-        verify_proxy(driver, label=f"ADLIST T{thread_id} (recheck)", sys_ip=sys_ip, thread_id=thread_id)
+    time.sleep((thread_id - stage.id_base + 1) * (LAUNCH_STAGGER_CACHED if use_proxy_cache() else THREAD_LAUNCH_DELAY_STEP))
 
-    # now confirm **while on PG**
-    pg_url = "https://www.propertyguru.com.my/property-for-sale?isCommercial=false&sort=date&order=desc&page=1"
-    driver.get(pg_url)
-    
-    # replace the old pg_ip / quick verdict block with this:
-    pg_ok = verify_proxy(driver, label=f"{stage.name} T{thread_id} (PG)", sys_ip=sys_ip)
-    print("[IP] ✅ Proxy in effect for this PG page." if pg_ok else
-          "[IP] ❌ Looks like direct IP (or probe failed). Check whitelisting / --proxy-server.")
+    driver, proxy_idx = start_worker_driver(stage, thread_id, ADLIST_EXT_ROOT)
 
     proxy_ip = mask_ip(get_proxy_ip(proxy_idx))
 
     with stage.thread_stats_lock:
         stage.thread_stats[thread_id] = {"done": 0, "state": "OK", "proxy": proxy_ip}
+    fail_streak = 0
+    driver_pages = 0
 
     try:
         while True:
-            try:
-                task = stage.ready_q.get(timeout=1.0)
-            except queue.Empty:
-                with stage.state_lock, stage.delayed_lock:
-                    nothing_left = stage.ready_q.qsize() == 0 and len(stage.delayed_heap) == 0 and len(stage.in_flight) == 0
-                    deferred_empty = stage.deferred_q.qsize() == 0
-                if nothing_left and deferred_empty:
-                    break
-                else:
-                    if nothing_left and not deferred_empty:
-                        try:
-                            while True:
-                                t2 = stage.deferred_q.get_nowait()
-                                stage.ready_q.put(t2)
-                        except queue.Empty:
-                            pass
-                    continue
+            task = stage.next_task()
+            if task is None:
+                break
 
+            portal  = get_portal(task)
             intent  = task["intent"]; segment = task["segment"]; is_com  = task["is_commercial"]
             page_no = task["page"];   attempt = task.get("attempt", 1)
-            url = build_adlist_url(intent, is_com, page_no)
+            url = shard_url(portal.adlist_url(intent, is_com, page_no), task.get("shard"))
+            query = adlist_query_key(task); key = query + (page_no,)
 
             with stage.state_lock:
-                key = (intent, segment, page_no)
-                if key in stage.done_set or key in stage.in_flight:
-                    continue
-                stage.in_flight.add(key)
+                dup = key in stage.done_set or key in stage.in_flight
+                if not dup: stage.in_flight.add(key)
+            if dup:
+                stage.task_done(); continue
 
             try:
-                driver.set_page_load_timeout(PAGELOAD_TIMEOUT)
-                driver.get(url)
-                text = get_next_data(driver)
+                if PAGE_STOPS.stopped(query, page_no):
+                    stage.metrics.incr("skipped"); stage.metrics.incr("completed")
+                    stage.complete(key, state="skipped")
+                    if stage.overall_bar is not None: stage.overall_bar.update(1)
+                    continue
+
+                text, driver, raw = fetch_next_data(stage, url, driver, proxy_idx, thread_id, portal.adlist_subtrees)
                 if not text:
                     detection_logger.info(f"[ADLIST] NEXT_DATA missing {url}", extra={'thread_id': thread_id})
                     raise TimeoutException("NEXT_DATA missing")
 
-                out_name = f"{intent}_{segment}_page_{page_no}.json"
-                out_path = os.path.join(ADLIST_DIR, out_name)
-                with open(out_path, "w", encoding="utf-8") as f:
-                    f.write(text)
+                if ARCHIVE_RAW_NEXT_DATA:
+                    out_name = f"{portal.file_prefix}{intent}_{segment}{'_' + query[3] if query[3] else ''}_page_{page_no}.json"
+                    out_path = os.path.join(ADLIST_DIR, out_name)
+                    with open(out_path, "w", encoding="utf-8") as f:
+                        f.write(raw or text)
 
-                rows = extract_adlist_rows_from_nextdata(text, intent, segment, page_no)
+                rows = portal.adlist_rows(text, intent, segment, page_no)
                 scrape_unix = int(time.time())
                 for r in rows:
                     r["scrape_unix"] = scrape_unix
+                    r["portal"] = portal.key
                 if not hasattr(stage, "adlist_rows"):
                     stage.adlist_rows = []; stage.adlist_rows_lock = threading.Lock()
                 with stage.adlist_rows_lock:
-                    stage.adlist_rows.extend(rows)
-
-                with stage.state_lock:
-                    stage.metrics["ok"] += 1; stage.metrics["completed"] += 1; stage.done_set.add(key)
+                    fresh = rows
+                    if QUERY_SHARDS:   # shard boundaries overlap, so a listing can come back twice
+                        fresh = [r for r in rows if (r.get("url"), intent, segment) not in stage.listing_keys]
+                        stage.listing_keys.update((r.get("url"), intent, segment) for r in fresh)
+                    stage.adlist_rows.extend(fresh)
+                if len(fresh) < len(rows): stage.metrics.incr("dup_rows", len(rows) - len(fresh))
+
+                if WATERMARKS is not None and WATERMARKS.observe(query[:3], rows) and portal.date_sorted:
+                    PAGE_STOPS.stop(query, page_no)
+                    perf_logger.info(f"[ADLIST] {intent}/{segment} page {page_no} older than watermark → stop paging", extra={'thread_id': thread_id})
+                if AUTO_PAGE_COUNT or QUERY_SHARDS:
+                    listed, n_pages = adlist_page_meta(text, len(rows) if page_no == 1 else None)
+                    label = f"{intent}/{segment}{' ' + query[3] if query[3] else ''}"
+                    halves = split_shard(task["shard"]) if (task.get("shard") and n_pages and n_pages > SHARD_MAX_PAGES) else None
+                    if listed and not rows:
+                        PAGE_STOPS.stop(query, page_no)
+                        perf_logger.info(f"[ADLIST] {label} page {page_no} empty → end of query", extra={'thread_id': thread_id})
+                    elif page_no == 1 and halves:
+                        stage.metrics.incr("shard_splits")
+                        stage.feed([dict(task, shard=h, page=1, attempt=1) for h in halves])
+                        perf_logger.info(f"[ADLIST] {label}: {n_pages} pages > {SHARD_MAX_PAGES} → split into {', '.join(shard_label(h) for h in halves)}", extra={'thread_id': thread_id})
+                    elif page_no == 1 and task.get("max_pages"):
+                        last = min(n_pages, AUTO_PAGE_COUNT_MAX) if n_pages else task["max_pages"]
+                        if task.get("shard"): last = min(last, SHARD_MAX_PAGES)
+                        base = {k: v for k, v in task.items() if k != "max_pages"}
+                        stage.feed([dict(base, page=p, attempt=1) for p in range(2, last + 1)])
+                        perf_logger.info(f"[ADLIST] {label}: {last} pages ({'discovered' if n_pages else 'configured cap'})", extra={'thread_id': thread_id})
+                # follow-on pages / shard halves are queued (and stored) before this page counts as done,
+                # so neither the scheduler nor a crash can see the query finished without them
+                stage.metrics.incr("ok"); stage.metrics.incr("completed")
+                stage.complete(key, fresh)
+                if stage.downstream is not None:
+                    tasks = [{"url": str(r["url"]).strip(), "portal": portal.key, "intent": intent, "segment": segment,
+                              "ad_id": r.get("ad_id"), "attempt": 1} for r in rows
+                             if r.get("url") and (WATERMARKS is None or WATERMARKS.is_new(r))]
+                    stage.downstream.feed(stage.downstream.reuse_unchanged(tasks, {str(r["url"]).strip(): r for r in rows if r.get("url")}))
+                    stage.downstream.wait_for_room(PIPELINE_MAX_QUEUED)
                 with stage.thread_stats_lock:
                     st = stage.thread_stats[thread_id]; st["done"] += 1; st["state"] = "OK"
+                fail_streak = 0
+                driver_pages += 1
+                try:
+                    driver, proxy_idx, driver_pages = maybe_recycle_driver(stage, thread_id, driver, proxy_idx, driver_pages)
+                    proxy_ip = mask_ip(get_proxy_ip(proxy_idx))
+                except Exception as e:
+                    error_logger.error(f"[{stage.name}] recycle failed: {type(e).__name__}", extra={'thread_id': thread_id})
 
                 if stage.overall_bar is not None: stage.overall_bar.update(1)
                 if stage.thread_bars.get(thread_id): stage.thread_bars[thread_id].update(1)
@@ -1572,52 +3716,69 @@ def adlist_worker(thread_id:int, stage: Stage, retry_bot: DiscordClient, exhaust
                 err_msg = str(e)[:180]
                 error_logger.error(f"[ADLIST] {url} err: {err_msg}", extra={'thread_id': thread_id})
 
-                old_mask = proxy_ip
+                fail_streak += 1
+                fix = "recovery failed"
                 try:
-                    try: driver.quit()
-                    except: pass
-                    proxy_idx = stage.rotate_proxy_for_thread(thread_id, proxy_idx)
-                    proxy_ip  = mask_ip(get_proxy_ip(proxy_idx))
-                    ua = pick_ua()
-                    driver = start_driver(ua, proxies[proxy_idx], thread_id, ADLIST_EXT_ROOT)
+                    driver, proxy_idx, fix = recover_driver(stage, thread_id, driver, proxy_idx, fail_streak, e, ADLIST_EXT_ROOT)
+                    proxy_ip = mask_ip(get_proxy_ip(proxy_idx))
+                    if fix.startswith("restarted"):
+                        driver_pages = 0
                     with stage.thread_stats_lock:
-                        stage.thread_stats[thread_id]["state"] = "Restarted"; stage.thread_stats[thread_id]["proxy"] = proxy_ip
+                        stage.thread_stats[thread_id]["state"] = "Restarted" if fix.startswith("restarted") else "Recovered"
+                        stage.thread_stats[thread_id]["proxy"] = proxy_ip
                 except Exception:
-                    pass
+                    driver = None
 
                 if attempt == 1:
                     backoff = int(random.uniform(60, 180))
-                    with stage.state_lock: stage.metrics["retried"] += 1
+                    stage.metrics.incr("retried")
                     if retry_bot.enabled:
                         retry_bot.send_event(
                             f"🔁 Retry A • ADLIST • T{thread_id}\nURL: {url}\nWhy: {type(e).__name__}: {err_msg}\n"
-                            f"Fix: Restarted + rotated proxy ({old_mask} → {proxy_ip}); backoff {backoff//60}m{backoff%60:02d}s → reattempt (2/3)"
+                            f"Fix: {fix}; backoff {backoff//60}m{backoff%60:02d}s → reattempt (2/3)"
                         )
                     task["attempt"] = 2; stage.schedule_retry(task, backoff)
                 elif attempt == 2:
                     backoff = int(random.uniform(600, 780))
-                    with stage.state_lock: stage.metrics["retried"] += 1
+                    stage.metrics.incr("retried")
                     if retry_bot.enabled:
                         retry_bot.send_event(
                             f"🔁 Retry B • ADLIST • T{thread_id}\nURL: {url}\nWhy: {type(e).__name__}: {err_msg}\n"
-                            f"Fix: Restarted + rotated proxy ({old_mask} → {proxy_ip}); backoff {backoff//60}m{backoff%60:02d}s → reattempt (3/3)"
+                            f"Fix: {fix}; backoff {backoff//60}m{backoff%60:02d}s → reattempt (3/3)"
                         )
                     task["attempt"] = 3; stage.schedule_retry(task, backoff)
-                else:
-                    with stage.state_lock: stage.metrics["deferred"] += 1
-                    if (intent,segment,page_no) not in stage.deferred_set:
-                        stage.deferred_set.add((intent,segment,page_no))
-                        task2 = dict(task); stage.deferred_q.put(task2)
+                elif key not in stage.deferred_set:
+                    stage.metrics.incr("deferred")
+                    if WATERMARKS is not None: WATERMARKS.mark_dirty(query[:3])
+                    stage.deferred_set.add(key)
+                    task2 = dict(task); stage.defer(task2)
+                else:   # the final sweep failed too: this page is lost
+                    stage.metrics.incr("final_exhausted"); stage.metrics.incr("completed")
+                    if WATERMARKS is not None: WATERMARKS.mark_dirty(query[:3])
+                    label = f"{intent}/{segment}{' ' + query[3] if query[3] else ''}"
+                    if page_no == 1 and task.get("max_pages"):
+                        # its page count was never read; page blind up to the configured cap
+                        # (an empty page still ends the query) rather than lose the whole query
+                        last = min(task["max_pages"], SHARD_MAX_PAGES) if task.get("shard") else task["max_pages"]
+                        base = {k: v for k, v in task.items() if k != "max_pages"}
+                        stage.feed([dict(base, page=p, attempt=1) for p in range(2, last + 1)])
+                        error_logger.error(f"[ADLIST] {label} page 1 exhausted → queued pages 2..{last} (configured cap) {url}", extra={'thread_id': thread_id})
+                    else:
+                        error_logger.error(f"[ADLIST] {label} page {page_no} exhausted {url}", extra={'thread_id': thread_id})
+                    stage.complete(key, state="exhausted")
 
             finally:
                 with stage.state_lock:
-                    key2 = (intent, segment, page_no)
-                    if key2 in stage.in_flight: stage.in_flight.discard(key2)
+                    if key in stage.in_flight: stage.in_flight.discard(key)
+                stage.task_done()
 
     finally:
-        try: driver.quit()
-        except: pass
-        stage.release_proxy(proxy_idx)
+        discard_prelaunched(stage, thread_id)
+        if driver is not None:
+            try: driver.quit()
+            except: pass
+        if not isinstance(driver, TabDriver):  # a shared browser releases its proxy with its last tab
+            stage.release_proxy(proxy_idx)
         with stage.thread_stats_lock:
             stage.thread_stats[thread_id]["state"] = "finished"
 
@@ -1635,70 +3796,24 @@ def audit_append(path:str, obj:dict):
         pass
 
 def adview_worker(thread_id:int, stage: Stage, retry_bot: DiscordClient, exhausted_bot: DiscordClient):
-    time.sleep((thread_id + 1) * THREAD_LAUNCH_DELAY_STEP)
-
-    ua = pick_ua()
-    proxy_idx = stage.assign_initial_proxy(thread_id, exclude=None)
-    driver = start_driver(ua, proxies[proxy_idx], thread_id, ADVIEW_EXT_ROOT)
-    # right after: driver = start_driver(ua, proxies[proxy_idx], thread_id, ADLIST_EXT_ROOT)
-    sys_ip = system_public_ipv4()
-    print(f"[IP] system IPv4      : {sys_ip}")
-    
-    # check via a neutral page (optional)
-    driver.get("https://ipv4.icanhazip.com")
-    time.sleep(1.2)
-    print(f"[IP] browser IPv4 (nav): {(driver.find_element(By.TAG_NAME,'body').text or '').strip()}")
-    
-    prox_ok = verify_proxy(driver, label=f"ADVIEW T{thread_id}", sys_ip=sys_ip, thread_id=thread_id)
-    if not prox_ok:
-        print(f"[IP] T{thread_id} ❌ Proxy not in effect, rotating…")
-        try:
-            driver.quit()
-        except Exception:
-            pass
-        old_idx = proxy_idx
-        proxy_idx = stage.rotate_proxy_for_thread(thread_id, proxy_idx)
-        ua = pick_ua()
-        driver = start_driver(ua, proxies[proxy_idx], thread_id, ADVIEW_EXT_ROOT)
-        # re-check once after restart
-        verify_proxy(driver, label=f"ADVIEW T{thread_id} (recheck)", sys_ip=sys_ip, thread_id=thread_id)
-    
-    # now confirm **while on PG**
-    # now confirm **while on PG**
-    pg_url = "https://www.propertyguru.com.my/property-for-sale?isCommercial=false&sort=date&order=desc&page=1"
-    driver.get(pg_url)
-    
-    # replace the old pg_ip / quick verdict block with this:
-    pg_ok = verify_proxy(driver, label=f"{stage.name} T{thread_id} (PG)", sys_ip=sys_ip, thread_id=thread_id)
+    time.sleep((thread_id - stage.id_base + 1) * (LAUNCH_STAGGER_CACHED if use_proxy_cache() else THREAD_LAUNCH_DELAY_STEP))
 
-    print("[IP] ✅ Proxy in effect for this PG page." if pg_ok else
-          "[IP] ❌ Looks like direct IP (or probe failed). Check whitelisting / --proxy-server.")
+    driver, proxy_idx = start_worker_driver(stage, thread_id, ADVIEW_EXT_ROOT)
 
     proxy_ip = mask_ip(get_proxy_ip(proxy_idx))
 
     with stage.thread_stats_lock:
         stage.thread_stats[thread_id] = {"done": 0, "state": "OK", "proxy": proxy_ip}
+    fail_streak = 0
+    driver_pages = 0
 
     try:
         while True:
-            try:
-                task = stage.ready_q.get(timeout=1.0)
-            except queue.Empty:
-                with stage.state_lock, stage.delayed_lock:
-                    nothing_left = stage.ready_q.qsize() == 0 and len(stage.delayed_heap) == 0 and len(stage.in_flight) == 0
-                    deferred_empty = stage.deferred_q.qsize() == 0
-                if nothing_left and deferred_empty:
-                    break
-                else:
-                    if nothing_left and not deferred_empty:
-                        try:
-                            while True:
-                                t2 = stage.deferred_q.get_nowait()
-                                stage.ready_q.put(t2)
-                        except queue.Empty:
-                            pass
-                    continue
+            task = stage.next_task()
+            if task is None:
+                break
 
+            portal   = get_portal(task)
             url      = task["url"]
             intent   = task.get("intent","unknown")
             segment  = task.get("segment","unknown")
@@ -1707,14 +3822,13 @@ def adview_worker(thread_id:int, stage: Stage, retry_bot: DiscordClient, exhaust
             in_final = task.get("phase") == "Final"
 
             with stage.state_lock:
-                if url in stage.done_set or url in stage.in_flight:
-                    continue
-                stage.in_flight.add(url)
+                dup = url in stage.done_set or url in stage.in_flight
+                if not dup: stage.in_flight.add(url)
+            if dup:
+                stage.task_done(); continue
 
             try:
-                driver.set_page_load_timeout(PAGELOAD_TIMEOUT)
-                driver.get(url)
-                text = get_next_data(driver)
+                text, driver, raw = fetch_next_data(stage, url, driver, proxy_idx, thread_id, portal.adview_subtrees)
                 if not text:
                     detection_logger.info(f"[ADVIEW] NEXT_DATA missing {url}", extra={'thread_id': thread_id})
                     raise TimeoutException("NEXT_DATA missing")
@@ -1726,14 +3840,16 @@ def adview_worker(thread_id:int, stage: Stage, retry_bot: DiscordClient, exhaust
                     data = {}
                 dd = get_data_root(data)
                 ad_id = (dd.get("listingData") or {}).get("id") or (dd.get("listingData") or {}).get("listingId") or ad_id_in
-                raw_name = f"adview_{safe_name(intent)}_{safe_name(segment)}_{safe_name(ad_id or url)}.json"
-                with open(os.path.join(ADVIEW_DIR, raw_name), "w", encoding="utf-8") as f:
-                    f.write(text)
+                # name is still passed when not archiving: market_from_filename reads the segment from it
+                raw_name = f"adview_{portal.file_prefix}{safe_name(intent)}_{safe_name(segment)}_{safe_name(ad_id or url)}.json"
+                if ARCHIVE_RAW_NEXT_DATA:
+                    with open(os.path.join(ADVIEW_DIR, raw_name), "w", encoding="utf-8") as f:
+                        f.write(raw or text)
 
                 if not dd and isinstance(data, dict):
                     dd = data
 
-                row = build_adview_row(
+                row = portal.adview_row(
                     dd,
                     raw_filename=raw_name,
                     url_fallback=url,
@@ -1751,10 +3867,19 @@ def adview_worker(thread_id:int, stage: Stage, retry_bot: DiscordClient, exhaust
 
                 perf_logger.info(f"[ADVIEW] OK {url}", extra={'thread_id': thread_id})
 
-                with stage.state_lock:
-                    stage.metrics["ok"] += 1; stage.metrics["completed"] += 1; stage.done_set.add(url)
+                stage.metrics.incr("ok"); stage.metrics.incr("completed")
+                stage.complete(url, row)
+                if LISTING_INDEX is not None and task.get("fp"):
+                    LISTING_INDEX.record(url, task["fp"], row)
                 with stage.thread_stats_lock:
                     st = stage.thread_stats[thread_id]; st["done"] += 1; st["state"] = "OK"
+                fail_streak = 0
+                driver_pages += 1
+                try:
+                    driver, proxy_idx, driver_pages = maybe_recycle_driver(stage, thread_id, driver, proxy_idx, driver_pages)
+                    proxy_ip = mask_ip(get_proxy_ip(proxy_idx))
+                except Exception as e:
+                    error_logger.error(f"[{stage.name}] recycle failed: {type(e).__name__}", extra={'thread_id': thread_id})
 
                 if stage.overall_bar is not None: stage.overall_bar.update(1)
                 if stage.thread_bars.get(thread_id): stage.thread_bars[thread_id].update(1)
@@ -1764,22 +3889,23 @@ def adview_worker(thread_id:int, stage: Stage, retry_bot: DiscordClient, exhaust
                 err_msg = str(e)[:180]
                 error_logger.error(f"[ADVIEW] {url} err: {err_msg}", extra={'thread_id': thread_id})
 
-                old_mask = proxy_ip
+                fail_streak += 1
+                fix = "recovery failed"
                 try:
-                    try: driver.quit()
-                    except: pass
-                    proxy_idx = stage.rotate_proxy_for_thread(thread_id, proxy_idx)
-                    proxy_ip  = mask_ip(get_proxy_ip(proxy_idx))
-                    ua = pick_ua()
-                    driver = start_driver(ua, proxies[proxy_idx], thread_id, ADVIEW_EXT_ROOT)
+                    driver, proxy_idx, fix = recover_driver(stage, thread_id, driver, proxy_idx, fail_streak, e, ADVIEW_EXT_ROOT)
+                    proxy_ip = mask_ip(get_proxy_ip(proxy_idx))
+                    if fix.startswith("restarted"):
+                        driver_pages = 0
                     with stage.thread_stats_lock:
-                        stage.thread_stats[thread_id]["state"] = "Restarted"; stage.thread_stats[thread_id]["proxy"] = proxy_ip
+                        stage.thread_stats[thread_id]["state"] = "Restarted" if fix.startswith("restarted") else "Recovered"
+                        stage.thread_stats[thread_id]["proxy"] = proxy_ip
                 except Exception:
-                    pass
+                    driver = None
 
                 if in_final:
-                    with stage.state_lock:
-                        stage.metrics["final_exhausted"] += 1; stage.metrics["completed"] += 1; stage.done_set.add(url)
+                    stage.metrics.incr("final_exhausted"); stage.metrics.incr("completed")
+                    stage.complete(url, state="exhausted")
+                    if WATERMARKS is not None: WATERMARKS.mark_dirty((portal.key, intent, segment))
                     with stage.thread_stats_lock:
                         stage.thread_stats[thread_id]["done"] += 1; stage.thread_stats[thread_id]["state"] = "Final Exhausted"
 
@@ -1791,28 +3917,28 @@ def adview_worker(thread_id:int, stage: Stage, retry_bot: DiscordClient, exhaust
                 else:
                     if attempt == 1:
                         backoff = int(random.uniform(60, 180))
-                        with stage.state_lock: stage.metrics["retried"] += 1
+                        stage.metrics.incr("retried")
                         if retry_bot.enabled:
                             retry_bot.send_event(
                                 f"🔁 Retry A • ADVIEW • T{thread_id}\nURL: {url}\nWhy: {type(e).__name__}: {err_msg}\n"
-                                f"Fix: Restarted + rotated proxy ({old_mask} → {proxy_ip}); backoff {backoff//60}m{backoff%60:02d}s → reattempt (2/3)"
+                                f"Fix: {fix}; backoff {backoff//60}m{backoff%60:02d}s → reattempt (2/3)"
                             )
                         task["attempt"] = 2; stage.schedule_retry(task, backoff)
                     elif attempt == 2:
                         backoff = int(random.uniform(600, 780))
-                        with stage.state_lock: stage.metrics["retried"] += 1
+                        stage.metrics.incr("retried")
                         if retry_bot.enabled:
                             retry_bot.send_event(
                                 f"🔁 Retry B • ADVIEW • T{thread_id}\nURL: {url}\nWhy: {type(e).__name__}: {err_msg}\n"
-                                f"Fix: Restarted + rotated proxy ({old_mask} → {proxy_ip}); backoff {backoff//60}m{backoff%60:02d}s → reattempt (3/3)"
+                                f"Fix: {fix}; backoff {backoff//60}m{backoff%60:02d}s → reattempt (3/3)"
                             )
                         task["attempt"] = 3; stage.schedule_retry(task, backoff)
                     else:
-                        with stage.state_lock: stage.metrics["deferred"] += 1
+                        stage.metrics.incr("deferred")
                         if url not in stage.deferred_set:
                             stage.deferred_set.add(url)
                             task2 = dict(task); task2["phase"] = "Final"
-                            stage.deferred_q.put(task2)
+                            stage.defer(task2)
                             audit_append(DEFER_F, {
                                 "url": url, "attempts": attempt, "why": f"{type(e).__name__}: {err_msg}",
                                 "thread_id": thread_id, "proxy": proxy_ip, "ua_label": f"Chrome/{VERSION_MAIN}",
@@ -1821,11 +3947,15 @@ def adview_worker(thread_id:int, stage: Stage, retry_bot: DiscordClient, exhaust
             finally:
                 with stage.state_lock:
                     if url in stage.in_flight: stage.in_flight.discard(url)
+                stage.task_done()
 
     finally:
-        try: driver.quit()
-        except: pass
-        stage.release_proxy(proxy_idx)
+        discard_prelaunched(stage, thread_id)
+        if driver is not None:
+            try: driver.quit()
+            except: pass
+        if not isinstance(driver, TabDriver):  # a shared browser releases its proxy with its last tab
+            stage.release_proxy(proxy_idx)
         with stage.thread_stats_lock:
             stage.thread_stats[thread_id]["state"] = "finished"
 
@@ -1864,16 +3994,34 @@ if __name__ == "__main__":
     csv_bot       = DiscordClient(CSV_WEBHOOK)
     for bot in (dashboard_bot, retry_bot, exhausted_bot, csv_bot): bot.start()
 
-    adlist = Stage("ADLIST", ADLIST_THREADS, ADLIST_EXT_ROOT)
-    adview = Stage("ADVIEW", ADVIEW_THREADS, ADVIEW_EXT_ROOT)
-
-    # Seed ADLIST tasks
-    total_pages = 0
-    for cfg in CATEGORIES:
-        for p in range(1, cfg["pages"] + 1):
-            adlist.ready_q.put({"intent": cfg["intent"], "segment": cfg["segment"], "is_commercial": cfg["is_commercial"], "page": p, "attempt": 1})
-            total_pages += 1
-    adlist.metrics["total"] = total_pages
+    store = TaskStore(os.path.join(LOG_DIR, "run_state.sqlite")) if (TASK_STORE or RESUME_TS) else None
+    adlist = Stage("ADLIST", ADLIST_THREADS, ADLIST_EXT_ROOT, store, adlist_task_key)
+    adview = Stage("ADVIEW", ADVIEW_THREADS, ADVIEW_EXT_ROOT, store, adview_task_key)
+    adlist.adlist_rows = []; adlist.adlist_rows_lock = threading.Lock()
+    if store is not None:
+        PAGE_STOPS.attach(store)
+        if WATERMARKS is not None: WATERMARKS.attach(store)
+
+    # Seed ADLIST tasks (or pick the previous run's state back up)
+    if RESUME_TS and adlist.restore():
+        adlist.adlist_rows = [r for rows in store.load_rows("ADLIST") for r in rows]
+        adlist.listing_keys = {(r.get("url"), r.get("intent"), r.get("segment")) for r in adlist.adlist_rows}
+        print(f"♻️ Resuming {TS} • ADLIST {adlist.metrics['completed']:,}/{adlist.metrics['total']:,} pages done • {len(adlist.adlist_rows):,} rows restored")
+    else:
+        seed = []
+        for portal_key in (ENABLED_PORTALS if SITEMAP_DISCOVERY != "only" else []):
+            for cfg in PORTALS[portal_key].categories:
+                base = {"portal": portal_key, "intent": cfg["intent"], "segment": cfg["segment"], "is_commercial": cfg["is_commercial"]}
+                if QUERY_SHARDS:
+                    seed.extend(dict(base, shard=sh, page=1, attempt=1, max_pages=cfg["pages"]) for sh in initial_shards(cfg["intent"]))
+                    continue
+                if AUTO_PAGE_COUNT:   # page 1 queues the rest once it reveals the page count
+                    seed.append(dict(base, page=1, attempt=1, max_pages=cfg["pages"]))
+                    continue
+                for p in range(1, cfg["pages"] + 1):
+                    seed.append(dict(base, page=p, attempt=1))
+        adlist.put_many(seed)
+        adlist.metrics["total"] = len(seed)
 
     current_phase = {"phase": "ADLIST"}
     stop_event = threading.Event()
@@ -1882,24 +4030,49 @@ if __name__ == "__main__":
 
     # Progress bars (optional)
     if tqdm is not None:
-        adlist.overall_bar = tqdm(total=adlist.metrics["total"], desc="ADLIST Overall", position=0, dynamic_ncols=True)
+        adlist.overall_bar = tqdm(total=adlist.metrics["total"], initial=adlist.metrics["completed"], desc="ADLIST Overall", position=0, dynamic_ncols=True)
         fair = math.ceil(adlist.metrics["total"] / max(1, adlist.threads))
         for t in range(adlist.threads):
             adlist.thread_bars[t] = tqdm(total=fair, desc=f"A{t}", position=t+1, dynamic_ncols=True)
 
-    disp_list = threading.Thread(target=dispatcher_loop, args=(adlist, stop_event), daemon=True, name="adlist_dispatcher")
-    disp_list.start()
-
-    # Run ADLIST
-    with ThreadPoolExecutor(max_workers=adlist.threads) as ex:
-        _ = [ex.submit(adlist_worker, i, adlist, retry_bot, exhausted_bot) for i in range(adlist.threads)]
-        while True:
-            time.sleep(1)
-            with adlist.state_lock, adlist.delayed_lock:
-                main_done = adlist.ready_q.qsize() == 0 and len(adlist.delayed_heap) == 0 and len(adlist.in_flight) == 0
-                deferred_empty = adlist.deferred_q.qsize() == 0
-            if main_done and deferred_empty:
-                break
+    adview_ex = None
+    if PIPELINE:
+        # One proxy set across both stages; ADVIEW workers are added as ADLIST feeds it URLs
+        adview.state_lock = adlist.state_lock; adview.used_proxies = adlist.used_proxies
+        adview.id_base = adlist.threads   # worker ids, logs and proxy preference stay distinct from ADLIST's
+        adview.inputs_open = True
+        if RESUME_TS and adview.restore():
+            adview.adview_rows = store.load_rows("ADVIEW")
+        adlist.downstream = adview
+        current_phase["phase"] = "ADLIST+ADVIEW"
+        if tqdm is not None:
+            adview.overall_bar = tqdm(total=adview.metrics["total"], initial=adview.metrics["completed"], desc="ADVIEW Overall", position=adlist.threads+1, dynamic_ncols=True)
+        adview_ex = ThreadPoolExecutor(max_workers=ADVIEW_THREADS + ADLIST_THREADS)
+        threading.Thread(target=pipeline_balancer, args=(adlist, adview, adview_ex, retry_bot, exhausted_bot), daemon=True).start()
+
+    def run_sitemaps():
+        line = feed_from_sitemaps(adview)
+        print(line)
+        perf_logger.info(line, extra={'thread_id': 0})
+    sitemap_thr = None
+    if SITEMAP_DISCOVERY != "off" and PIPELINE:   # streams into ADVIEW while ADLIST pages
+        sitemap_thr = threading.Thread(target=run_sitemaps, daemon=True); sitemap_thr.start()
+
+    # Run ADLIST (a resumed run whose ADLIST already finished goes straight to the CSV)
+    if adlist.pending():
+        if use_proxy_cache():
+            verify_line = VERIFIER.verify_all()
+            print(verify_line)
+            perf_logger.info(verify_line, extra={'thread_id': 0})
+        if FETCH_MODE == "browser" and DRIVER_SPARES > 0:
+            adlist.driver_pool = DriverPool(adlist, adlist.ext_root)
+            adlist.driver_pool.start(delay=(adlist.threads + 1) * THREAD_LAUNCH_DELAY_STEP + 10)
+        with ThreadPoolExecutor(max_workers=adlist.threads) as ex:
+            _ = [ex.submit(adlist_worker, i, adlist, retry_bot, exhausted_bot) for i in range(adlist.threads)]
+            adlist.wait_done()
+    if adlist.driver_pool is not None:
+        adlist.driver_pool.stop()
+        perf_logger.info(f"[POOL] {adlist.name} warm swaps: {adlist.driver_pool.swaps}", extra={'thread_id': 0})
 
     if tqdm is not None:
         if adlist.overall_bar: adlist.overall_bar.close()
@@ -1910,7 +4083,7 @@ if __name__ == "__main__":
     # Build ADLIST CSV
     adlist_csv_path = os.path.join(ADLIST_DIR, f"PG_adlist_{TS}.csv")
     total_rows = 0
-    if hasattr(adlist, "adlist_rows") and adlist.adlist_rows:
+    if adlist.adlist_rows:
         df = pd.DataFrame(adlist.adlist_rows)
         if set(["url","intent","segment"]).issubset(df.columns):
             df = df.drop_duplicates(subset=["url","intent","segment"])
@@ -1919,7 +4092,7 @@ if __name__ == "__main__":
         df["updated_date"]     = listed_dt_local.dt.strftime("%Y-%m-%d")
         df["listed_time"]     = listed_dt_local.dt.strftime("%H:%M:%S")
         df["scrape_date"] = scrape_dt_local.dt.strftime("%Y-%m-%d %H:%M:%S")
-        cols = ["intent","segment","url","title","updated_date","listed_time","scrape_date","agent_name","agent_id","ad_id"]
+        cols = ["intent","segment","url","title","updated_date","listed_time","scrape_date","agent_name","agent_id","ad_id","portal"]
         for c in cols:
             if c not in df.columns:
                 df[c] = ""
@@ -1927,8 +4100,12 @@ if __name__ == "__main__":
         df_final.to_csv(adlist_csv_path, index=False, encoding="utf-8-sig")
         total_rows = len(df_final)
     else:
-        pd.DataFrame(columns=["intent","segment","url","title","updated_date","listed_time","scrape_date","agent_name","agent_id","ad_id"]).to_csv(adlist_csv_path, index=False, encoding="utf-8-sig")
+        pd.DataFrame(columns=["intent","segment","url","title","updated_date","listed_time","scrape_date","agent_name","agent_id","ad_id","portal"]).to_csv(adlist_csv_path, index=False, encoding="utf-8-sig")
     print(f"📄 ADLIST CSV written: {adlist_csv_path} (rows: {total_rows})")
+    if AUTO_PAGE_COUNT or INCREMENTAL:
+        line = PAGE_STOPS.summary()
+        print(line)
+        perf_logger.info(line, extra={'thread_id': 0})
     compress_and_upload(adlist_csv_path, csv_bot, label="ADLIST")
     
     t_end = time.time() + 15  # wait up to 15s for the sender thread to drain
@@ -1944,43 +4121,68 @@ if __name__ == "__main__":
     def assign_with_exclude(thread_id:int, exclude:set|None=None):
         ex = adview_initial_exclude if exclude is None else exclude
         return Stage.assign_initial_proxy(adview, thread_id, exclude=ex)
-    adview.assign_initial_proxy = assign_with_exclude
-
-    # Queue ADVIEW URLs from ADLIST CSV
-    df_in = pd.read_csv(adlist_csv_path)
-    adview_urls = 0
-    for _, row in df_in.iterrows():
-        url = str(row.get("url","")).strip()
-        if not url or url == "nan": continue
-        task = {
-            "url": url,
-            "intent": row.get("intent","unknown"),
-            "segment": row.get("segment","unknown"),
-            "ad_id": row.get("ad_id") if "ad_id" in row else None,
-            "attempt": 1
-        }
-        adview.ready_q.put(task); adview_urls += 1
-    adview.metrics["total"] = adview_urls
-    print(f"🧾 ADVIEW URLs queued: {adview_urls}")
-
-    if tqdm is not None:
-        adview.overall_bar = tqdm(total=adview.metrics["total"], desc="ADVIEW Overall", position=0, dynamic_ncols=True)
+    if not PIPELINE:
+        adview.assign_initial_proxy = assign_with_exclude
+
+    # Queue ADVIEW URLs from ADLIST CSV (resume: the stored ADVIEW tasks, if it had started).
+    # PIPELINE: already fed page by page; the CSV pass only adds what a crash may have dropped.
+    if not PIPELINE and RESUME_TS and adview.restore():
+        adview.adview_rows = store.load_rows("ADVIEW")
+        print(f"♻️ Resuming ADVIEW • {adview.metrics['completed']:,}/{adview.metrics['total']:,} done")
+    else:
+        df_in = pd.read_csv(adlist_csv_path)
+        # INCREMENTAL: only listings at/after their category's watermark cutoff
+        fresh_urls = None if WATERMARKS is None else {str(r.get("url","")).strip() for r in adlist.adlist_rows if WATERMARKS.is_new(r)}
+        seed = []
+        for _, row in df_in.iterrows():
+            url = str(row.get("url","")).strip()
+            if not url or url == "nan": continue
+            if fresh_urls is not None and url not in fresh_urls: continue
+            seed.append({
+                "url": url,
+                "portal": row.get("portal") if isinstance(row.get("portal"), str) else "propertyguru",
+                "intent": row.get("intent","unknown"),
+                "segment": row.get("segment","unknown"),
+                "ad_id": row.get("ad_id") if "ad_id" in row else None,
+                "attempt": 1
+            })
+        if LISTING_INDEX is not None:
+            summary = {str(r.get("url","")).strip(): r for r in adlist.adlist_rows}
+            seed = adview.reuse_unchanged(seed, summary)
+            print(f"♻️ ADVIEW rows reused from the listing index: {adview.metrics['reused']:,}")
+        adview.feed(seed)
+        if sitemap_thr is not None:
+            sitemap_thr.join()
+        elif SITEMAP_DISCOVERY != "off":
+            run_sitemaps()
+        if PIPELINE:
+            adview.close_inputs()
+        print(f"🧾 ADVIEW URLs queued: {adview.metrics['total']}")
+
+    if tqdm is not None and not PIPELINE:
+        adview.overall_bar = tqdm(total=adview.metrics["total"], initial=adview.metrics["completed"], desc="ADVIEW Overall", position=0, dynamic_ncols=True)
         fair = math.ceil(max(1, adview.metrics["total"]) / max(1, adview.threads))
         for t in range(adview.threads):
             adview.thread_bars[t] = tqdm(total=fair, desc=f"V{t}", position=t+1, dynamic_ncols=True)
 
-    disp_view = threading.Thread(target=dispatcher_loop, args=(adview, stop_event), daemon=True, name="adview_dispatcher")
-    disp_view.start()
-
-    with ThreadPoolExecutor(max_workers=adview.threads) as ex:
-        _ = [ex.submit(adview_worker, i, adview, retry_bot, exhausted_bot) for i in range(adview.threads)]
-        while True:
-            time.sleep(1)
-            with adview.state_lock, adview.delayed_lock:
-                main_done = adview.ready_q.qsize() == 0 and len(adview.delayed_heap) == 0 and len(adview.in_flight) == 0
-                deferred_empty = adview.deferred_q.qsize() == 0
-            if main_done and deferred_empty:
-                break
+    if adview.pending():
+        if use_proxy_cache():
+            verify_line = VERIFIER.verify_all()
+            print(verify_line)
+            perf_logger.info(verify_line, extra={'thread_id': 0})
+        if FETCH_MODE == "browser" and DRIVER_SPARES > 0:
+            adview.driver_pool = DriverPool(adview, adview.ext_root)
+            adview.driver_pool.start(delay=(adview.threads + 1) * THREAD_LAUNCH_DELAY_STEP + 10)
+        if adview_ex is None:
+            with ThreadPoolExecutor(max_workers=adview.threads) as ex:
+                _ = [ex.submit(adview_worker, i, adview, retry_bot, exhausted_bot) for i in range(adview.threads)]
+                adview.wait_done()
+    if adview_ex is not None:
+        adview.wait_done()
+        adview_ex.shutdown(wait=True)
+    if adview.driver_pool is not None:
+        adview.driver_pool.stop()
+        perf_logger.info(f"[POOL] {adview.name} warm swaps: {adview.driver_pool.swaps}", extra={'thread_id': 0})
 
     if tqdm is not None:
         if adview.overall_bar: adview.overall_bar.close()
@@ -1988,6 +4190,13 @@ if __name__ == "__main__":
             try: adview.thread_bars[t].close()
             except Exception: pass
 
+    # INCREMENTAL: marks advance only once ADVIEW is through (a run that dies before here keeps the
+    # old ones); categories with exhausted ADVIEW URLs were marked dirty and keep theirs
+    if WATERMARKS is not None:
+        line = WATERMARKS.save()
+        print(line)
+        perf_logger.info(line, extra={'thread_id': 0})
+
     # Stop dashboard
     if dashboard_bot.enabled:
         dashboard_bot.set_dashboard(build_dashboard_text(adlist, adview, current_phase["phase"]))
@@ -2000,7 +4209,7 @@ if __name__ == "__main__":
     total_rows_view = 0
 
     # Build adview DF
-    if hasattr(adview, "adview_rows") and adview.adview_rows:
+    if adview.adview_rows:
         df_view = pd.DataFrame(adview.adview_rows).drop_duplicates(subset=["url"])
 
         # Adlist slice for merge (retain intent/segment/timing info)
@@ -2139,4 +4348,24 @@ if __name__ == "__main__":
         dashboard_bot.set_dashboard(build_dashboard_text(adlist, adview, current_phase["phase"]))
         time.sleep(0.5)
     dashboard_bot.stop(); retry_bot.stop(); exhausted_bot.stop(); csv_bot.stop()
+    if SESSION_HANDOFF and (FETCH_MODE == "http_first" or NEXT_DATA_ROUTES):
+        for idx, st in HTTP_POOL.clearance_stats().items():
+            rate = "-" if st["success_rate"] is None else f"{st['success_rate']*100:.0f}%"
+            print(f"🍪 proxy {mask_ip(get_proxy_ip(idx))}: handoffs={st['handoffs']} http ok={st['ok']} fail={st['fail']} ({rate})")
+    startup_line = startup_summary()
+    if startup_line:
+        print(startup_line)
+        perf_logger.info(startup_line, extra={'thread_id': 0})
+    shutil.rmtree(PROFILE_RUNTIME_DIR, ignore_errors=True)
+    if MEASURE_PAGE_BYTES:
+        bytes_line = page_bytes_report([adlist, adview])
+        if bytes_line:
+            print(bytes_line)
+            perf_logger.info(bytes_line, extra={'thread_id': 0})
+    HTTP_POOL.close_all()
+    if LISTING_INDEX is not None:
+        LISTING_INDEX.close()
+    if store is not None:
+        store.close()
+        print(f"💾 Run state → {store.path} (resume with --resume {TS})")
 
@@ -0,0 +1,28 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+@pytest.fixture(scope="session")
+def pg(tmp_path_factory):
+    """propertyguru_full_scrape, imported from a scratch dir (it creates its run folders in the cwd)."""
+    for mod in ("pandas", "requests", "undetected_chromedriver", "selenium"):
+        pytest.importorskip(mod)
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("run"))
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    try:
+        return importlib.import_module("propertyguru_full_scrape")
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.fixture
+def fixture_path():
+    return lambda *parts: os.path.join(FIXTURES, *parts)
@@ -0,0 +1,38 @@
+import json
+
+
+def _pruned(data, keys):
+    # what JS_NEXT_DATA_SUBTREES ships: the selected top-level keys, in page order
+    return {k: v for k, v in data.items() if k in keys}
+
+
+def _row(pg, data):
+    row = pg.build_adview_row(data, url_fallback="https://www.propertyguru.com.my/x", segment="residential")
+    row.pop("scrape_unix"); row.pop("scrape_date")
+    return row
+
+
+def test_subtree_capture_builds_the_same_row(pg, fixture_path):
+    with open(fixture_path("pg_adview_data.json"), encoding="utf-8") as f:
+        data = json.load(f)
+    # build_adview_row output on this fixture before subtree capture existed (full tree)
+    with open(fixture_path("pg_adview_row_baseline.json"), encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    full = _row(pg, data)
+    pruned = _row(pg, _pruned(data, pg.ADVIEW_SUBTREES))
+
+    assert full == baseline
+    assert pruned == baseline
+    # the fixture exercises the blocks outside listingData/propertyOverviewData
+    assert baseline["facilities"] == "Swimming pool, Gymnasium"
+    assert baseline["rent_sale"] == "rent"
+    assert baseline["furnishing"] == "Fully Furnished"
+    assert baseline["completion_year"] == "2015"
+    assert baseline["developer"] == "Someone Else"   # seoData, via the detail scan
+
+
+def test_subtrees_cover_every_builder_path(pg):
+    for paths in pg.ADVIEW_PATH_LISTS:
+        for p in paths:
+            assert p.split(".", 1)[0] in pg.ADVIEW_SUBTREES
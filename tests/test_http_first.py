@@ -0,0 +1,118 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+NEXT_DATA = {"props": {"pageProps": {"pageData": {"data": {"listingsData": []}}}}, "buildId": "b1"}
+PAGES = {
+    "/ok": (200, '<html><head><script id="__NEXT_DATA__" type="application/json">'
+                 + json.dumps(NEXT_DATA) + "</script></head><body>listing</body></html>"),
+    "/challenge": (200, "<html><head><title>Just a moment...</title></head>"
+                        "<body><div id=\"cf-chl-widget\"></div></body></html>"),
+    "/blocked": (403, "<html><body>Forbidden</body></html>"),
+    "/plain": (200, "<html><body>no next data here</body></html>"),
+    "/_next/data/b1/ok.json": (200, json.dumps(NEXT_DATA["props"])),
+}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        status, body = PAGES.get(self.path, (404, "not found"))
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def site():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def pool(pg):
+    pool = pg.HttpClientPool()
+    pool.get(None).trust_env = False   # direct session; ignore any proxy in the environment
+    yield pool
+    pool.close_all()
+
+
+def test_ok_page_returns_next_data(pg, site, pool):
+    text, why = pg.http_get_next_data(f"{site}/ok", None, pool)
+
+    assert why == "ok"
+    assert json.loads(text) == NEXT_DATA
+
+
+def test_challenge_page_is_detected(pg, site, pool):
+    text, why = pg.http_get_next_data(f"{site}/challenge", None, pool)
+
+    assert text is None
+    assert why == "challenge (HTTP 200)"
+    assert pg.is_challenge_response(200, PAGES["/challenge"][1])
+    assert not pg.is_challenge_response(200, PAGES["/ok"][1])
+
+
+def test_missing_next_data_is_not_a_challenge(pg, site, pool):
+    assert pg.http_get_next_data(f"{site}/plain", None, pool) == (None, "no __NEXT_DATA__")
+
+
+class _FakeDriver:
+    def set_page_load_timeout(self, _):
+        pass
+
+
+def test_403_falls_back_to_the_browser(pg, site, pool, monkeypatch, tmp_path):
+    monkeypatch.setattr(pg, "FETCH_MODE", "http_first")
+    monkeypatch.setattr(pg, "NEXT_DATA_ROUTES", False)
+    monkeypatch.setattr(pg, "SESSION_HANDOFF", False)
+    monkeypatch.setattr(pg, "MEASURE_PAGE_BYTES", False)
+    monkeypatch.setattr(pg, "HTTP_POOL", pool)
+    loaded = []
+
+    def browser_next_data(driver, url, subtrees=None):
+        loaded.append(url)
+        return '{"from": "browser"}', None
+
+    monkeypatch.setattr(pg, "browser_next_data", browser_next_data)
+    stage = pg.Stage("ADLIST", 1, str(tmp_path))
+    driver = _FakeDriver()
+
+    assert pg.is_challenge_response(403, PAGES["/blocked"][1])
+    text, drv, _ = pg.fetch_next_data(stage, f"{site}/blocked", driver, None, 0)
+
+    assert (text, drv) == ('{"from": "browser"}', driver)
+    assert loaded == [f"{site}/blocked"]
+    assert stage.metrics["escalated"] == 1 and stage.metrics["http_ok"] == 0
+
+    text, _, _ = pg.fetch_next_data(stage, f"{site}/ok", driver, None, 0)
+    assert json.loads(text) == NEXT_DATA and len(loaded) == 1
+    assert stage.metrics["http_ok"] == 1
+
+
+def test_data_route_404_is_a_gone_listing_until_several_paths_miss(pg, site, pool, monkeypatch):
+    monkeypatch.setattr(pg, "BUILD_ID_404_PATHS", 2)
+    registry = pg.BuildIdRegistry()
+    domain = site.split("//", 1)[1]
+    registry.learn(f"{site}/ok", PAGES["/ok"][1])
+
+    text, why, _ = pg.http_get_data_route(f"{site}/ok", None, pool, registry)
+    assert why == "ok" and json.loads(text)["props"] == NEXT_DATA["props"]
+
+    for _ in range(2):   # the same dead listing twice
+        assert pg.http_get_data_route(f"{site}/gone-1", None, pool, registry)[1] == "listing gone (404)"
+    assert registry.get(domain) == ("b1", None)
+
+    _, why, _ = pg.http_get_data_route(f"{site}/gone-2", None, pool, registry)
+    assert why.startswith("buildId b1 rotated")
+    assert registry.get(domain) is None
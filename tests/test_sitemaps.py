@@ -0,0 +1,42 @@
+import types
+
+LISTING_1 = "https://www.propertyguru.com.my/property-listing/mont-kiara-condo-for-rent-60001001"
+LISTING_2 = "https://www.propertyguru.com.my/property-listing/bangsar-terrace-for-sale-60001002"
+LISTING_3 = "https://www.propertyguru.com.my/property-listing/cheras-apartment-for-rent-60001003"
+LISTING_4 = "https://www.propertyguru.com.my/property-listing/klcc-serviced-residence-for-sale-60001004"
+
+
+def test_urlset_ignores_image_locs(pg, fixture_path):
+    entries = list(pg.iter_sitemap(fixture_path("sitemaps", "listings-1.xml")))
+
+    assert [(kind, loc) for kind, loc, _ in entries] == [
+        ("url", LISTING_1),
+        ("url", LISTING_2),
+        ("url", "https://www.propertyguru.com.my/property-for-sale/in-kuala-lumpur"),
+        ("url", "https://www.propertyguru.com.my/property-listing/old-unit-for-sale-60000001"),
+    ]
+    assert entries[0][2] == pg.parse_lastmod("2026-10-18T09:30:00Z")
+
+
+def test_gzipped_urlset(pg, fixture_path):
+    entries = list(pg.iter_sitemap(fixture_path("sitemaps", "listings-2.xml.gz")))
+
+    assert entries == [("url", LISTING_3, pg.parse_lastmod("2026-10-18")), ("url", LISTING_4, None)]
+
+
+def test_index_lists_child_sitemaps(pg, fixture_path):
+    entries = list(pg.iter_sitemap(fixture_path("sitemaps", "sitemap_index.xml")))
+
+    assert [(kind, loc) for kind, loc, _ in entries] == [
+        ("sitemap", "listings-1.xml"), ("sitemap", "listings-2.xml.gz"), ("sitemap", "listings-archive.xml")]
+
+
+def test_discovery_walks_the_index_within_the_window(pg, fixture_path):
+    portal = types.SimpleNamespace(sitemaps=[fixture_path("sitemaps", "sitemap_index.xml")],
+                                   listing_re=pg.re.compile(r"/property-listing/[^/?#]+-\d+"))
+    since = pg.parse_lastmod("2026-10-01")
+
+    found = sorted(loc for loc, _ in pg.discover_from_sitemaps(portal, since_unix=since))
+
+    # old entries and the stale archive child are skipped, as are non-listing pages; no lastmod is kept
+    assert found == sorted([LISTING_1, LISTING_2, LISTING_3, LISTING_4])